@@ -24,6 +24,20 @@ def from_json_filter(value):
             return []
     return []
 
+def is_cli_command():
+    """
+    Whether the app is loaded for a `flask <command>` other than `flask run`.
+    Such commands share the server's Docker host, so they must not start the
+    warm pool (which removes the server's pool containers) or the workers.
+    """
+    if os.environ.get('FLASK_RUN_FROM_CLI') != 'true':
+        return False
+    
+    # `flask run` loads the app inside its own context, app commands in the group's
+    import click
+    ctx = click.get_current_context(silent=True)
+    return not (ctx and ctx.info_name == 'run')
+
 def create_app(config_name=None):
     app = Flask(__name__, 
                 template_folder='../templates',
@@ -42,6 +56,12 @@ def create_app(config_name=None):
     app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', default_db)
     app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
     
+    # Background lab services (warm pool, workers) - disabled for one-off scripts and CLI commands
+    app.config['LAB_BACKGROUND_TASKS'] = (
+        os.environ.get('LAB_BACKGROUND_TASKS', 'true').lower() == 'true'
+        and not is_cli_command()
+    )
+    
     # Initialize extensions
     db.init_app(app)
     login_manager.init_app(app)
@@ -71,8 +91,31 @@ def create_app(config_name=None):
     app.register_blueprint(api_bp, url_prefix='/api')
     app.register_blueprint(topics_bp, url_prefix='/topics')
     
-    # Create database tables
+    # Create database tables, then bring existing ones up to the models
+    from app.services import schema_migrations
     with app.app_context():
         db.create_all()
+        schema_migrations.upgrade()
+    schema_migrations.init_app(app)
+    
+    from app.services import lab_completions, score_ledger
+    lab_completions.init_app(app)
+    score_ledger.init_app(app)
+    
+    # Start lab orchestration services
+    from app.services import (
+        image_manager, port_allocator, warm_pool, lab_jobs,
+        lab_reconciler, lab_reaper, lab_idle, lab_freezer, lab_resources, scheduler
+    )
+    image_manager.init_app(app)
+    port_allocator.init_app(app)
+    warm_pool.init_app(app)
+    lab_jobs.init_app(app)
+    lab_reconciler.init_app(app)
+    lab_reaper.init_app(app)
+    lab_idle.init_app(app)
+    lab_freezer.init_app(app)
+    lab_resources.init_app(app)
+    scheduler.init_app(app)
     
     return app
@@ -3,6 +3,9 @@ from app.models.course import Course, Lesson
 from app.models.lab import Lab, LabSubmission
 from app.models.progress import UserProgress, UserScore
 from app.models.lab_instance import LabInstance
+from app.models.lab_port import LabPort
+from app.models.lab_resource_usage import LabResourceUsage
+from app.models.schema_migration import SchemaMigration
 from app.models.topic import Topic
 
-__all__ = ['User', 'Course', 'Lesson', 'Lab', 'LabSubmission', 'UserProgress', 'UserScore', 'LabInstance', 'Topic']
+__all__ = ['User', 'Course', 'Lesson', 'Lab', 'LabSubmission', 'UserProgress', 'UserScore', 'LabInstance', 'LabPort', 'LabResourceUsage', 'SchemaMigration', 'Topic']
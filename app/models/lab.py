@@ -24,15 +24,13 @@ class Lab(db.Model):
     bot_interval = db.Column(db.Integer, default=30)  # Bot visit interval in seconds
     is_active = db.Column(db.Boolean, default=True)
     order = db.Column(db.Integer, default=0)
+    completions = db.Column(db.Integer, default=0, server_default='0', nullable=False)  # Users who solved it (see lab_completions, schema migration 1 adds it)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     
     # Relationships
     submissions = db.relationship('LabSubmission', backref='lab', lazy=True, cascade='all, delete-orphan')
     
-    def get_completion_count(self):
-        return LabSubmission.query.filter_by(lab_id=self.id, is_correct=True).count()
-    
     def to_dict(self, include_flag=False):
         data = {
             'id': self.id,
@@ -49,7 +47,7 @@ class Lab(db.Model):
             'docker_image': self.docker_image,
             'docker_port': self.docker_port,
             'is_active': self.is_active,
-            'completions': self.get_completion_count()
+            'completions': self.completions
         }
         if include_flag:
             data['flag'] = self.flag
@@ -61,6 +59,10 @@ class Lab(db.Model):
 
 class LabSubmission(db.Model):
     __tablename__ = 'lab_submissions'
+    __table_args__ = (
+        db.Index('uq_lab_submissions_user_lab', 'user_id', 'lab_id', unique=True),
+        db.Index('ix_lab_submissions_lab_correct', 'lab_id', 'is_correct'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -6,6 +6,16 @@ from app import db
 
 class LabInstance(db.Model):
     __tablename__ = 'lab_instances'
+    __table_args__ = (
+        db.Index('ix_lab_instances_user_lab_status', 'user_id', 'lab_id', 'status'),
+        db.Index('ix_lab_instances_status_expires', 'status', 'expires_at'),
+        db.Index('ix_lab_instances_container', 'container_id'),
+    )
+    
+    # Lifecycle: queued -> starting -> running -> stopping -> stopped (or error)
+    # Idle running instances may be frozen (paused) and resumed to running
+    # A reset moves running/frozen instances through resetting back to running
+    ACTIVE_STATUSES = ('queued', 'starting', 'running', 'frozen', 'resetting')
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -13,17 +23,24 @@ class LabInstance(db.Model):
     container_id = db.Column(db.String(100), nullable=True)
     container_name = db.Column(db.String(200), nullable=False)
     port = db.Column(db.Integer, nullable=False)
-    status = db.Column(db.String(20), default='pending')  # pending, running, stopped, error
+    status = db.Column(db.String(20), default='queued')  # queued, starting, running, frozen, resetting, stopping, stopped, error
     lab_url = db.Column(db.String(500), nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     started_at = db.Column(db.DateTime, nullable=True)
     stopped_at = db.Column(db.DateTime, nullable=True)
     expires_at = db.Column(db.DateTime, nullable=True)
+    last_active_at = db.Column(db.DateTime, nullable=True)  # Last observed user traffic (schema migration 1 adds it)
+    node = db.Column(db.String(100), nullable=True)  # Docker node the container runs on (None = default, schema migration 1 adds it)
+    tenant = db.Column(db.String(100), nullable=True)  # Tenant key in a shared lab container (None = own container, schema migration 1 adds it)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)  # Last change, ages stuck starts/stops
     
     # Relationships
     user = db.relationship('User', backref=db.backref('lab_instances', lazy=True))
     lab = db.relationship('Lab', backref=db.backref('instances', lazy=True))
     
+    def is_active(self):
+        return self.status in self.ACTIVE_STATUSES
+    
     def to_dict(self):
         return {
             'id': self.id,
@@ -36,7 +53,10 @@ class LabInstance(db.Model):
             'lab_url': self.lab_url,
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'started_at': self.started_at.isoformat() if self.started_at else None,
-            'expires_at': self.expires_at.isoformat() if self.expires_at else None
+            'expires_at': self.expires_at.isoformat() if self.expires_at else None,
+            'last_active_at': self.last_active_at.isoformat() if self.last_active_at else None,
+            'node': self.node,
+            'tenant': self.tenant
         }
     
     def __repr__(self):
@@ -0,0 +1,24 @@
+"""
+Lab Port model - one row per host port lab containers may publish on
+"""
+from app import db
+
+class LabPort(db.Model):
+    __tablename__ = 'lab_ports'
+    __table_args__ = (
+        db.Index('ix_lab_ports_allocated_port', 'is_allocated', 'port'),
+    )
+    
+    port = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    is_allocated = db.Column(db.Boolean, default=False, nullable=False)
+    allocated_at = db.Column(db.DateTime, nullable=True)
+    
+    def to_dict(self):
+        return {
+            'port': self.port,
+            'is_allocated': self.is_allocated,
+            'allocated_at': self.allocated_at.isoformat() if self.allocated_at else None
+        }
+    
+    def __repr__(self):
+        return f'<LabPort {self.port} Allocated:{self.is_allocated}>'
@@ -0,0 +1,28 @@
+"""
+Lab Resource Usage model - peak resource use observed per lab
+"""
+from datetime import datetime
+from app import db
+
+class LabResourceUsage(db.Model):
+    __tablename__ = 'lab_resource_usage'
+    
+    lab_slug = db.Column(db.String(200), primary_key=True)
+    samples = db.Column(db.Integer, default=0, nullable=False)
+    memory_peak = db.Column(db.BigInteger, default=0, nullable=False)  # Bytes, page cache excluded
+    cpu_peak = db.Column(db.Float, default=0.0, nullable=False)  # Cores, averaged between two samples
+    pids_peak = db.Column(db.Integer, default=0, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def to_dict(self):
+        return {
+            'lab_slug': self.lab_slug,
+            'samples': self.samples,
+            'memory_peak': self.memory_peak,
+            'cpu_peak': self.cpu_peak,
+            'pids_peak': self.pids_peak,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
+    
+    def __repr__(self):
+        return f'<LabResourceUsage {self.lab_slug} Samples:{self.samples}>'
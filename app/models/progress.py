@@ -4,6 +4,16 @@ from app import db
 
 class UserProgress(db.Model):
     __tablename__ = 'user_progress'
+    __table_args__ = (
+        # One row per user and lesson / lab / course (lesson rows also carry course_id)
+        db.Index('uq_user_progress_user_lesson', 'user_id', 'lesson_id', unique=True),
+        db.Index('uq_user_progress_user_lab', 'user_id', 'lab_id', unique=True),
+        db.Index('uq_user_progress_user_course', 'user_id', 'course_id', unique=True,
+                 sqlite_where=db.text("progress_type = 'course'"),
+                 postgresql_where=db.text("progress_type = 'course'")),
+        db.Index('ix_user_progress_user_course', 'user_id', 'course_id', 'progress_type', 'status'),
+        db.Index('ix_user_progress_user_started', 'user_id', 'started_at'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -36,6 +46,9 @@ class UserProgress(db.Model):
 
 class UserScore(db.Model):
     __tablename__ = 'user_scores'
+    __table_args__ = (
+        db.Index('ix_user_scores_user_earned', 'user_id', 'earned_at'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -0,0 +1,22 @@
+"""
+Schema Migration model - migrations applied to this database
+"""
+from datetime import datetime
+from app import db
+
+class SchemaMigration(db.Model):
+    __tablename__ = 'schema_migrations'
+    
+    version = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    name = db.Column(db.String(200), nullable=False)
+    applied_at = db.Column(db.DateTime, default=datetime.utcnow)
+    
+    def to_dict(self):
+        return {
+            'version': self.version,
+            'name': self.name,
+            'applied_at': self.applied_at.isoformat() if self.applied_at else None
+        }
+    
+    def __repr__(self):
+        return f'<SchemaMigration {self.version} {self.name}>'
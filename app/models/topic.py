@@ -23,19 +23,24 @@ class Topic(db.Model):
     courses = db.relationship('Course', backref='topic', lazy=True)
     labs = db.relationship('Lab', backref='topic', lazy=True)
     
+    def get_stats(self):
+        """Course, lab and point totals (use topic_stats.get_topic_stats for many topics)"""
+        from app.services.topic_stats import get_topic_stats
+        
+        return get_topic_stats([self.id])[self.id]
+    
     def get_total_courses(self):
-        return len([c for c in self.courses if c.is_published])
+        return self.get_stats()['total_courses']
     
     def get_total_labs(self):
-        return len([l for l in self.labs if l.is_active])
+        return self.get_stats()['total_labs']
     
     def get_total_points(self):
         """Calculate total available points for this topic"""
-        course_points = sum(c.points for c in self.courses if c.is_published)
-        lab_points = sum(l.points for l in self.labs if l.is_active)
-        return course_points + lab_points
+        return self.get_stats()['total_points']
     
-    def to_dict(self):
+    def to_dict(self, stats=None):
+        stats = stats or self.get_stats()
         return {
             'id': self.id,
             'name': self.name,
@@ -45,9 +50,9 @@ class Topic(db.Model):
             'color': self.color,
             'severity': self.severity,
             'owasp_category': self.owasp_category,
-            'total_courses': self.get_total_courses(),
-            'total_labs': self.get_total_labs(),
-            'total_points': self.get_total_points(),
+            'total_courses': stats['total_courses'],
+            'total_labs': stats['total_labs'],
+            'total_points': stats['total_points'],
             'is_active': self.is_active
         }
     
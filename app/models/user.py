@@ -36,12 +36,6 @@ class User(db.Model, UserMixin):
     def is_admin(self):
         return self.role == 'admin'
     
-    def update_total_score(self):
-        from app.models.progress import UserScore
-        total = db.session.query(db.func.sum(UserScore.points)).filter_by(user_id=self.id).scalar()
-        self.total_score = total or 0
-        db.session.commit()
-    
     def to_dict(self):
         return {
             'id': self.id,
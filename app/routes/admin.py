@@ -1,5 +1,5 @@
 """Admin routes for platform management"""
-from flask import Blueprint, render_template, request, redirect, url_for, flash, abort
+from flask import Blueprint, render_template, request, redirect, url_for, flash, abort, jsonify
 from flask_login import login_required, current_user
 from functools import wraps
 from app import db
@@ -61,6 +61,9 @@ def delete_user(user_id):
     if user.id == current_user.id:
         flash('Cannot delete yourself.', 'warning')
     else:
+        from app.services import lab_completions
+        
+        lab_completions.forget_user(user.id)
         db.session.delete(user)
         db.session.commit()
         flash(f'User {user.username} deleted.', 'success')
@@ -271,3 +274,29 @@ def delete_lab(lab_id):
     db.session.commit()
     flash('Lab deleted successfully!', 'success')
     return redirect(url_for('admin.labs'))
+
+@admin_bp.route('/labs/orchestrator')
+@login_required
+@admin_required
+def orchestrator_stats():
+    """Lab orchestrator health and background task metrics"""
+    from app.services import (
+        lab_events, lab_metrics, lab_nodes, lab_resources, lab_status, lab_tenancy, scheduler, warm_pool
+    )
+    from app.services.lab_capacity import get_capacity
+    from app.services.lab_reaper import get_reaper_metrics
+    from app.services.port_allocator import get_port_stats
+    
+    return jsonify({
+        'capacity': get_capacity(),
+        'reaper': get_reaper_metrics(),
+        'tasks': scheduler.get_task_stats(),
+        'ports': get_port_stats(),
+        'warm_pool': warm_pool.get_pool_stats(),
+        'nodes': [node.to_dict() for node in lab_nodes.get_nodes()],
+        'status_cache': lab_status.get_cache_stats(),
+        'event_streams': lab_events.get_stream_stats(),
+        'shared_labs': lab_tenancy.get_shared_stats(),
+        'resources': lab_resources.get_resource_stats(),
+        'latency': lab_metrics.get_latency_summary()
+    })
@@ -18,19 +18,9 @@ def get_profile():
 @api_bp.route('/user/stats')
 @login_required
 def get_user_stats():
-    completed_courses = UserProgress.query.filter_by(
-        user_id=current_user.id,
-        progress_type='course',
-        status='completed'
-    ).count()
-    
-    completed_labs = LabSubmission.query.filter_by(
-        user_id=current_user.id,
-        is_correct=True
-    ).count()
+    from app.services.user_progress import get_user_progress
     
-    total_courses = Course.query.filter_by(is_published=True).count()
-    total_labs = Lab.query.filter_by(is_active=True).count()
+    progress = get_user_progress(current_user.id)
     
     # Calculate rank
     users_above = User.query.filter(User.total_score > current_user.total_score).count()
@@ -40,12 +30,12 @@ def get_user_stats():
         'username': current_user.username,
         'total_score': current_user.total_score,
         'rank': rank,
-        'completed_courses': completed_courses,
-        'completed_labs': completed_labs,
-        'total_courses': total_courses,
-        'total_labs': total_labs,
-        'course_progress': int((completed_courses / total_courses) * 100) if total_courses > 0 else 0,
-        'lab_progress': int((completed_labs / total_labs) * 100) if total_labs > 0 else 0
+        'completed_courses': progress['completed_courses'],
+        'completed_labs': progress['completed_labs'],
+        'total_courses': progress['total_courses'],
+        'total_labs': progress['total_labs'],
+        'course_progress': progress['course_progress'],
+        'lab_progress': progress['lab_progress']
     })
 
 # Courses API
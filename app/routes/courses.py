@@ -4,7 +4,9 @@ from flask_login import login_required, current_user
 from datetime import datetime
 from app import db
 from app.models.course import Course, Lesson
-from app.models.progress import UserProgress, UserScore
+from app.models.progress import UserProgress
+from app.services import score_ledger
+from app.services.user_progress import start_progress
 
 courses_bp = Blueprint('courses', __name__)
 
@@ -50,22 +52,9 @@ def course_detail(slug):
 def start_course(slug):
     course = Course.query.filter_by(slug=slug, is_published=True).first_or_404()
     
-    # Check if already started
-    existing = UserProgress.query.filter_by(
-        user_id=current_user.id,
-        course_id=course.id,
-        progress_type='course'
-    ).first()
-    
-    if not existing:
-        progress = UserProgress(
-            user_id=current_user.id,
-            course_id=course.id,
-            progress_type='course',
-            status='in_progress'
-        )
-        db.session.add(progress)
-        db.session.commit()
+    # Start unless already started
+    _, started = start_progress(current_user.id, 'course', course_id=course.id)
+    if started:
         flash('Course started! Good luck!', 'success')
     
     # Redirect to first lesson
@@ -89,22 +78,7 @@ def lesson(slug, lesson_slug):
     next_lesson = lessons[current_index + 1] if current_index < len(lessons) - 1 else None
     
     # Track lesson progress
-    lesson_progress = UserProgress.query.filter_by(
-        user_id=current_user.id,
-        lesson_id=lesson.id,
-        progress_type='lesson'
-    ).first()
-    
-    if not lesson_progress:
-        lesson_progress = UserProgress(
-            user_id=current_user.id,
-            course_id=course.id,
-            lesson_id=lesson.id,
-            progress_type='lesson',
-            status='in_progress'
-        )
-        db.session.add(lesson_progress)
-        db.session.commit()
+    lesson_progress, _ = start_progress(current_user.id, 'lesson', course_id=course.id, lesson_id=lesson.id)
     
     return render_template('courses/lesson.html',
                          course=course,
@@ -131,7 +105,6 @@ def complete_lesson(slug, lesson_slug):
         lesson_progress.status = 'completed'
         lesson_progress.completed_at = datetime.utcnow()
         lesson_progress.progress_percentage = 100
-        db.session.commit()
         
         # Check if all lessons are completed
         total_lessons = Lesson.query.filter_by(course_id=course.id).count()
@@ -157,20 +130,13 @@ def complete_lesson(slug, lesson_slug):
                 course_progress.completed_at = datetime.utcnow()
                 
                 # Award points
-                score = UserScore(
-                    user_id=current_user.id,
-                    source_type='course',
-                    source_id=course.id,
-                    points=course.points,
-                    description=f'Completed course: {course.title}'
+                score_ledger.award(
+                    current_user.id, 'course', course.id, course.points, f'Completed course: {course.title}'
                 )
-                db.session.add(score)
-                current_user.update_total_score()
                 
                 flash(f'Congratulations! You completed the course and earned {course.points} points!', 'success')
-            
-            db.session.commit()
         
+        db.session.commit()
         flash('Lesson completed!', 'success')
     
     # Go to next lesson or course page
@@ -1,11 +1,14 @@
 """Lab routes for hands-on challenges"""
-from flask import Blueprint, render_template, request, jsonify, flash, redirect, url_for
+from flask import Blueprint, render_template, request, jsonify, flash, redirect, url_for, abort, Response, current_app
 from flask_login import login_required, current_user
 from datetime import datetime
+from sqlalchemy.exc import IntegrityError
 from app import db
 from app.models.lab import Lab, LabSubmission
 from app.models.lab_instance import LabInstance
-from app.models.progress import UserProgress, UserScore
+from app.models.progress import UserProgress
+from app.services import lab_completions, score_ledger
+from app.services.user_progress import get_completed_lab_ids, start_progress
 
 labs_bp = Blueprint('labs', __name__)
 
@@ -18,14 +21,10 @@ def list_labs():
     categories = [c[0] for c in categories]
     
     # Get user completions if logged in
-    completed_labs = []
+    completed_labs = set()
     running_instances = {}
     if current_user.is_authenticated:
-        submissions = LabSubmission.query.filter_by(
-            user_id=current_user.id,
-            is_correct=True
-        ).all()
-        completed_labs = [s.lab_id for s in submissions]
+        completed_labs = get_completed_lab_ids(current_user.id)
         
         # Get running instances
         instances = LabInstance.query.filter_by(
@@ -51,29 +50,15 @@ def lab_detail(slug):
         lab_id=lab.id
     ).first()
     
-    # Get running instance
-    instance = LabInstance.query.filter_by(
-        user_id=current_user.id,
-        lab_id=lab.id,
-        status='running'
+    # Get queued, starting or running instance
+    instance = LabInstance.query.filter(
+        LabInstance.user_id == current_user.id,
+        LabInstance.lab_id == lab.id,
+        LabInstance.status.in_(LabInstance.ACTIVE_STATUSES)
     ).first()
     
     # Track lab progress
-    progress = UserProgress.query.filter_by(
-        user_id=current_user.id,
-        lab_id=lab.id,
-        progress_type='lab'
-    ).first()
-    
-    if not progress:
-        progress = UserProgress(
-            user_id=current_user.id,
-            lab_id=lab.id,
-            progress_type='lab',
-            status='in_progress'
-        )
-        db.session.add(progress)
-        db.session.commit()
+    progress, _ = start_progress(current_user.id, 'lab', lab_id=lab.id)
     
     return render_template('labs/detail.html', 
                          lab=lab, 
@@ -102,8 +87,14 @@ def submit_flag(slug):
         flash('You have already completed this lab!', 'info')
         return redirect(url_for('labs.lab_detail', slug=slug))
     
-    # Check flag
-    is_correct = submitted_flag == lab.flag
+    # Check flag - shared lab containers show every user a flag of their own
+    # and only that one counts, so a leaked base flag completes nothing
+    from app.services import lab_tenancy
+    
+    if lab_tenancy.is_shared(slug):
+        is_correct = submitted_flag == lab_tenancy.tenant_flag(lab.flag, slug, current_user.id)
+    else:
+        is_correct = submitted_flag == lab.flag
     
     # Get or create submission
     submission = LabSubmission.query.filter_by(
@@ -114,6 +105,17 @@ def submit_flag(slug):
     if submission:
         submission.attempts += 1
         submission.submitted_flag = submitted_flag
+        if is_correct:
+            # Only the request that flips the row to correct completes the lab
+            flipped = db.session.execute(
+                db.update(LabSubmission)
+                .where(LabSubmission.id == submission.id, LabSubmission.is_correct == False)
+                .values(is_correct=True)
+            ).rowcount
+            if not flipped:
+                db.session.rollback()
+                flash('You have already completed this lab!', 'info')
+                return redirect(url_for('labs.lab_detail', slug=slug))
         submission.is_correct = is_correct
     else:
         submission = LabSubmission(
@@ -123,9 +125,17 @@ def submit_flag(slug):
             is_correct=is_correct
         )
         db.session.add(submission)
+        try:
+            db.session.flush()
+        except IntegrityError:
+            # A concurrent first submission created the user's row for this lab
+            db.session.rollback()
+            flash('Your flag was submitted twice at once. Please try again.', 'warning')
+            return redirect(url_for('labs.lab_detail', slug=slug))
     
     if is_correct:
         submission.completed_at = datetime.utcnow()
+        lab_completions.record_completion(lab.id)
         
         # Update progress
         progress = UserProgress.query.filter_by(
@@ -140,15 +150,7 @@ def submit_flag(slug):
             progress.progress_percentage = 100
         
         # Award points
-        score = UserScore(
-            user_id=current_user.id,
-            source_type='lab',
-            source_id=lab.id,
-            points=lab.points,
-            description=f'Completed lab: {lab.title}'
-        )
-        db.session.add(score)
-        current_user.update_total_score()
+        score_ledger.award(current_user.id, 'lab', lab.id, lab.points, f'Completed lab: {lab.title}')
         
         flash(f'🎉 Correct! You earned {lab.points} points!', 'success')
     else:
@@ -174,26 +176,36 @@ def get_hint(slug, hint_num):
 @labs_bp.route('/<slug>/start', methods=['POST'])
 @login_required
 def start_lab(slug):
-    """Start a lab instance for the current user"""
+    """Queue a lab instance start for the current user"""
     lab = Lab.query.filter_by(slug=slug, is_active=True).first_or_404()
     
     try:
-        from app.services.lab_orchestrator import start_lab_instance, get_running_instance
+        from app.services.lab_jobs import enqueue_start
+        from app.services.lab_orchestrator import get_active_instance
         
-        # Check if already running
-        existing = get_running_instance(current_user.id, lab.id)
-        if existing:
-            flash(f'Lab is already running at {existing.lab_url}', 'info')
+        # Check if already running (frozen instances are resumed below)
+        existing = get_active_instance(current_user.id, lab.id)
+        if existing and existing.status != 'frozen':
+            if existing.status == 'running':
+                flash(f'Lab is already running at {existing.lab_url}', 'info')
+            else:
+                flash('Lab is already starting. It will be ready shortly.', 'info')
             return redirect(url_for('labs.lab_detail', slug=slug))
         
-        # Start new instance
-        instance, message = start_lab_instance(current_user.id, slug, lab.id)
+        # Queue new instance
+        instance, message = enqueue_start(current_user.id, slug, lab.id)
         
-        if instance:
+        if not instance:
+            flash(f'Failed to start lab: {message}', 'danger')
+        elif instance.status == 'running' and message == 'Lab resumed':
+            flash(f'▶️ Lab resumed where you left off! Access it at: {instance.lab_url}', 'success')
+        elif instance.status == 'running':
             flash(f'🚀 Lab started successfully! Access it at: {instance.lab_url}', 'success')
+        elif instance.status == 'error':
+            flash('Failed to start lab. Please try again.', 'danger')
         else:
-            flash(f'Failed to start lab: {message}', 'danger')
-            
+            flash('⏳ Lab is starting. This page will update when it is ready.', 'info')
+    
     except ImportError:
         # Docker not available - provide static lab URL
         flash('Docker is not available. Using static lab environment.', 'warning')
@@ -206,19 +218,19 @@ def start_lab(slug):
 @labs_bp.route('/<slug>/stop', methods=['POST'])
 @login_required
 def stop_lab(slug):
-    """Stop a running lab instance"""
+    """Queue a stop for the running lab instance"""
     lab = Lab.query.filter_by(slug=slug, is_active=True).first_or_404()
     
     try:
-        from app.services.lab_orchestrator import stop_lab_instance
+        from app.services.lab_jobs import enqueue_stop
         
-        success, message = stop_lab_instance(user_id=current_user.id, lab_id=lab.id)
+        success, message = enqueue_stop(current_user.id, lab.id)
         
         if success:
-            flash('Lab stopped successfully.', 'success')
+            flash(f'{message}.', 'success')
         else:
             flash(f'Failed to stop lab: {message}', 'danger')
-            
+    
     except ImportError:
         flash('Docker is not available.', 'warning')
     except Exception as e:
@@ -227,24 +239,66 @@ def stop_lab(slug):
     return redirect(url_for('labs.lab_detail', slug=slug))
 
 
+@labs_bp.route('/<slug>/reset', methods=['POST'])
+@login_required
+def reset_lab(slug):
+    """Queue a reset of the running lab instance to a pristine container"""
+    lab = Lab.query.filter_by(slug=slug, is_active=True).first_or_404()
+    
+    try:
+        from app.services.lab_jobs import enqueue_reset
+        
+        success, message = enqueue_reset(current_user.id, lab.id)
+        
+        if success:
+            flash(f'🔄 {message}. You will get a clean environment in a few seconds.', 'info')
+        else:
+            flash(f'Failed to reset lab: {message}', 'danger')
+    
+    except ImportError:
+        flash('Docker is not available.', 'warning')
+    except Exception as e:
+        flash(f'Error resetting lab: {str(e)}', 'danger')
+    
+    return redirect(url_for('labs.lab_detail', slug=slug))
+
+
 @labs_bp.route('/<slug>/status')
 @login_required
 def lab_status(slug):
-    """Get lab instance status via AJAX"""
-    lab = Lab.query.filter_by(slug=slug, is_active=True).first_or_404()
+    """Get lab instance status via AJAX (answered from the status cache)"""
+    from app.services import lab_status
     
-    instance = LabInstance.query.filter_by(
-        user_id=current_user.id,
-        lab_id=lab.id,
-        status='running'
-    ).first()
+    lab_id = lab_status.get_lab_id(slug)
+    if lab_id is None:
+        abort(404)
+    
+    data, etag = lab_status.get_status(current_user.id, lab_id)
+    
+    # Clients revalidate every poll; unchanged status costs a bodiless 304
+    response = jsonify(data)
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response.make_conditional(request)
+
+
+@labs_bp.route('/<slug>/events')
+@login_required
+def lab_event_stream(slug):
+    """Server-Sent Events stream of the user's lab instance transitions"""
+    from app.services import lab_events, lab_status
+    
+    lab_id = lab_status.get_lab_id(slug)
+    if lab_id is None:
+        abort(404)
     
-    if instance:
-        return jsonify({
-            'running': True,
-            'url': instance.lab_url,
-            'port': instance.port,
-            'expires_at': instance.expires_at.isoformat() if instance.expires_at else None
-        })
+    subscription = lab_events.subscribe(current_user.id, lab_id)
+    if subscription is None:
+        # Too many open streams - the page falls back to polling
+        return jsonify({'error': 'Too many event streams, poll /status instead'}), 503
     
-    return jsonify({'running': False})
+    return Response(
+        lab_events.stream(current_app._get_current_object(), subscription),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
@@ -1,5 +1,5 @@
 """Main routes - Home, Dashboard, Leaderboard"""
-from flask import Blueprint, render_template
+from flask import Blueprint, render_template, request, Response, abort
 from flask_login import login_required, current_user
 from app import db
 from app.models.user import User
@@ -29,18 +29,10 @@ def home():
 @main_bp.route('/dashboard')
 @login_required
 def dashboard():
-    # Get user progress
-    completed_courses = UserProgress.query.filter_by(
-        user_id=current_user.id, 
-        progress_type='course', 
-        status='completed'
-    ).count()
+    from app.services.user_progress import get_user_progress
     
-    completed_labs = UserProgress.query.filter_by(
-        user_id=current_user.id, 
-        progress_type='lab', 
-        status='completed'
-    ).count()
+    # Get user progress
+    progress = get_user_progress(current_user.id)
     
     # Recent activity
     recent_progress = UserProgress.query.filter_by(user_id=current_user.id)\
@@ -64,8 +56,8 @@ def dashboard():
     current_user.rank = users_above + 1
     
     return render_template('main/dashboard.html',
-                         completed_courses=completed_courses,
-                         completed_labs=completed_labs,
+                         completed_courses=progress['completed_courses'],
+                         completed_labs=progress['completed_labs'],
                          recent_progress=recent_progress,
                          recent_scores=recent_scores,
                          recommended_courses=recommended_courses)
@@ -84,3 +76,16 @@ def leaderboard():
 @main_bp.route('/about')
 def about():
     return render_template('main/about.html')
+
+@main_bp.route('/metrics')
+def metrics():
+    """Lab orchestrator metrics in the Prometheus text format"""
+    import hmac
+    from app.services import lab_metrics
+    
+    if lab_metrics.METRICS_TOKEN:
+        supplied = request.headers.get('Authorization', '')
+        if not hmac.compare_digest(supplied, f'Bearer {lab_metrics.METRICS_TOKEN}'):
+            abort(401)
+    
+    return Response(lab_metrics.render(), mimetype='text/plain; version=0.0.4')
@@ -4,8 +4,10 @@ from flask_login import current_user
 from app import db
 from app.models.topic import Topic
 from app.models.course import Course
-from app.models.lab import Lab, LabSubmission
+from app.models.lab import Lab
 from app.models.progress import UserProgress
+from app.services.topic_stats import get_topic_stats
+from app.services.user_progress import get_completed_lab_ids, get_topic_progress
 
 topics_bp = Blueprint('topics', __name__)
 
@@ -18,29 +20,11 @@ def list_topics():
     # Get user progress for each topic if logged in
     topic_progress = {}
     if current_user.is_authenticated:
-        for topic in topics:
-            completed_labs = 0
-            total_labs = len([l for l in topic.labs if l.is_active])
-            
-            if total_labs > 0:
-                for lab in topic.labs:
-                    if lab.is_active:
-                        submission = LabSubmission.query.filter_by(
-                            user_id=current_user.id,
-                            lab_id=lab.id,
-                            is_correct=True
-                        ).first()
-                        if submission:
-                            completed_labs += 1
-            
-            topic_progress[topic.id] = {
-                'completed': completed_labs,
-                'total': total_labs,
-                'percentage': int((completed_labs / total_labs * 100)) if total_labs > 0 else 0
-            }
+        topic_progress = get_topic_progress(current_user.id, [topic.id for topic in topics])
     
     return render_template('topics/list.html', 
                          topics=topics,
+                         topic_stats=get_topic_stats([topic.id for topic in topics]),
                          topic_progress=topic_progress)
 
 
@@ -62,16 +46,13 @@ def topic_detail(slug):
     ).order_by(Lab.order).all()
     
     # Get user progress if logged in
-    completed_labs = []
+    completed_labs = set()
     if current_user.is_authenticated:
-        submissions = LabSubmission.query.filter_by(
-            user_id=current_user.id,
-            is_correct=True
-        ).all()
-        completed_labs = [s.lab_id for s in submissions]
+        completed_labs = get_completed_lab_ids(current_user.id, [lab.id for lab in labs])
     
     return render_template('topics/detail.html',
                          topic=topic,
+                         stats=get_topic_stats([topic.id])[topic.id],
                          courses=courses,
                          labs=labs,
                          completed_labs=completed_labs)
@@ -81,4 +62,5 @@ def topic_detail(slug):
 def api_list_topics():
     """API endpoint for topics"""
     topics = Topic.query.filter_by(is_active=True).order_by(Topic.order).all()
-    return jsonify([topic.to_dict() for topic in topics])
+    stats = get_topic_stats([topic.id for topic in topics])
+    return jsonify([topic.to_dict(stats[topic.id]) for topic in topics])
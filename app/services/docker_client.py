@@ -0,0 +1,133 @@
+"""
+Managed Docker Client
+One long-lived, pooled Docker connection per process with periodic
+health checks, reconnect backoff and a circuit breaker that fails fast
+while the daemon is down.
+"""
+import docker
+import os
+import threading
+import time
+
+import requests
+
+# Seconds a successful ping stays valid before the next health check
+HEALTH_CHECK_INTERVAL = int(os.environ.get('DOCKER_HEALTH_CHECK_INTERVAL', 30))
+
+# HTTP connections kept open to the daemon
+CONNECTION_POOL_SIZE = int(os.environ.get('DOCKER_CONNECTION_POOL_SIZE', 20))
+
+# Consecutive failures before the circuit opens
+FAILURE_THRESHOLD = int(os.environ.get('DOCKER_FAILURE_THRESHOLD', 3))
+
+# Reconnect backoff (seconds), doubled per failure up to the maximum
+BACKOFF_BASE = 1
+BACKOFF_MAX = 60
+
+
+class DockerClientManager:
+    """Process-wide Docker client with health checking and circuit breaking"""
+    
+    def __init__(self, factory=None):
+        self._factory = factory or (lambda: docker.from_env(max_pool_size=CONNECTION_POOL_SIZE))
+        self._client = None
+        self._lock = threading.Lock()
+        self._last_healthy = 0
+        self._failures = 0
+        self._retry_at = 0
+    
+    @property
+    def circuit_open(self):
+        return self._failures >= FAILURE_THRESHOLD and time.monotonic() < self._retry_at
+    
+    def get_client(self):
+        """Return a healthy client, or None when the daemon is unreachable"""
+        now = time.monotonic()
+        if self._client and now - self._last_healthy < HEALTH_CHECK_INTERVAL:
+            return self._client
+        
+        with self._lock:
+            now = time.monotonic()
+            if self._client and now - self._last_healthy < HEALTH_CHECK_INTERVAL:
+                return self._client
+            
+            # Circuit is open - fail fast until the backoff expires
+            if now < self._retry_at:
+                return None
+            
+            try:
+                if self._client is None:
+                    self._client = self._factory()
+                self._client.ping()
+            except Exception as e:
+                self._record_failure(e)
+                return None
+            
+            self._failures = 0
+            self._retry_at = 0
+            self._last_healthy = time.monotonic()
+            return self._client
+    
+    def report_error(self, error):
+        """Feed an API error back so connection failures trigger a health check"""
+        if isinstance(error, (requests.exceptions.ConnectionError, docker.errors.DockerException)) \
+                and not isinstance(error, docker.errors.APIError):
+            with self._lock:
+                self._last_healthy = 0
+    
+    def _record_failure(self, error):
+        self._failures += 1
+        self._last_healthy = 0
+        
+        # Open the circuit once failures pile up, backing off exponentially
+        delay = 0
+        if self._failures >= FAILURE_THRESHOLD:
+            delay = min(BACKOFF_BASE * (2 ** (self._failures - FAILURE_THRESHOLD)), BACKOFF_MAX)
+        self._retry_at = time.monotonic() + delay
+        
+        # Drop the client so the next attempt rebuilds the connection pool
+        if self._client is not None:
+            try:
+                self._client.close()
+            except Exception:
+                pass
+            self._client = None
+        
+        print(f"Docker connection error ({self._failures} consecutive, retry in {delay}s): {error}")
+    
+    def reset(self):
+        """Forget the cached client and breaker state"""
+        with self._lock:
+            if self._client is not None:
+                try:
+                    self._client.close()
+                except Exception:
+                    pass
+            self._client = None
+            self._failures = 0
+            self._retry_at = 0
+            self._last_healthy = 0
+    
+    def get_stats(self):
+        return {
+            'connected': self._client is not None,
+            'consecutive_failures': self._failures,
+            'circuit_open': self.circuit_open
+        }
+
+
+_manager = DockerClientManager()
+
+
+def get_client():
+    """Get the shared Docker client for this process"""
+    return _manager.get_client()
+
+
+def report_error(error):
+    """Report a failed Docker API call to the shared client manager"""
+    _manager.report_error(error)
+
+
+def get_manager():
+    return _manager
@@ -0,0 +1,189 @@
+"""
+Lab Image Manager
+Builds or verifies every LAB_IMAGES entry ahead of time and caches the
+result in memory per Docker node, keyed by a content hash of the lab's
+build context. Images are only rebuilt when a file under labs/<lab>/ changes.
+
+Labs build with labs/ as the context, like `docker build -f
+labs/<lab>/Dockerfile labs`: the context holds the lab's directory and
+labs/common/ (the tenancy runtime), which every Dockerfile COPYs from.
+"""
+import docker
+import hashlib
+import io
+import os
+import tarfile
+import threading
+
+from app.services import lab_nodes
+from app.services.lab_orchestrator import LAB_IMAGES, get_docker_client
+
+HASH_LABEL = 'webnox.context_hash'
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Shared files merged into every lab's build context
+COMMON_DIR = os.path.join(BASE_DIR, 'labs', 'common')
+
+# Files that never affect the built image
+IGNORED_DIRS = {'__pycache__', '.git'}
+IGNORED_SUFFIXES = ('.pyc', '.pyo')
+
+# (node name, lab_slug) -> context hash of the image known to be present
+_ready = {}
+_ready_lock = threading.Lock()
+_build_locks = {}
+
+
+def get_build_path(lab_slug):
+    return os.path.join(BASE_DIR, LAB_IMAGES[lab_slug]['build_path'])
+
+
+def _walk(directory):
+    for root, dirs, files in os.walk(directory):
+        dirs[:] = sorted(d for d in dirs if d not in IGNORED_DIRS)
+        for name in sorted(files):
+            if not name.endswith(IGNORED_SUFFIXES):
+                path = os.path.join(root, name)
+                yield os.path.relpath(path, directory), path
+
+
+def get_dockerfile(build_path):
+    """The lab's Dockerfile, relative to the labs/ build context"""
+    return f"{os.path.basename(build_path)}/Dockerfile"
+
+
+def get_context_files(build_path):
+    """(name in context, path on disk) of a lab's files and the common ones, relative to labs/"""
+    files = [(f"{os.path.basename(build_path)}/{name}", path) for name, path in _walk(build_path)]
+    if os.path.isdir(COMMON_DIR):
+        files.extend((f"common/{name}", path) for name, path in _walk(COMMON_DIR))
+    return files
+
+
+def compute_context_hash(build_path):
+    """SHA-256 over the relative paths and contents of a build context"""
+    digest = hashlib.sha256()
+    for name, path in get_context_files(build_path):
+        digest.update(name.encode())
+        with open(path, 'rb') as f:
+            digest.update(f.read())
+    return digest.hexdigest()
+
+
+def build_context(build_path):
+    """In-memory tar of a lab's build context, ready for images.build(custom_context=True)"""
+    fileobj = io.BytesIO()
+    with tarfile.open(fileobj=fileobj, mode='w') as tar:
+        for name, path in get_context_files(build_path):
+            tar.add(path, arcname=name)
+    fileobj.seek(0)
+    return fileobj
+
+
+def _build_lock(key):
+    with _ready_lock:
+        return _build_locks.setdefault(key, threading.Lock())
+
+
+def is_image_ready(lab_slug, node=None):
+    """Memory-only check used on the lab start path"""
+    return (lab_nodes.resolve_name(node), lab_slug) in _ready
+
+
+def ensure_image(lab_slug, refresh=False, node=None):
+    """
+    Make sure the image for a lab exists on a node and matches its build
+    context. With refresh=False a previously verified image is trusted
+    without touching disk or Docker. Returns (success, message).
+    """
+    key = (lab_nodes.resolve_name(node), lab_slug)
+    if not refresh and key in _ready:
+        return True, "Image exists"
+    
+    lab_config = LAB_IMAGES.get(lab_slug)
+    if not lab_config:
+        return False, f"Unknown lab: {lab_slug}"
+    
+    build_path = get_build_path(lab_slug)
+    if not os.path.exists(build_path):
+        return False, f"Build path not found: {build_path}"
+    
+    client = get_docker_client(key[0])
+    if not client:
+        return False, "Docker not available"
+    
+    with _build_lock(key):
+        context_hash = compute_context_hash(build_path)
+        if _ready.get(key) == context_hash:
+            return True, "Image exists"
+        
+        image_name = lab_config['image']
+        try:
+            try:
+                image = client.images.get(image_name)
+                if image.labels.get(HASH_LABEL) == context_hash:
+                    _mark_ready(key, context_hash)
+                    return True, "Image exists"
+            except docker.errors.ImageNotFound:
+                pass
+            
+            print(f"Building image {image_name} on node {key[0]} from {build_path}...")
+            client.images.build(
+                fileobj=build_context(build_path),
+                custom_context=True,
+                dockerfile=get_dockerfile(build_path),
+                tag=image_name,
+                rm=True,
+                labels={HASH_LABEL: context_hash}
+            )
+            print(f"Image {image_name} built successfully")
+            _mark_ready(key, context_hash)
+            return True, "Image built"
+        
+        except Exception as e:
+            return False, str(e)
+
+
+def _mark_ready(key, context_hash):
+    with _ready_lock:
+        _ready[key] = context_hash
+
+
+def invalidate(lab_slug=None):
+    """Forget cached image state (on every node) so the next ensure_image re-verifies"""
+    with _ready_lock:
+        for key in list(_ready):
+            if lab_slug is None or key[1] == lab_slug:
+                del _ready[key]
+
+
+def prebuild_images():
+    """Verify or build every lab image on every node, rebuilding those whose context changed"""
+    return {
+        node.name: {lab_slug: ensure_image(lab_slug, refresh=True, node=node.name) for lab_slug in LAB_IMAGES}
+        for node in lab_nodes.get_nodes()
+    }
+
+
+def get_image_stats():
+    with _ready_lock:
+        return {
+            node.name: {slug: _ready.get((node.name, slug)) for slug in LAB_IMAGES}
+            for node in lab_nodes.get_nodes()
+        }
+
+
+def init_app(app):
+    """Pre-build lab images in the background and register the CLI command"""
+    
+    @app.cli.command('build-lab-images')
+    def build_lab_images_command():
+        """Build or verify every lab Docker image."""
+        for node_name, results in prebuild_images().items():
+            for lab_slug, (success, message) in results.items():
+                print(f"{node_name}/{lab_slug}: {message}")
+    
+    if app.config.get('LAB_BACKGROUND_TASKS') and \
+            os.environ.get('LAB_PREBUILD_IMAGES', 'true').lower() == 'true':
+        threading.Thread(target=prebuild_images, name='webnox-image-prebuild', daemon=True).start()
@@ -0,0 +1,65 @@
+"""
+Lab Backends
+What actually runs lab instances on a node. Every backend hands out a
+client shaped like docker.DockerClient, and the orchestrator, reaper,
+idle detector, freezer, reconciler, warm pool and port allocator only
+use this part of it:
+
+    client.ping() / client.info() -> {'MemTotal', 'NCPU'} / client.close()
+    client.events(decode=True, filters={'event': [...], ...})
+    client.images.get(tag) -> image with .labels
+    client.images.build(fileobj=<tar>, custom_context=True, tag=..., labels=...)
+    client.containers.run(image, name=..., ports=..., environment=...,
+                          labels=..., mem_limit=..., ...) -> container
+    client.containers.get(id_or_name) / .list(all=..., filters={'label': ...})
+    container.id / .name / .status / .labels / .ports / .attrs
+    container.stop() / .remove(force=True) / .pause() / .unpause()
+    container.rename(name) / .stats(stream=False, one_shot=True)
+
+Failures are reported with docker.errors (NotFound, ImageNotFound,
+APIError). Built-in backends:
+
+    docker   - a Docker daemon (the default)
+    process  - labs as local processes (lab_processes)
+    fake     - in-memory, for load testing (lab_fake)
+
+More can be added with register_backend.
+"""
+import docker
+
+from app.services import lab_fake, lab_processes
+from app.services.docker_client import CONNECTION_POOL_SIZE
+
+
+def docker_backend(url=None):
+    if url:
+        return docker.DockerClient(base_url=url, max_pool_size=CONNECTION_POOL_SIZE)
+    return docker.from_env(max_pool_size=CONNECTION_POOL_SIZE)
+
+
+def process_backend(url=None):
+    return lab_processes.get_client()
+
+
+def fake_backend(url=None):
+    return lab_fake.get_client()
+
+
+# name -> func(url) returning a client for a node
+BACKENDS = {
+    'docker': docker_backend,
+    'process': process_backend,
+    'fake': fake_backend
+}
+
+
+def register_backend(name, func):
+    BACKENDS[name] = func
+
+
+def get_factory(backend, url=None):
+    """Zero-argument client factory for a node using this backend"""
+    create = BACKENDS.get(backend)
+    if create is None:
+        raise ValueError(f"Unknown lab backend: {backend}")
+    return lambda: create(url)
@@ -0,0 +1,207 @@
+"""
+Lab Capacity Accounting
+Tracks how many lab containers the nodes can take - a global instance
+limit plus per-node instance caps and memory and CPU budgets against
+each Docker host's totals, every container reserving its lab's resource
+profile - and how long a queued start request is likely to wait for a
+slot.
+"""
+import math
+import os
+import threading
+import time
+from datetime import datetime
+
+from app.services import lab_nodes, lab_resources
+from app.services.lab_orchestrator import get_docker_client
+
+# Hard cap on concurrent lab containers (0 = limited by the budgets only)
+MAX_INSTANCES = int(os.environ.get('LAB_MAX_INSTANCES', 0))
+
+# Concurrent labs (queued, starting, running or frozen) per user
+MAX_INSTANCES_PER_USER = int(os.environ.get('LAB_MAX_INSTANCES_PER_USER', 3))
+
+# Fraction of host memory lab containers may reserve
+MEMORY_BUDGET_FRACTION = float(os.environ.get('LAB_MEMORY_BUDGET_FRACTION', 0.8))
+
+# CPU overcommit - most labs sit idle, so reserved CPU may exceed the cores
+CPU_OVERCOMMIT = float(os.environ.get('LAB_CPU_OVERCOMMIT', 4.0))
+
+# Seconds the host totals from docker info are cached
+HOST_INFO_TTL = 60
+
+# Statuses holding host resources: memory for all of them, CPU for the non-frozen
+MEMORY_STATUSES = ('starting', 'running', 'frozen', 'resetting')
+CPU_STATUSES = ('starting', 'running', 'resetting')
+
+# node name -> {'memory', 'cpus', 'fetched_at'}
+_host_info = {}
+_host_info_lock = threading.Lock()
+
+
+def get_host_totals(node=None):
+    """(memory bytes, cpu count) of a Docker node, cached; None values if unknown"""
+    name = lab_nodes.resolve_name(node)
+    with _host_info_lock:
+        info = _host_info.setdefault(name, {'memory': None, 'cpus': None, 'fetched_at': 0})
+        if time.monotonic() - info['fetched_at'] < HOST_INFO_TTL:
+            return info['memory'], info['cpus']
+        
+        client = get_docker_client(name)
+        if client:
+            try:
+                host = client.info()
+                info['memory'] = host.get('MemTotal')
+                info['cpus'] = host.get('NCPU')
+                info['fetched_at'] = time.monotonic()
+            except Exception as e:
+                print(f"Failed to read Docker host info for node {name}: {e}")
+        return info['memory'], info['cpus']
+
+
+def _free_slots(memory_reserved, cpu_reserved, running, max_instances, host_memory, host_cpus, slot):
+    """Containers of the slot's size that still fit under every configured limit (None if unlimited)"""
+    limits = []
+    if max_instances > 0:
+        limits.append(max_instances - running)
+    if host_memory:
+        limits.append(int((host_memory * MEMORY_BUDGET_FRACTION - memory_reserved) // slot['memory']))
+    if host_cpus:
+        limits.append(int((host_cpus * CPU_OVERCOMMIT - cpu_reserved) // slot['cpu']))
+    return max(min(limits), 0) if limits else None
+
+
+def get_node_capacities():
+    """Per-node usage and free slots, from one grouped query over all nodes"""
+    from app.models.lab import Lab
+    from app.models.lab_instance import LabInstance
+    from app import db
+    
+    usage = {}
+    # Starting instances without a node have not been placed yet; tenants share a container
+    rows = db.session.query(LabInstance.node, LabInstance.status, Lab.slug, db.func.count(LabInstance.id)).join(
+        Lab, Lab.id == LabInstance.lab_id
+    ).filter(
+        LabInstance.status.in_(MEMORY_STATUSES),
+        LabInstance.tenant == None,
+        db.not_(db.and_(LabInstance.status == 'starting', LabInstance.node == None))
+    ).group_by(LabInstance.node, LabInstance.status, Lab.slug).all()
+    for node, status, lab_slug, count in rows:
+        profile = lab_resources.get_profile(lab_slug)
+        node_usage = usage.setdefault(lab_nodes.resolve_name(node), {'running': 0, 'frozen': 0, 'memory': 0, 'cpu': 0.0})
+        node_usage['memory'] += count * profile['memory']
+        if status in CPU_STATUSES:
+            node_usage['running'] += count
+            node_usage['cpu'] += count * profile['cpu']
+        else:
+            node_usage['frozen'] += count
+    
+    slot = lab_resources.get_slot_profile()
+    capacities = {}
+    for node in lab_nodes.get_nodes():
+        node_usage = usage.get(node.name, {'running': 0, 'frozen': 0, 'memory': 0, 'cpu': 0.0})
+        host_memory, host_cpus = get_host_totals(node.name)
+        capacities[node.name] = {
+            'running': node_usage['running'],
+            'frozen': node_usage['frozen'],
+            'memory_reserved_bytes': node_usage['memory'],
+            'cpu_reserved': node_usage['cpu'],
+            'host_memory_bytes': host_memory,
+            'host_cpus': host_cpus,
+            'free_slots': _free_slots(
+                node_usage['memory'], node_usage['cpu'], node_usage['running'],
+                node.max_instances, host_memory, host_cpus, slot
+            )
+        }
+    return capacities
+
+
+def get_capacity():
+    """Current usage across all nodes and the number of additional containers that fit"""
+    from app.models.lab_instance import LabInstance
+    
+    nodes = get_node_capacities()
+    
+    def total(key):
+        values = [capacity[key] for capacity in nodes.values()]
+        return None if None in values else sum(values)
+    
+    # Admitted starts that have not picked a node yet still hold a slot
+    unplaced = LabInstance.query.filter(
+        LabInstance.status == 'starting',
+        LabInstance.node == None,
+        LabInstance.tenant == None
+    ).count()
+    
+    running = sum(capacity['running'] for capacity in nodes.values()) + unplaced
+    free_slots = total('free_slots')
+    if free_slots is not None:
+        free_slots = max(free_slots - unplaced, 0)
+    if MAX_INSTANCES > 0:
+        global_free = max(MAX_INSTANCES - running, 0)
+        free_slots = global_free if free_slots is None else min(free_slots, global_free)
+    
+    return {
+        'running': running,
+        'frozen': sum(capacity['frozen'] for capacity in nodes.values()),
+        'memory_reserved_bytes': sum(capacity['memory_reserved_bytes'] for capacity in nodes.values()),
+        'cpu_reserved': sum(capacity['cpu_reserved'] for capacity in nodes.values()),
+        'host_memory_bytes': total('host_memory_bytes'),
+        'host_cpus': total('host_cpus'),
+        'free_slots': free_slots,
+        'nodes': nodes
+    }
+
+
+def check_user_limit(user_id):
+    """(allowed, message) for a new lab start by this user"""
+    from app.models.lab_instance import LabInstance
+    
+    if MAX_INSTANCES_PER_USER <= 0:
+        return True, None
+    
+    active = LabInstance.query.filter(
+        LabInstance.user_id == user_id,
+        LabInstance.status.in_(LabInstance.ACTIVE_STATUSES)
+    ).count()
+    if active >= MAX_INSTANCES_PER_USER:
+        return False, f"You already have {active} labs running. Stop one before starting another."
+    return True, None
+
+
+def get_queue_position(instance):
+    """0-based position of a queued instance in the FIFO admission queue"""
+    from app.models.lab_instance import LabInstance
+    from app import db
+    
+    return LabInstance.query.filter(
+        LabInstance.status == 'queued',
+        db.or_(
+            LabInstance.created_at < instance.created_at,
+            db.and_(LabInstance.created_at == instance.created_at, LabInstance.id < instance.id)
+        )
+    ).count()
+
+
+def estimate_wait_seconds(position):
+    """
+    Seconds until a slot frees for the request at this queue position,
+    assuming running labs leave no later than their expiry.
+    """
+    from app.models.lab_instance import LabInstance
+    from app import db
+    
+    capacity = get_capacity()
+    if capacity['free_slots'] is None or capacity['free_slots'] > position:
+        return 0
+    
+    needed = position - capacity['free_slots']
+    expires_at = db.session.query(LabInstance.expires_at).filter(
+        LabInstance.status.in_(('running', 'frozen')),
+        LabInstance.tenant == None,
+        LabInstance.expires_at != None
+    ).order_by(LabInstance.expires_at).offset(needed).limit(1).scalar()
+    
+    if expires_at is None:
+        return None
+    return max(math.ceil((expires_at - datetime.utcnow()).total_seconds()), 0)
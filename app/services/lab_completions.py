@@ -0,0 +1,82 @@
+"""
+Lab Completion Counters
+labs.completions counts the users who solved each lab. It is bumped in
+the transaction that records a user's first correct submission and
+lowered when a user's submissions are deleted, so catalog pages read one
+column instead of counting lab_submissions per lab.
+`flask recount-lab-completions` rebuilds the counters from the submissions.
+"""
+
+
+def record_completion(lab_id):
+    """Count a first correct submission; committed with the caller's transaction"""
+    from app.models.lab import Lab
+    from app import db
+    
+    # Incremented in SQL so concurrent solvers never overwrite each other
+    db.session.execute(
+        db.update(Lab).where(Lab.id == lab_id).values(completions=Lab.completions + 1)
+    )
+
+
+def forget_user(user_id):
+    """Uncount the labs a user solved, before their submissions are deleted"""
+    from app.models.lab import Lab, LabSubmission
+    from app import db
+    
+    solved = db.session.query(LabSubmission.lab_id).filter_by(
+        user_id=user_id,
+        is_correct=True
+    ).distinct().all()
+    for (lab_id,) in solved:
+        db.session.execute(
+            db.update(Lab).where(Lab.id == lab_id, Lab.completions > 0).values(completions=Lab.completions - 1)
+        )
+
+
+def count_completions():
+    """lab id -> users with a correct submission, from lab_submissions"""
+    from app.models.lab import LabSubmission
+    from app import db
+    
+    return dict(
+        db.session.query(LabSubmission.lab_id, db.func.count(db.distinct(LabSubmission.user_id)))
+        .filter(LabSubmission.is_correct == True)
+        .group_by(LabSubmission.lab_id)
+    )
+
+
+def recount_completions():
+    """
+    Rebuild every lab's counter from lab_submissions in one UPDATE.
+    Returns {lab_id: (stored, actual)} for the labs that had drifted.
+    """
+    from app.models.lab import Lab, LabSubmission
+    from app import db
+    
+    actual = count_completions()
+    drifted = {
+        lab_id: (completions, actual.get(lab_id, 0))
+        for lab_id, completions in db.session.query(Lab.id, Lab.completions)
+        if completions != actual.get(lab_id, 0)
+    }
+    
+    solvers = db.select(db.func.count(db.distinct(LabSubmission.user_id))).where(
+        LabSubmission.lab_id == Lab.id,
+        LabSubmission.is_correct == True
+    ).scalar_subquery()
+    db.session.execute(db.update(Lab).values(completions=solvers))
+    db.session.commit()
+    return drifted
+
+
+def init_app(app):
+    """Register the CLI command"""
+    
+    @app.cli.command('recount-lab-completions')
+    def recount_lab_completions_command():
+        """Rebuild the lab completion counters from the submissions."""
+        drifted = recount_completions()
+        for lab_id, (stored, actual) in sorted(drifted.items()):
+            print(f"Lab {lab_id}: {stored} -> {actual}")
+        print(f"Recounted lab completions ({len(drifted)} labs corrected)")
@@ -0,0 +1,231 @@
+"""
+Lab Lifecycle Events
+Fans lab instance transitions (queued, starting, running, frozen,
+stopping, stopped, expired, ...) out to Server-Sent Events streams on
+the lab detail page. Transitions go through Redis pub/sub when REDIS_URL
+is set, so every web process hears about every transition and drops its
+cached status for it; otherwise they stay in-process.
+
+Each open stream is a subscriber queue that sleeps until an event or a
+heartbeat is due - it never polls the database.
+"""
+import json
+import os
+import queue
+import threading
+import time
+import uuid
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+CHANNEL = 'webnox:lab_events'
+
+# Seconds between keep-alive comments on an idle stream
+HEARTBEAT_INTERVAL = int(os.environ.get('LAB_EVENTS_HEARTBEAT', 15))
+
+# Streams are closed after this many seconds; EventSource reconnects on its own
+STREAM_LIFETIME = int(os.environ.get('LAB_EVENTS_STREAM_LIFETIME', 300))
+
+# Open streams per process; beyond this clients fall back to polling
+MAX_STREAMS = int(os.environ.get('LAB_EVENTS_MAX_STREAMS', 1000))
+
+# Milliseconds EventSource waits before reconnecting
+RETRY_MS = 3000
+
+# Identifies this process's own messages on the shared channel
+ORIGIN = uuid.uuid4().hex
+
+_broker = None
+_broker_lock = threading.Lock()
+
+# (user_id, lab_id) -> set of Subscription
+_subscribers = {}
+_subscribers_lock = threading.Lock()
+_stream_count = 0
+
+
+class Subscription:
+    """One open event stream for a user's lab"""
+    
+    def __init__(self, user_id, lab_id):
+        self.user_id = user_id
+        self.lab_id = lab_id
+        self.status = None  # Last status sent, so queue moves reach queued streams
+        self.events = queue.Queue()
+
+
+class InProcessBroker:
+    """Delivers transitions to streams in this process only"""
+    
+    def publish(self, events):
+        _deliver(events)
+
+
+class RedisBroker:
+    """Delivers transitions to streams in every process through Redis pub/sub"""
+    
+    def __init__(self, url):
+        self._redis = redis.Redis.from_url(url)
+        self._redis.ping()
+        self._listener = threading.Thread(target=self._listen, name='webnox-lab-events-listener', daemon=True)
+        self._listener.start()
+    
+    def publish(self, events):
+        # Local streams hear it right away; other processes through the channel
+        _deliver(events)
+        self._redis.publish(CHANNEL, json.dumps({'origin': ORIGIN, 'events': events}))
+    
+    def _listen(self):
+        while True:
+            try:
+                pubsub = self._redis.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(CHANNEL)
+                for message in pubsub.listen():
+                    payload = json.loads(message['data'])
+                    if payload.get('origin') != ORIGIN:
+                        _apply_remote(payload['events'])
+            except Exception as e:
+                print(f"Lab events listener error: {e}")
+                time.sleep(1)
+
+
+def get_broker():
+    """Get the event broker, preferring Redis when configured and reachable"""
+    global _broker
+    
+    with _broker_lock:
+        if _broker is None:
+            redis_url = os.environ.get('REDIS_URL')
+            if redis and redis_url:
+                try:
+                    _broker = RedisBroker(redis_url)
+                except Exception as e:
+                    print(f"Redis unavailable for lab events, using in-process delivery: {e}")
+            if _broker is None:
+                _broker = InProcessBroker()
+    return _broker
+
+
+def publish(events):
+    """
+    Announce committed transitions, each a dict with user_id, lab_id,
+    status and an optional reason ('expired', 'idle', 'evicted').
+    """
+    if not events:
+        return
+    try:
+        get_broker().publish(events)
+    except Exception as e:
+        print(f"Failed to publish lab events: {e}")
+
+
+def _apply_remote(events):
+    """Transitions committed by another process: drop stale cache entries, then deliver"""
+    from app.services import lab_status
+    
+    for event in events:
+        lab_status.invalidate(event['user_id'], event['lab_id'])
+    if any(event['status'] != 'queued' for event in events):
+        lab_status.invalidate_queued()
+    _deliver(events)
+
+
+def _deliver(events):
+    with _subscribers_lock:
+        for event in events:
+            for subscription in _subscribers.get((event['user_id'], event['lab_id']), ()):
+                subscription.events.put(event)
+        
+        # Any other transition may move the queue - nudge the waiting streams
+        if any(event['status'] != 'queued' for event in events):
+            for subscriptions in _subscribers.values():
+                for subscription in subscriptions:
+                    if subscription.status == 'queued':
+                        subscription.events.put({'status': 'queued', 'reason': None})
+
+
+def subscribe(user_id, lab_id):
+    """Open a subscription, or None when this process already serves MAX_STREAMS"""
+    global _stream_count
+    
+    get_broker()
+    subscription = Subscription(user_id, lab_id)
+    with _subscribers_lock:
+        if _stream_count >= MAX_STREAMS:
+            return None
+        _stream_count += 1
+        _subscribers.setdefault((user_id, lab_id), set()).add(subscription)
+    return subscription
+
+
+def unsubscribe(subscription):
+    global _stream_count
+    
+    with _subscribers_lock:
+        subscriptions = _subscribers.get((subscription.user_id, subscription.lab_id))
+        if subscriptions and subscription in subscriptions:
+            subscriptions.discard(subscription)
+            _stream_count -= 1
+            if not subscriptions:
+                del _subscribers[(subscription.user_id, subscription.lab_id)]
+
+
+def _format(data):
+    return f"data: {json.dumps(data)}\n\n"
+
+
+def stream(app, subscription):
+    """
+    Generator of SSE frames for a subscription: the current status, then
+    one frame per transition. Each status read runs in a short-lived app
+    context so an idle stream holds no database connection.
+    """
+    from app.services import lab_status
+    
+    def read_status():
+        with app.app_context():
+            return lab_status.get_status(subscription.user_id, subscription.lab_id)
+    
+    try:
+        yield f"retry: {RETRY_MS}\n\n"
+        
+        data, last_etag = read_status()
+        subscription.status = data['status']
+        yield _format(data)
+        
+        deadline = time.monotonic() + STREAM_LIFETIME
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            try:
+                event = subscription.events.get(timeout=min(HEARTBEAT_INTERVAL, remaining))
+            except queue.Empty:
+                yield ": keepalive\n\n"
+                continue
+            
+            # Collapse a burst of transitions into one frame, keeping the notable reason
+            reason = event.get('reason')
+            while True:
+                try:
+                    event = subscription.events.get_nowait()
+                except queue.Empty:
+                    break
+                reason = event.get('reason') or reason
+            
+            data, etag = read_status()
+            if etag == last_etag and not reason:
+                continue
+            last_etag = etag
+            subscription.status = data['status']
+            yield _format(dict(data, transition=reason or data['status']))
+    finally:
+        unsubscribe(subscription)
+
+
+def get_stream_stats():
+    with _subscribers_lock:
+        return {'streams': _stream_count, 'subscribed_labs': len(_subscribers), 'max_streams': MAX_STREAMS}
@@ -0,0 +1,271 @@
+"""
+Fake Lab Backend
+An in-memory backend for load testing: "containers" are plain objects,
+images build instantly and nothing listens on the lab URLs. Starts take
+LAB_FAKE_START_LATENCY seconds and a deterministic share of them fails
+(LAB_FAKE_FAILURE_RATE), so the web, queue and database layers can be
+driven with thousands of concurrent lab starts on one box.
+
+Failures are spread evenly rather than drawn at random: with a rate of
+0.1 exactly one start in every ten fails, whatever the timing.
+"""
+import os
+import queue
+import threading
+import time
+import uuid
+
+import docker
+
+# Seconds containers.run blocks, like booting a container
+START_LATENCY = float(os.environ.get('LAB_FAKE_START_LATENCY', 0.5))
+
+# Seconds stop/remove block
+STOP_LATENCY = float(os.environ.get('LAB_FAKE_STOP_LATENCY', 0.1))
+
+# Share of starts that fail (0.0 - 1.0)
+FAILURE_RATE = float(os.environ.get('LAB_FAKE_FAILURE_RATE', 0))
+
+# Host totals reported to capacity accounting (defaults fit 10k labs)
+HOST_MEMORY = int(os.environ.get('LAB_FAKE_HOST_MEMORY', 4 * 1024 ** 4))
+HOST_CPUS = int(os.environ.get('LAB_FAKE_HOST_CPUS', 1024))
+
+
+class FakeError(docker.errors.APIError):
+    """An injected backend failure"""
+
+
+class FakeContainer:
+    """A container that only exists in memory"""
+    
+    def __init__(self, client, name, image, labels, ports):
+        self.client = client
+        self.id = uuid.uuid4().hex
+        self.name = name
+        self.image = image
+        self.labels = labels
+        self.ports = {
+            container_port: [{'HostIp': '0.0.0.0', 'HostPort': str(host_port)}]
+            for container_port, host_port in (ports or {}).items()
+        }
+        self.status = 'running'
+    
+    @property
+    def attrs(self):
+        return {
+            'Id': self.id,
+            'Name': self.name,
+            'Config': {'Labels': self.labels},
+            'State': {'Status': self.status},
+            'NetworkSettings': {'Ports': self.ports}
+        }
+    
+    def reload(self):
+        pass
+    
+    def rename(self, name):
+        self.client.rename(self, name)
+    
+    def pause(self):
+        self.status = 'paused'
+    
+    def unpause(self):
+        self.status = 'running'
+    
+    def stop(self, timeout=10):
+        time.sleep(STOP_LATENCY)
+        self.status = 'exited'
+        self.client.emit(self, 'die')
+    
+    def kill(self, signal=None):
+        self.status = 'exited'
+        self.client.emit(self, 'die')
+    
+    def remove(self, force=False, v=False):
+        if self.status in ('running', 'paused') and not force:
+            raise FakeError(f"Container {self.name} is running, stop it first")
+        time.sleep(STOP_LATENCY)
+        self.client.forget(self)
+    
+    def stats(self, stream=False, one_shot=True, decode=None):
+        return {
+            'memory_stats': {'usage': 32 * 1024 ** 2, 'limit': 256 * 1024 ** 2},
+            'networks': {'eth0': {'rx_bytes': 0, 'tx_bytes': 0}}
+        }
+
+
+class FakeImage:
+    def __init__(self, tag, labels):
+        self.id = tag
+        self.tags = [tag]
+        self.labels = labels
+
+
+class FakeImages:
+    def __init__(self):
+        self._images = {}
+        self.builds = 0
+    
+    def get(self, name):
+        if name not in self._images:
+            raise docker.errors.ImageNotFound(f"No such image: {name}")
+        return self._images[name]
+    
+    def build(self, tag=None, labels=None, **kwargs):
+        self.builds += 1
+        self._images[tag] = FakeImage(tag, labels or {})
+        return self._images[tag], iter(())
+
+
+class FakeContainers:
+    def __init__(self, client):
+        self.client = client
+    
+    def run(self, image, name=None, ports=None, labels=None, **kwargs):
+        self.client.images.get(image)
+        time.sleep(START_LATENCY)
+        if self.client.should_fail():
+            raise FakeError(f"Injected start failure for {name}")
+        
+        container = FakeContainer(self.client, name or uuid.uuid4().hex[:12], image, dict(labels or {}), ports)
+        self.client.add(container)
+        return container
+    
+    def get(self, container_id):
+        container = self.client.find(container_id)
+        if container is None:
+            raise docker.errors.NotFound(f"No such container: {container_id}")
+        return container
+    
+    def list(self, all=False, filters=None, **kwargs):
+        wanted = (filters or {}).get('label') or []
+        if isinstance(wanted, str):
+            wanted = [wanted]
+        
+        containers = []
+        for container in self.client.all():
+            if not all and container.status not in ('running', 'paused'):
+                continue
+            if _labels_match(container.labels, wanted):
+                containers.append(container)
+        return containers
+
+
+def _labels_match(labels, selectors):
+    """Whether labels satisfy every 'key' / 'key=value' filter"""
+    for selector in selectors:
+        key, _, value = selector.partition('=')
+        if key not in labels or (value and labels[key] != value):
+            return False
+    return True
+
+
+class FakeClient:
+    """docker.DockerClient look-alike keeping everything in memory"""
+    
+    def __init__(self, failure_rate=None):
+        self.failure_rate = FAILURE_RATE if failure_rate is None else failure_rate
+        self.containers = FakeContainers(self)
+        self.images = FakeImages()
+        self._containers = {}
+        self._names = {}
+        self._lock = threading.Lock()
+        self._subscribers = []
+        self._stats = {'starts': 0, 'failures': 0}
+    
+    def should_fail(self):
+        """Evenly spread injected failures: start n fails when n * rate crosses an integer"""
+        with self._lock:
+            self._stats['starts'] += 1
+            starts = self._stats['starts']
+            failed = int(starts * self.failure_rate) > int((starts - 1) * self.failure_rate)
+            if failed:
+                self._stats['failures'] += 1
+            return failed
+    
+    def add(self, container):
+        with self._lock:
+            if container.name in self._names:
+                raise FakeError(f"Conflict: the name {container.name} is already in use")
+            self._containers[container.id] = container
+            self._names[container.name] = container.id
+    
+    def forget(self, container):
+        with self._lock:
+            self._containers.pop(container.id, None)
+            self._names.pop(container.name, None)
+        self.emit(container, 'destroy')
+    
+    def rename(self, container, name):
+        with self._lock:
+            if name in self._names and self._names[name] != container.id:
+                raise FakeError(f"Conflict: the name {name} is already in use")
+            self._names.pop(container.name, None)
+            self._names[name] = container.id
+            container.name = name
+    
+    def find(self, container_id):
+        with self._lock:
+            container_id = self._names.get(container_id, container_id)
+            return self._containers.get(container_id)
+    
+    def all(self):
+        with self._lock:
+            return list(self._containers.values())
+    
+    def ping(self):
+        return True
+    
+    def info(self):
+        return {'MemTotal': HOST_MEMORY, 'NCPU': HOST_CPUS, 'OperatingSystem': 'webnox fake backend'}
+    
+    def events(self, decode=True, filters=None, **kwargs):
+        """Blocking stream of lifecycle events ({'id', 'status', 'Actor'}) like the daemon's"""
+        wanted = set((filters or {}).get('event') or ())
+        events = queue.Queue()
+        with self._lock:
+            self._subscribers.append(events)
+        
+        def stream():
+            try:
+                while True:
+                    event = events.get()
+                    if not wanted or event['status'] in wanted:
+                        yield event
+            finally:
+                with self._lock:
+                    self._subscribers.remove(events)
+        return stream()
+    
+    def emit(self, container, status):
+        event = {
+            'id': container.id,
+            'status': status,
+            'Type': 'container',
+            'Actor': {'ID': container.id, 'Attributes': dict(container.labels, name=container.name)}
+        }
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for events in subscribers:
+            events.put(event)
+    
+    def get_stats(self):
+        with self._lock:
+            return dict(self._stats, containers=len(self._containers), images=len(self.images._images))
+    
+    def close(self):
+        pass
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """The fake backend of this web process (fake nodes share it)"""
+    global _client
+    
+    with _client_lock:
+        if _client is None:
+            _client = FakeClient()
+        return _client
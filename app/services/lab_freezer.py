@@ -0,0 +1,172 @@
+"""
+Lab Freezer
+Pauses idle lab containers instead of removing them, so they keep their
+in-memory state (stored XSS comments, the CSRF users dict, ...) at zero
+CPU and resume in milliseconds. A policy removes frozen instances that
+have been frozen too long or when the host runs short of memory.
+"""
+import docker
+import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from app.services import lab_nodes, lab_resources, lab_status, scheduler
+from app.services.lab_capacity import MEMORY_BUDGET_FRACTION, get_host_totals
+from app.services.lab_orchestrator import get_docker_client
+
+# Seconds between policy sweeps
+FREEZE_POLICY_INTERVAL = int(os.environ.get('LAB_FREEZE_POLICY_INTERVAL', 120))
+
+# Frozen instances are removed after this many seconds without activity
+FROZEN_TTL = timedelta(seconds=int(os.environ.get('LAB_FROZEN_TTL', 3600)))
+
+FREEZE_WORKERS = 16
+
+
+def _pause_container(container_id, node=None):
+    client = get_docker_client(node)
+    if not client or not container_id:
+        return False
+    try:
+        client.containers.get(container_id).pause()
+        return True
+    except Exception as e:
+        print(f"Failed to freeze container {container_id}: {e}")
+        return False
+
+
+def freeze_instances(instance_ids, reason=None):
+    """Pause the containers of running instances in parallel and mark them frozen"""
+    from app.models.lab_instance import LabInstance
+    from app import db
+    
+    rows = LabInstance.query.filter(
+        LabInstance.id.in_(instance_ids),
+        LabInstance.status == 'running'
+    ).with_entities(LabInstance.id, LabInstance.container_id, LabInstance.node).all()
+    if not rows:
+        return []
+    
+    with ThreadPoolExecutor(max_workers=min(FREEZE_WORKERS, len(rows))) as pool:
+        outcomes = list(pool.map(
+            _pause_container,
+            [row.container_id for row in rows],
+            [row.node for row in rows]
+        ))
+    
+    frozen_ids = [row.id for row, paused in zip(rows, outcomes) if paused]
+    if frozen_ids:
+        db.session.execute(
+            db.update(LabInstance)
+            .where(LabInstance.id.in_(frozen_ids), LabInstance.status == 'running')
+            .values(status='frozen')
+        )
+        db.session.commit()
+        lab_status.instances_changed(frozen_ids, reason=reason)
+    return frozen_ids
+
+
+def resume_instance(instance):
+    """
+    Unpause a frozen instance and give it a fresh activity window.
+    Returns (instance, message); instance is None if the container is gone.
+    """
+    from app.services.lab_idle import ACTIVITY_EXTENSION, MAX_LIFETIME
+    from app import db
+    
+    client = get_docker_client(instance.node)
+    if not client:
+        return None, "Docker is not available"
+    
+    try:
+        container = client.containers.get(instance.container_id)
+        if container.status == 'paused':
+            container.unpause()
+    except docker.errors.NotFound:
+        instance.status = 'stopped'
+        instance.stopped_at = datetime.utcnow()
+        db.session.commit()
+        lab_status.instance_changed(instance)
+        return None, "Frozen lab container no longer exists"
+    except Exception as e:
+        return None, str(e)
+    
+    now = datetime.utcnow()
+    expires_at = max(instance.expires_at or now, now + ACTIVITY_EXTENSION)
+    if instance.started_at:
+        expires_at = min(expires_at, instance.started_at + MAX_LIFETIME)
+    
+    instance.status = 'running'
+    instance.last_active_at = now
+    instance.expires_at = expires_at
+    db.session.commit()
+    lab_status.instance_changed(instance)
+    return instance, "Lab resumed"
+
+
+def enforce_frozen_policy():
+    """
+    Remove frozen instances that outlived FROZEN_TTL, then - if running and
+    frozen containers together reserve more than a node's memory budget -
+    remove that node's least recently active frozen instances until it fits.
+    """
+    from app.models.lab import Lab
+    from app.models.lab_instance import LabInstance
+    from app.services.lab_reaper import claim_instances, teardown_instances
+    from app import db
+    
+    now = datetime.utcnow()
+    evict_ids = [
+        instance_id for (instance_id,) in LabInstance.query.filter(
+            LabInstance.status == 'frozen',
+            LabInstance.last_active_at < now - FROZEN_TTL
+        ).with_entities(LabInstance.id)
+    ]
+    
+    # Memory budgets are per node - each host evicts its own frozen instances
+    for node in lab_nodes.get_nodes():
+        host_memory, _ = get_host_totals(node.name)
+        if not host_memory:
+            continue
+        
+        on_node = lab_nodes.instance_filter(node.name)
+        budget = host_memory * MEMORY_BUDGET_FRACTION
+        reserved = db.session.query(Lab.slug, db.func.count(LabInstance.id)).join(
+            Lab, Lab.id == LabInstance.lab_id
+        ).filter(
+            on_node,
+            LabInstance.status.in_(('starting', 'running', 'frozen', 'resetting')),
+            LabInstance.tenant == None,
+            LabInstance.id.notin_(evict_ids)
+        ).group_by(Lab.slug)
+        overflow = sum(count * lab_resources.get_profile(lab_slug)['memory'] for lab_slug, count in reserved) - budget
+        
+        if overflow > 0:
+            candidates = db.session.query(LabInstance.id, Lab.slug).join(
+                Lab, Lab.id == LabInstance.lab_id
+            ).filter(
+                on_node,
+                LabInstance.status == 'frozen',
+                LabInstance.id.notin_(evict_ids)
+            ).order_by(LabInstance.last_active_at)
+            for instance_id, lab_slug in candidates:
+                if overflow <= 0:
+                    break
+                evict_ids.append(instance_id)
+                overflow -= lab_resources.get_profile(lab_slug)['memory']
+    
+    if not evict_ids:
+        return []
+    
+    rows = claim_instances(LabInstance.query.filter(
+        LabInstance.id.in_(evict_ids),
+        LabInstance.status == 'frozen'
+    ))
+    results = teardown_instances(rows, reason='evicted')
+    print(f"Lab freezer: removed {len(results)} frozen instances")
+    return results
+
+
+def init_app(app):
+    if FREEZE_POLICY_INTERVAL > 0:
+        scheduler.add_task('lab-freeze-policy', FREEZE_POLICY_INTERVAL, enforce_frozen_policy)
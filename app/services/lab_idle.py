@@ -0,0 +1,167 @@
+"""
+Lab Idle Detection
+Samples the network counters of running lab containers. Instances with
+incoming traffic get their expiry pushed back; instances that have been
+quiet for longer than the idle window are frozen or stopped.
+"""
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from app.services import lab_status, scheduler
+from app.services.lab_orchestrator import get_docker_client
+
+# Seconds between samples
+IDLE_CHECK_INTERVAL = int(os.environ.get('LAB_IDLE_CHECK_INTERVAL', 60))
+
+# Act on instances without user traffic for this many seconds (0 disables)
+IDLE_TIMEOUT = int(os.environ.get('LAB_IDLE_TIMEOUT', 1200))
+
+# What happens to idle instances: 'freeze' (pause, resumable) or 'stop'
+IDLE_ACTION = os.environ.get('LAB_IDLE_ACTION', 'freeze')
+
+# Active instances always have at least this long left before expiry
+ACTIVITY_EXTENSION = timedelta(seconds=int(os.environ.get('LAB_ACTIVITY_EXTENSION', 1800)))
+
+# Hard cap on an instance's lifetime, however active it is
+MAX_LIFETIME = timedelta(seconds=int(os.environ.get('LAB_MAX_LIFETIME', 28800)))
+
+# Bytes received between samples that count as user activity
+ACTIVITY_THRESHOLD_BYTES = 512
+
+SAMPLE_WORKERS = 16
+
+# instance_id -> rx bytes at the previous sample
+_last_rx_bytes = {}
+_samples_lock = threading.Lock()
+
+
+def get_rx_bytes(container_id, node=None):
+    """Total bytes received by a container on all its interfaces (None if unknown)"""
+    client = get_docker_client(node)
+    if not client or not container_id:
+        return None
+    
+    try:
+        stats = client.containers.get(container_id).stats(stream=False, one_shot=True)
+    except Exception:
+        return None
+    
+    # No network counters (e.g. lab processes) - activity is unknown
+    networks = stats.get('networks')
+    if networks is None:
+        return None
+    return sum(interface.get('rx_bytes', 0) for interface in networks.values())
+
+
+def find_active_instances(rows):
+    """
+    Sample every row's container. Returns (active, observed): the ids that
+    received traffic, and the ids compared against an earlier sample.
+    """
+    if not rows:
+        return set(), set()
+    
+    with ThreadPoolExecutor(max_workers=min(SAMPLE_WORKERS, len(rows))) as pool:
+        samples = list(pool.map(
+            get_rx_bytes,
+            [row.container_id for row in rows],
+            [row.node for row in rows]
+        ))
+    
+    active = set()
+    observed = set()
+    with _samples_lock:
+        for row, rx_bytes in zip(rows, samples):
+            if rx_bytes is None:
+                continue
+            previous = _last_rx_bytes.get(row.id)
+            if previous is not None:
+                observed.add(row.id)
+                if rx_bytes - previous >= ACTIVITY_THRESHOLD_BYTES:
+                    active.add(row.id)
+            _last_rx_bytes[row.id] = rx_bytes
+        
+        # Forget instances that are no longer running
+        running_ids = {row.id for row in rows}
+        for instance_id in list(_last_rx_bytes):
+            if instance_id not in running_ids:
+                del _last_rx_bytes[instance_id]
+    return active, observed
+
+
+def record_activity(rows, active_ids, now):
+    """Bump last_active_at and extend expiry for active instances in one bulk UPDATE"""
+    from app.models.lab_instance import LabInstance
+    from app import db
+    
+    updates = []
+    for row in rows:
+        if row.id not in active_ids:
+            continue
+        expires_at = row.expires_at
+        if expires_at is None or expires_at < now + ACTIVITY_EXTENSION:
+            expires_at = now + ACTIVITY_EXTENSION
+        if row.started_at:
+            expires_at = min(expires_at, row.started_at + MAX_LIFETIME)
+        updates.append({'id': row.id, 'last_active_at': now, 'expires_at': expires_at})
+    
+    if updates:
+        db.session.execute(db.update(LabInstance), updates)
+        db.session.commit()
+        lab_status.instances_changed([update['id'] for update in updates])
+    return len(updates)
+
+
+def check_idle_instances():
+    """Sample running instances, extend the active ones and freeze or stop the idle ones"""
+    from app.models.lab_instance import LabInstance
+    from app.services.lab_reaper import claim_instances, teardown_instances
+    
+    now = datetime.utcnow()
+    rows = LabInstance.query.filter(LabInstance.status == 'running').with_entities(
+        LabInstance.id,
+        LabInstance.container_id,
+        LabInstance.node,
+        LabInstance.started_at,
+        LabInstance.expires_at,
+        LabInstance.last_active_at
+    ).all()
+    
+    active_ids, observed_ids = find_active_instances(rows)
+    record_activity(rows, active_ids, now)
+    
+    if IDLE_TIMEOUT <= 0:
+        return []
+    
+    # Only instances seen quiet for a full sample interval can be idle
+    idle_before = now - timedelta(seconds=IDLE_TIMEOUT)
+    idle_ids = [
+        row.id for row in rows
+        if row.id in observed_ids
+        and row.id not in active_ids
+        and (row.last_active_at or row.started_at or now) < idle_before
+    ]
+    if not idle_ids:
+        return []
+    
+    if IDLE_ACTION == 'freeze':
+        from app.services.lab_freezer import freeze_instances
+        
+        frozen_ids = freeze_instances(idle_ids, reason='idle')
+        print(f"Lab idle check: froze {len(frozen_ids)} idle instances")
+        return frozen_ids
+    
+    idle_rows = claim_instances(LabInstance.query.filter(
+        LabInstance.id.in_(idle_ids),
+        LabInstance.status == 'running'
+    ))
+    results = teardown_instances(idle_rows, reason='idle')
+    print(f"Lab idle check: stopped {len(results)} idle instances")
+    return results
+
+
+def init_app(app):
+    if IDLE_CHECK_INTERVAL > 0:
+        scheduler.add_task('lab-idle-check', IDLE_CHECK_INTERVAL, check_idle_instances)
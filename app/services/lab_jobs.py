@@ -0,0 +1,289 @@
+"""
+Lab Job Queue
+Runs lab start/stop requests on a background worker pool so web
+requests never block on Docker. Jobs go through Redis when REDIS_URL
+is set (shared by every web process), otherwise an in-process queue.
+
+Start requests wait as 'queued' LabInstance rows and are admitted in
+FIFO order (oldest first) whenever the host has capacity for them.
+"""
+import json
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+
+from app.services import lab_status, lab_tenancy, scheduler
+from app.services.lab_capacity import get_capacity, check_user_limit
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+QUEUE_KEY = 'webnox:lab_jobs'
+
+# Worker threads per web process
+WORKER_COUNT = int(os.environ.get('LAB_JOB_WORKERS', 4))
+
+# Seconds between admission passes over the waiting queue
+ADMISSION_INTERVAL = int(os.environ.get('LAB_ADMISSION_INTERVAL', 5))
+
+_queue = None
+_workers = []
+_workers_lock = threading.Lock()
+
+
+class InProcessJobQueue:
+    """Job queue living in this process only"""
+    
+    def __init__(self):
+        self._jobs = queue.Queue()
+    
+    def push(self, job):
+        self._jobs.put(job)
+    
+    def pop(self, timeout=5):
+        try:
+            return self._jobs.get(timeout=timeout)
+        except queue.Empty:
+            return None
+    
+    def size(self):
+        return self._jobs.qsize()
+
+
+class RedisJobQueue:
+    """Job queue stored in a Redis list, shared between processes"""
+    
+    def __init__(self, url):
+        self._redis = redis.Redis.from_url(url)
+        self._redis.ping()
+    
+    def push(self, job):
+        self._redis.rpush(QUEUE_KEY, json.dumps(job))
+    
+    def pop(self, timeout=5):
+        item = self._redis.blpop(QUEUE_KEY, timeout=timeout)
+        if not item:
+            return None
+        return json.loads(item[1])
+    
+    def size(self):
+        return self._redis.llen(QUEUE_KEY)
+
+
+def get_queue():
+    """Get the job queue, preferring Redis when configured and reachable"""
+    global _queue
+    
+    if _queue is None:
+        redis_url = os.environ.get('REDIS_URL')
+        if redis and redis_url:
+            try:
+                _queue = RedisJobQueue(redis_url)
+            except Exception as e:
+                print(f"Redis unavailable for lab jobs, using in-process queue: {e}")
+        if _queue is None:
+            _queue = InProcessJobQueue()
+    return _queue
+
+
+def _submit(job):
+    job_queue = get_queue()
+    if not _workers and isinstance(job_queue, InProcessJobQueue):
+        # Nobody would ever consume this job - run it inline instead
+        run_job(job)
+    else:
+        job_queue.push(job)
+
+
+def enqueue_start(user_id, lab_slug, lab_id):
+    """Queue a lab start and return the queued instance immediately"""
+    from app.services.lab_orchestrator import LAB_IMAGES, get_active_instance, create_instance_record
+    
+    existing = get_active_instance(user_id, lab_id)
+    if existing and existing.status == 'frozen':
+        # Unpausing takes milliseconds - no need to queue it
+        from app.services.lab_freezer import resume_instance
+        
+        resumed, message = resume_instance(existing)
+        if resumed:
+            return resumed, message
+    elif existing:
+        return existing, "Instance already running"
+    
+    if lab_slug not in LAB_IMAGES:
+        return None, f"Unknown lab configuration: {lab_slug}"
+    
+    allowed, message = check_user_limit(user_id)
+    if not allowed:
+        return None, message
+    
+    if lab_tenancy.is_shared(lab_slug):
+        # Joining a shared container needs no capacity - skip the admission queue
+        instance = create_instance_record(
+            user_id, lab_slug, lab_id, status='starting', tenant=lab_tenancy.new_tenant_key(user_id)
+        )
+        _submit({'action': 'start', 'instance_id': instance.id, 'lab_slug': lab_slug})
+        return instance, "Lab is starting"
+    
+    instance = create_instance_record(user_id, lab_slug, lab_id, status='queued')
+    dispatch_waiting()
+    return instance, "Lab start queued"
+
+
+def dispatch_waiting():
+    """
+    Admit queued start requests, oldest first, while the host has free
+    slots. Each admission is a conditional queued -> starting UPDATE so
+    concurrent dispatchers never start the same instance twice.
+    """
+    from app.models.lab import Lab
+    from app.models.lab_instance import LabInstance
+    from app import db
+    
+    free_slots = get_capacity()['free_slots']
+    if free_slots == 0:
+        return []
+    
+    waiting = db.session.query(LabInstance.id, Lab.slug).join(Lab, Lab.id == LabInstance.lab_id).filter(
+        LabInstance.status == 'queued'
+    ).order_by(LabInstance.created_at, LabInstance.id)
+    if free_slots is not None:
+        waiting = waiting.limit(free_slots)
+    
+    admitted = []
+    for instance_id, lab_slug in waiting.all():
+        result = db.session.execute(
+            db.update(LabInstance)
+            .where(LabInstance.id == instance_id, LabInstance.status == 'queued')
+            .values(status='starting')
+        )
+        db.session.commit()
+        if result.rowcount == 1:
+            admitted.append((instance_id, lab_slug))
+    
+    lab_status.instances_changed([instance_id for instance_id, _ in admitted])
+    for instance_id, lab_slug in admitted:
+        _submit({'action': 'start', 'instance_id': instance_id, 'lab_slug': lab_slug})
+    return [instance_id for instance_id, _ in admitted]
+
+
+def enqueue_stop(user_id, lab_id):
+    """Queue a lab stop for the user's active instance"""
+    from app.services.lab_orchestrator import get_active_instance
+    from app import db
+    
+    instance = get_active_instance(user_id, lab_id)
+    if not instance:
+        return False, "Instance not found"
+    
+    if instance.status == 'queued':
+        # Still waiting for capacity - just leave the queue
+        instance.status = 'stopped'
+        instance.stopped_at = datetime.utcnow()
+        db.session.commit()
+        lab_status.instance_changed(instance)
+        return True, "Lab stopped successfully"
+    
+    if instance.status == 'starting':
+        return False, "Lab is still starting, try again in a moment"
+    
+    instance.status = 'stopping'
+    db.session.commit()
+    lab_status.instance_changed(instance)
+    _submit({'action': 'stop', 'instance_id': instance.id})
+    return True, "Lab is stopping"
+
+
+def enqueue_reset(user_id, lab_id):
+    """Queue a pristine-container swap for the user's running instance"""
+    from app.services.lab_orchestrator import get_active_instance
+    
+    instance = get_active_instance(user_id, lab_id)
+    if not instance or instance.status not in ('running', 'frozen'):
+        return False, "Lab is not running"
+    
+    _submit({'action': 'reset', 'instance_id': instance.id})
+    return True, "Lab is resetting"
+
+
+def run_job(job):
+    """Execute a single start/stop/reset job (needs an app context)"""
+    from app.models.lab_instance import LabInstance
+    from app.services.lab_orchestrator import launch_instance, stop_lab_instance, reset_lab_instance
+    
+    instance = LabInstance.query.get(job['instance_id'])
+    if not instance:
+        return False, "Instance not found"
+    
+    if job['action'] == 'start':
+        # Only admitted instances are started
+        if instance.status != 'starting':
+            return False, f"Instance is {instance.status}"
+        result, message = launch_instance(instance, job['lab_slug'])
+        if result is None:
+            dispatch_waiting()
+        return result is not None, message
+    
+    if job['action'] == 'stop':
+        result = stop_lab_instance(instance_id=instance.id)
+        dispatch_waiting()
+        return result
+    
+    if job['action'] == 'reset':
+        result, message = reset_lab_instance(instance.id)
+        return result is not None, message
+    
+    return False, f"Unknown job action: {job['action']}"
+
+
+def _worker_loop(app):
+    job_queue = get_queue()
+    while True:
+        try:
+            job = job_queue.pop()
+        except Exception as e:
+            print(f"Lab job queue error: {e}")
+            time.sleep(1)
+            continue
+        
+        if job is None:
+            continue
+        
+        with app.app_context():
+            try:
+                success, message = run_job(job)
+                if not success:
+                    print(f"Lab job {job} failed: {message}")
+            except Exception as e:
+                print(f"Lab job {job} crashed: {e}")
+
+
+def start_workers(app, count=WORKER_COUNT):
+    """Start the worker threads that consume lab jobs"""
+    with _workers_lock:
+        if _workers:
+            return _workers
+        
+        for i in range(count):
+            worker = threading.Thread(
+                target=_worker_loop,
+                args=(app,),
+                name=f'webnox-lab-worker-{i}',
+                daemon=True
+            )
+            worker.start()
+            _workers.append(worker)
+    return _workers
+
+
+def init_app(app):
+    """Start lab job workers for this process"""
+    if app.config.get('LAB_BACKGROUND_TASKS') and WORKER_COUNT > 0:
+        start_workers(app)
+    
+    # Capacity also frees up through the reaper, idle checks and container deaths
+    scheduler.add_task('lab-admission', ADMISSION_INTERVAL, dispatch_waiting)
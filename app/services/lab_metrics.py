@@ -0,0 +1,221 @@
+"""
+Lab Metrics
+Counters, gauges and latency histograms for the lab orchestrator,
+rendered in the Prometheus text format at /metrics.
+
+A lab start is broken into timed spans:
+
+    with lab_metrics.span('run'):
+        container = client.containers.run(...)
+
+Counters and histograms live in this web process (Prometheus sums them
+across scrape targets); gauges are read from the database and the node
+clients at scrape time, so every process reports the same values.
+"""
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+# Bearer token /metrics requires (unset = open, e.g. behind a private network)
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN')
+
+# Histogram bucket upper bounds in seconds
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0)
+
+COUNTERS = {
+    'webnox_lab_starts_total': 'Lab starts attempted',
+    'webnox_lab_start_failures_total': 'Lab starts that ended in error',
+    'webnox_lab_evictions_total': 'Lab instances torn down by the platform, by reason',
+    'webnox_lab_warm_pool_hits_total': 'Lab starts served by a warm pool container',
+    'webnox_lab_warm_pool_misses_total': 'Lab starts that found the warm pool empty'
+}
+
+HISTOGRAMS = {
+    'webnox_lab_start_phase_seconds': 'Seconds spent in each phase of a lab start',
+    'webnox_lab_start_seconds': 'Seconds to boot a lab once a worker picked it up',
+    'webnox_lab_time_to_lab_seconds': 'Seconds from the start request to a running lab, queueing included'
+}
+
+# (name, labels) -> value / histogram state
+_counters = {}
+_histograms = {}
+_lock = threading.Lock()
+
+# name -> (help, func returning {labels tuple: value})
+GAUGES = {}
+
+
+def _labels(labels):
+    return tuple(sorted(labels.items()))
+
+
+def inc(name, amount=1, **labels):
+    """Add to a counter from COUNTERS"""
+    key = (name, _labels(labels))
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + amount
+
+
+def observe(name, seconds, **labels):
+    """Record a duration in a histogram from HISTOGRAMS"""
+    key = (name, _labels(labels))
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = {'buckets': [0] * len(BUCKETS), 'sum': 0.0, 'count': 0}
+        for i, bound in enumerate(BUCKETS):
+            if seconds <= bound:
+                histogram['buckets'][i] += 1
+                break
+        histogram['sum'] += seconds
+        histogram['count'] += 1
+
+
+@contextmanager
+def span(phase):
+    """Time a phase of a lab start, whether or not it raises"""
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        observe('webnox_lab_start_phase_seconds', time.perf_counter() - started, phase=phase)
+
+
+def register_gauge(name, help_text, func):
+    GAUGES[name] = (help_text, func)
+
+
+def quantile(name, q, **labels):
+    """Estimate a quantile of a histogram from its buckets (None without samples)"""
+    with _lock:
+        histogram = _histograms.get((name, _labels(labels)))
+        if not histogram or not histogram['count']:
+            return None
+        counts = list(histogram['buckets'])
+        total = histogram['count']
+    
+    rank = q * total
+    seen = 0
+    lower = 0.0
+    for bound, count in zip(BUCKETS, counts):
+        if count and seen + count >= rank:
+            return lower + (bound - lower) * (rank - seen) / count
+        seen += count
+        lower = bound
+    return math.inf  # Beyond the last bucket
+
+
+def _summary(name, **labels):
+    with _lock:
+        histogram = _histograms.get((name, _labels(labels)))
+        count = histogram['count'] if histogram else 0
+    return {'count': count, 'p50': quantile(name, 0.5, **labels), 'p99': quantile(name, 0.99, **labels)}
+
+
+def get_latency_summary():
+    """Sample counts and p50/p99 seconds of whole starts and of each start phase"""
+    with _lock:
+        phases = sorted(
+            dict(labels)['phase'] for name, labels in _histograms
+            if name == 'webnox_lab_start_phase_seconds'
+        )
+    return {
+        'start': _summary('webnox_lab_start_seconds'),
+        'time_to_lab': _summary('webnox_lab_time_to_lab_seconds'),
+        'phases': {phase: _summary('webnox_lab_start_phase_seconds', phase=phase) for phase in phases}
+    }
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in pairs) + '}'
+
+
+def render():
+    """All metrics in the Prometheus text exposition format"""
+    with _lock:
+        counters = dict(_counters)
+        histograms = {key: dict(value, buckets=list(value['buckets'])) for key, value in _histograms.items()}
+    
+    lines = []
+    for name, help_text in COUNTERS.items():
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} counter')
+        samples = [(labels, value) for (metric, labels), value in counters.items() if metric == name]
+        for labels, value in sorted(samples) or [((), 0)]:
+            lines.append(f'{name}{_format_labels(labels)} {value}')
+    
+    for name, help_text in HISTOGRAMS.items():
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} histogram')
+        for (metric, labels), histogram in sorted(histograms.items()):
+            if metric != name:
+                continue
+            cumulative = 0
+            for bound, count in zip(BUCKETS, histogram['buckets']):
+                cumulative += count
+                lines.append(f'{name}_bucket{_format_labels(labels, [("le", bound)])} {cumulative}')
+            lines.append(f'{name}_bucket{_format_labels(labels, [("le", "+Inf")])} {histogram["count"]}')
+            lines.append(f'{name}_sum{_format_labels(labels)} {histogram["sum"]}')
+            lines.append(f'{name}_count{_format_labels(labels)} {histogram["count"]}')
+    
+    for name, (help_text, func) in GAUGES.items():
+        try:
+            values = func()
+        except Exception as e:
+            print(f"Lab metrics: gauge {name} failed: {e}")
+            continue
+        lines.append(f'# HELP {name} {help_text}')
+        lines.append(f'# TYPE {name} gauge')
+        for labels, value in sorted(values.items()):
+            if value is not None:
+                lines.append(f'{name}{_format_labels(labels)} {value}')
+    return '\n'.join(lines) + '\n'
+
+
+def _instances_by_status():
+    from app.models.lab_instance import LabInstance
+    from app import db
+    
+    statuses = LabInstance.ACTIVE_STATUSES + ('stopping',)
+    counts = dict(
+        db.session.query(LabInstance.status, db.func.count(LabInstance.id))
+        .filter(LabInstance.status.in_(statuses))
+        .group_by(LabInstance.status)
+    )
+    return {(('status', status),): counts.get(status, 0) for status in statuses}
+
+
+def _free_ports():
+    from app.services.port_allocator import get_port_stats
+    
+    return {(): get_port_stats()['free']}
+
+
+def _free_slots():
+    from app.services.lab_capacity import get_capacity
+    
+    return {(): get_capacity()['free_slots']}
+
+
+def _nodes_up():
+    from app.services import lab_nodes
+    
+    return {
+        (('node', node.name),): int(node.manager.get_stats()['connected'])
+        for node in lab_nodes.get_nodes()
+    }
+
+
+register_gauge('webnox_lab_instances', 'Lab instances by lifecycle status', _instances_by_status)
+register_gauge('webnox_lab_free_ports', 'Host ports left for lab containers', _free_ports)
+register_gauge('webnox_lab_free_slots', 'Lab containers that still fit under the capacity limits', _free_slots)
+register_gauge('webnox_lab_node_up', 'Whether a lab node answers', _nodes_up)
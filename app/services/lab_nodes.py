@@ -0,0 +1,149 @@
+"""
+Lab Node Registry
+The Docker hosts lab containers can be placed on. Configured with
+LAB_DOCKER_NODES, a JSON list such as
+
+    [{"name": "lab1", "url": "tcp://10.0.0.11:2375", "host": "lab1.example.com"},
+     {"name": "lab2", "url": "tcp://10.0.0.12:2375", "host": "lab2.example.com", "max_instances": 200}]
+
+Without it there is a single 'local' node using DOCKER_HOST and LAB_HOST.
+
+Each node has a backend (see lab_backends): "backend": "process" runs
+its labs as local processes, "fake" keeps them in memory for load tests.
+LAB_BACKEND picks the backend of the default 'local' node: 'docker',
+'process', 'fake', or 'auto' (processes when no Docker daemon answers
+at startup).
+"""
+import json
+import os
+
+from app.services import docker_client, lab_backends
+from app.services.docker_client import DockerClientManager
+
+DEFAULT_NODE_NAME = 'local'
+
+# Backend of the default node: 'docker', 'process', 'fake' or 'auto'
+BACKEND = os.environ.get('LAB_BACKEND', 'docker')
+
+
+class LabNode:
+    """An endpoint that can run lab containers"""
+    
+    def __init__(self, name, host, manager, url=None, max_instances=0, backend='docker'):
+        self.name = name
+        self.host = host  # Hostname users reach this node's published ports on
+        self.url = url
+        self.max_instances = max_instances
+        self.backend = backend  # Name in lab_backends.BACKENDS
+        self.manager = manager
+    
+    def get_client(self):
+        return self.manager.get_client()
+    
+    def to_dict(self):
+        data = {
+            'name': self.name,
+            'host': self.host,
+            'url': self.url,
+            'max_instances': self.max_instances,
+            'backend': self.backend
+        }
+        data.update(self.manager.get_stats())
+        return data
+    
+    def __repr__(self):
+        return f'<LabNode {self.name}>'
+
+
+# name -> LabNode, in registration order (the first node is the default)
+_nodes = {}
+
+
+def register_node(name, url=None, host=None, factory=None, max_instances=0, backend='docker'):
+    """Add a node; factory builds its client (defaults to the backend's, connecting to url)"""
+    if factory is None:
+        factory = lab_backends.get_factory(backend, url)
+    node = LabNode(
+        name=name,
+        host=host or os.environ.get('LAB_HOST', 'localhost'),
+        manager=DockerClientManager(factory=factory),
+        url=url,
+        max_instances=max_instances,
+        backend=backend
+    )
+    _nodes[name] = node
+    return node
+
+
+def clear_nodes():
+    _nodes.clear()
+
+
+def load_nodes():
+    """Build the registry from LAB_DOCKER_NODES (or the single local daemon)"""
+    clear_nodes()
+    
+    config = os.environ.get('LAB_DOCKER_NODES')
+    if config:
+        for entry in json.loads(config):
+            register_node(
+                entry['name'],
+                url=entry.get('url'),
+                host=entry.get('host'),
+                max_instances=int(entry.get('max_instances', 0)),
+                backend=entry.get('backend', 'docker')
+            )
+    
+    if not _nodes:
+        backend = BACKEND
+        if backend == 'auto':
+            backend = 'docker' if docker_client.get_client() else 'process'
+        if backend != 'docker':
+            register_node(DEFAULT_NODE_NAME, backend=backend)
+    
+    if not _nodes:
+        # The local daemon shares the process-wide managed client
+        node = LabNode(
+            name=DEFAULT_NODE_NAME,
+            host=os.environ.get('LAB_HOST', 'localhost'),
+            manager=docker_client.get_manager()
+        )
+        _nodes[node.name] = node
+    return list(_nodes.values())
+
+
+def get_nodes():
+    if not _nodes:
+        load_nodes()
+    return list(_nodes.values())
+
+
+def get_default_node():
+    return get_nodes()[0]
+
+
+def get_node(name=None):
+    """Look up a node by name; None (pre-multi-host instances) means the default node"""
+    nodes = get_nodes()
+    if name is None:
+        return nodes[0]
+    return _nodes.get(name)
+
+
+def is_default_node(name):
+    return name is None or name == get_default_node().name
+
+
+def resolve_name(name):
+    """Node name an instance belongs to (NULL rows predate multi-host and live on the default)"""
+    return name or get_default_node().name
+
+
+def instance_filter(name):
+    """SQL filter selecting the lab instances placed on a node"""
+    from app.models.lab_instance import LabInstance
+    from app import db
+    
+    if is_default_node(name):
+        return db.or_(LabInstance.node == get_default_node().name, LabInstance.node == None)
+    return LabInstance.node == name
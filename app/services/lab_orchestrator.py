@@ -1,65 +1,90 @@
 """
 Lab Orchestration Service
-Manages Docker containers for per-user lab instances
+Manages the containers of per-user lab instances on each node's backend
+(Docker, local processes or the in-memory fake - see lab_backends)
 """
 import docker
 import os
 import random
+import socket
 import string
+import time
 from datetime import datetime, timedelta
 from flask import current_app
+from app.services import lab_metrics, lab_nodes, lab_routing, lab_status, lab_tenancy
 
-# Lab image mappings
+# Lab image mappings (multi_tenant labs can serve many users from one container;
+# resources are the lab's memory, CPU and pids limits)
 LAB_IMAGES = {
     'xss-reflected-basic': {
         'image': 'webnox-xss-reflected',
         'build_path': 'labs/xss-reflected',
         'flag': 'FLAG{xss_r3fl3ct3d_b4s1c}',
-        'internal_port': 80
+        'internal_port': 80,
+        'multi_tenant': True,
+        'resources': {'memory': '96m', 'cpu': 0.25, 'pids': 64}
     },
     'xss-stored-comments': {
         'image': 'webnox-xss-stored',
         'build_path': 'labs/xss-stored',
         'flag': 'FLAG{st0r3d_xss_p3rs1st3nt}',
-        'internal_port': 80
+        'internal_port': 80,
+        'multi_tenant': True,
+        'resources': {'memory': '160m', 'cpu': 0.5, 'pids': 128}
     },
     'sqli-login-bypass': {
         'image': 'webnox-sqli-login',
         'build_path': 'labs/sqli-login',
         'flag': 'FLAG{sql1_l0g1n_byp4ss}',
-        'internal_port': 80
+        'internal_port': 80,
+        'multi_tenant': True,
+        'resources': {'memory': '128m', 'cpu': 0.25, 'pids': 64}
     },
     'idor-profile': {
         'image': 'webnox-idor-profile',
         'build_path': 'labs/idor-profile',
         'flag': 'FLAG{1d0r_pr0f1l3_4cc3ss}',
-        'internal_port': 80
+        'internal_port': 80,
+        'multi_tenant': True,
+        'resources': {'memory': '96m', 'cpu': 0.25, 'pids': 64}
     },
     'csrf-password': {
         'image': 'webnox-csrf-password',
         'build_path': 'labs/csrf-password',
         'flag': 'FLAG{csrf_p4ssw0rd_ch4ng3}',
-        'internal_port': 80
+        'internal_port': 80,
+        'multi_tenant': True,
+        'resources': {'memory': '96m', 'cpu': 0.25, 'pids': 64}
     }
 }
 
-# Port range for lab instances
-PORT_RANGE_START = 10000
-PORT_RANGE_END = 20000
+# Default resource limits of a lab container (a LAB_IMAGES entry may
+# override them with 'resources' - see lab_resources)
+CONTAINER_MEM_LIMIT = '256m'
+CONTAINER_MEM_LIMIT_BYTES = 256 * 1024 * 1024
+CONTAINER_CPU_PERIOD = 100000
+CONTAINER_CPU_QUOTA = 50000  # 50% CPU limit
+CONTAINER_CPU_SHARE = CONTAINER_CPU_QUOTA / CONTAINER_CPU_PERIOD
+CONTAINER_PIDS_LIMIT = 128
 
-# Used ports tracking
-used_ports = set()
+# Seconds to wait for a new lab's port to accept connections before it is
+# reported running (0 = report it as soon as the container starts)
+READY_TIMEOUT = float(os.environ.get('LAB_READY_TIMEOUT', 0))
 
 
-def get_docker_client():
-    """Get Docker client instance"""
-    try:
-        client = docker.from_env()
-        client.ping()
-        return client
-    except Exception as e:
-        print(f"Docker connection error: {e}")
+def get_docker_client(node=None):
+    """Get the Docker client for a node, the default one if None (None while unreachable)"""
+    lab_node = lab_nodes.get_node(node)
+    if not lab_node:
         return None
+    return lab_node.get_client()
+
+
+def report_docker_error(error, node=None):
+    """Report a failed Docker API call to the node's client manager"""
+    lab_node = lab_nodes.get_node(node)
+    if lab_node:
+        lab_node.manager.report_error(error)
 
 
 def generate_container_name(user_id, lab_slug):
@@ -69,21 +94,17 @@ def generate_container_name(user_id, lab_slug):
 
 
 def get_available_port():
-    """Find an available port for the lab instance"""
-    global used_ports
+    """Claim an available port for the lab instance"""
+    from app.services.port_allocator import allocate_port
     
-    for port in range(PORT_RANGE_START, PORT_RANGE_END):
-        if port not in used_ports:
-            used_ports.add(port)
-            return port
-    
-    raise Exception("No available ports")
+    return allocate_port()
 
 
 def release_port(port):
     """Release a port back to the pool"""
-    global used_ports
-    used_ports.discard(port)
+    from app.services.port_allocator import release_port as release_allocated_port
+    
+    release_allocated_port(port)
 
 
 def get_running_instance(user_id, lab_id):
@@ -97,128 +118,251 @@ def get_running_instance(user_id, lab_id):
     ).first()
 
 
-def build_lab_image(lab_slug):
-    """Build Docker image for a lab if it doesn't exist"""
-    client = get_docker_client()
-    if not client:
-        return False, "Docker not available"
+def build_lab_image(lab_slug, node=None):
+    """Build Docker image for a lab if it doesn't exist or its build context changed"""
+    from app.services.image_manager import ensure_image
     
-    lab_config = LAB_IMAGES.get(lab_slug)
-    if not lab_config:
-        return False, f"Unknown lab: {lab_slug}"
+    return ensure_image(lab_slug, node=node)
+
+
+def run_lab_container(client, lab_config, container_name, host_port, environment=None, labels=None, route=None,
+                      resources=None):
+    """
+    Create and boot a lab container published on host_port, or - in
+    Traefik routing mode, with host_port None - routed by route (its name
+    unless given). resources is a lab_resources profile, the defaults if None.
+    """
+    from app.services.lab_resources import DEFAULT_PROFILE
     
-    image_name = lab_config['image']
-    build_path = lab_config['build_path']
+    resources = resources or DEFAULT_PROFILE
+    container_env = {'LAB_FLAG': lab_config['flag']}
+    container_env.update(environment or {})
     
-    try:
-        # Check if image exists
-        try:
-            client.images.get(image_name)
-            return True, "Image exists"
-        except docker.errors.ImageNotFound:
-            pass
-        
-        # Build image
-        full_path = os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(__file__))), build_path)
-        
-        if not os.path.exists(full_path):
-            return False, f"Build path not found: {full_path}"
-        
-        print(f"Building image {image_name} from {full_path}...")
-        client.images.build(path=full_path, tag=image_name, rm=True)
-        print(f"Image {image_name} built successfully")
-        return True, "Image built"
-        
-    except Exception as e:
-        return False, str(e)
+    container_labels = {'webnox.lab': 'true'}
+    container_labels.update(labels or {})
+    
+    ports = {}
+    if host_port is not None:
+        ports[f"{lab_config['internal_port']}/tcp"] = host_port
+    else:
+        container_labels.update(lab_routing.get_route_labels(route or container_name, lab_config['internal_port']))
+    
+    return client.containers.run(
+        image=lab_config['image'],
+        name=container_name,
+        detach=True,
+        ports=ports,
+        environment=container_env,
+        labels=container_labels,
+        mem_limit=resources['memory'],
+        cpu_period=CONTAINER_CPU_PERIOD,
+        cpu_quota=int(resources['cpu'] * CONTAINER_CPU_PERIOD),
+        pids_limit=resources['pids'],
+        network='webnox-labs',
+        auto_remove=False
+    )
 
 
-def start_lab_instance(user_id, lab_slug, lab_id):
-    """Start a new lab instance for a user"""
+def run_instance_container(client, instance, lab_slug, container_name, host_port, route=None):
+    """Boot a container owned by a user's lab instance"""
+    from app.services.lab_resources import get_profile
+    
+    return run_lab_container(
+        client,
+        LAB_IMAGES[lab_slug],
+        container_name,
+        host_port,
+        environment={'USER_ID': str(instance.user_id)},
+        labels={
+            'webnox.user_id': str(instance.user_id),
+            'webnox.lab_id': str(instance.lab_id),
+            'webnox.lab_slug': lab_slug
+        },
+        route=route,
+        resources=get_profile(lab_slug)
+    )
+
+
+def get_active_instance(user_id, lab_id):
+    """Get the queued, starting or running instance for a user and lab"""
+    from app.models.lab_instance import LabInstance
+    
+    return LabInstance.query.filter(
+        LabInstance.user_id == user_id,
+        LabInstance.lab_id == lab_id,
+        LabInstance.status.in_(LabInstance.ACTIVE_STATUSES)
+    ).first()
+
+
+def create_instance_record(user_id, lab_slug, lab_id, status='queued', tenant=None):
+    """Create the LabInstance row for a start request before any container exists"""
     from app.models.lab_instance import LabInstance
     from app import db
     
-    client = get_docker_client()
-    if not client:
-        return None, "Docker is not available"
+    instance = LabInstance(
+        user_id=user_id,
+        lab_id=lab_id,
+        container_name=generate_container_name(user_id, lab_slug),
+        port=0,  # Assigned once the container is launched
+        status=status,
+        tenant=tenant
+    )
+    db.session.add(instance)
+    db.session.commit()
+    lab_status.instance_changed(instance)
+    return instance
+
+
+def start_lab_instance(user_id, lab_slug, lab_id):
+    """Start a new lab instance for a user (blocks until the container runs)"""
+    from app.services.lab_capacity import check_user_limit, get_capacity
+    
+    existing = get_active_instance(user_id, lab_id)
+    if existing and existing.status == 'frozen':
+        from app.services.lab_freezer import resume_instance
+        
+        resumed, message = resume_instance(existing)
+        if resumed:
+            return resumed, message
+    elif existing:
+        return existing, "Instance already running"
+    
+    allowed, message = check_user_limit(user_id)
+    if not allowed:
+        return None, message
+    
+    if lab_tenancy.is_shared(lab_slug):
+        # Tenants of a shared container take no capacity of their own
+        instance = create_instance_record(
+            user_id, lab_slug, lab_id, status='starting', tenant=lab_tenancy.new_tenant_key(user_id)
+        )
+        return launch_instance(instance, lab_slug)
+    
+    if get_capacity()['free_slots'] == 0:
+        return None, "Lab capacity exhausted, try again later"
+    
+    instance = create_instance_record(user_id, lab_slug, lab_id, status='starting')
+    return launch_instance(instance, lab_slug)
+
+
+def wait_until_ready(host, port, timeout=READY_TIMEOUT):
+    """Poll until host:port accepts TCP connections; False on timeout"""
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            with socket.create_connection((host, port), timeout=1):
+                return True
+        except OSError:
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(0.1)
+
+
+def launch_instance(instance, lab_slug):
+    """Boot the container for a queued LabInstance and mark it running"""
+    started = time.perf_counter()
+    lab_metrics.inc('webnox_lab_starts_total')
+    
+    result, message = _boot_instance(instance, lab_slug)
+    if result is None:
+        lab_metrics.inc('webnox_lab_start_failures_total')
+    else:
+        lab_metrics.observe('webnox_lab_start_seconds', time.perf_counter() - started)
+        if result.started_at and result.created_at:
+            lab_metrics.observe(
+                'webnox_lab_time_to_lab_seconds',
+                (result.started_at - result.created_at).total_seconds()
+            )
+    return result, message
+
+
+def _boot_instance(instance, lab_slug):
+    from app import db
+    from app.services import warm_pool
+    from app.services.lab_placement import choose_node
+    
+    def fail(message):
+        instance.status = 'error'
+        instance.stopped_at = datetime.utcnow()
+        db.session.commit()
+        lab_status.instance_changed(instance)
+        return None, message
     
     lab_config = LAB_IMAGES.get(lab_slug)
     if not lab_config:
-        return None, f"Unknown lab configuration: {lab_slug}"
+        return fail(f"Unknown lab configuration: {lab_slug}")
     
-    # Build image if needed
-    success, msg = build_lab_image(lab_slug)
-    if not success and "exists" not in msg.lower():
-        return None, f"Failed to build lab image: {msg}"
+    if instance.tenant:
+        return lab_tenancy.launch_shared_instance(instance, lab_slug)
     
-    # Check for existing running instance
-    existing = LabInstance.query.filter_by(
-        user_id=user_id,
-        lab_id=lab_id,
-        status='running'
-    ).first()
+    # Pick the Docker node this instance will live on
+    with lab_metrics.span('connect'):
+        node, client = choose_node(lab_slug)
+    if not node:
+        return fail("Docker is not available")
     
-    if existing:
-        return existing, "Instance already running"
+    # Record the placement now so concurrent starts count this slot on the node
+    instance.node = node.name
+    db.session.commit()
+    
+    # Build image if needed
+    with lab_metrics.span('image'):
+        success, msg = build_lab_image(lab_slug, node.name)
+    if not success and "exists" not in msg.lower():
+        return fail(f"Failed to build lab image: {msg}")
     
+    host_port = None
     try:
-        # Get available port
-        host_port = get_available_port()
-        container_name = generate_container_name(user_id, lab_slug)
+        # Prefer an already-booted container from the warm pool (default node only)
+        pooled = None
+        if lab_nodes.is_default_node(node.name) and warm_pool.get_pool_size(lab_slug) > 0:
+            with lab_metrics.span('pool'):
+                pooled = warm_pool.acquire(lab_slug, instance.container_name)
+        if pooled:
+            container_id = pooled['container_id']
+            host_port = pooled['port']
+            route = pooled['route']
+        else:
+            # Routed containers keep the route they were created with, their name
+            route = instance.container_name
+            if not lab_routing.uses_proxy():
+                with lab_metrics.span('port'):
+                    host_port = get_available_port()
+            with lab_metrics.span('run'):
+                container = run_instance_container(client, instance, lab_slug, instance.container_name, host_port)
+            container_id = container.id
         
-        # Create container
-        container = client.containers.run(
-            image=lab_config['image'],
-            name=container_name,
-            detach=True,
-            ports={f"{lab_config['internal_port']}/tcp": host_port},
-            environment={
-                'LAB_FLAG': lab_config['flag'],
-                'USER_ID': str(user_id)
-            },
-            labels={
-                'webnox.lab': 'true',
-                'webnox.user_id': str(user_id),
-                'webnox.lab_id': str(lab_id),
-                'webnox.lab_slug': lab_slug
-            },
-            mem_limit='256m',
-            cpu_period=100000,
-            cpu_quota=50000,  # 50% CPU limit
-            network='webnox-labs',
-            auto_remove=False
-        )
+        if READY_TIMEOUT > 0 and host_port is not None:
+            with lab_metrics.span('ready'):
+                if not wait_until_ready(node.host, host_port):
+                    print(f"Lab {instance.container_name} not answering on port {host_port} yet")
         
         # Determine lab URL
-        host = os.environ.get('LAB_HOST', 'localhost')
-        lab_url = f"http://{host}:{host_port}"
-        
-        # Calculate expiration (2 hours)
-        expires_at = datetime.utcnow() + timedelta(hours=2)
+        lab_url = lab_routing.build_lab_url(node.host, host_port, route)
         
-        # Create database record
-        instance = LabInstance(
-            user_id=user_id,
-            lab_id=lab_id,
-            container_id=container.id,
-            container_name=container_name,
-            port=host_port,
-            status='running',
-            lab_url=lab_url,
-            started_at=datetime.utcnow(),
-            expires_at=expires_at
-        )
-        
-        db.session.add(instance)
-        db.session.commit()
+        # Update database record (expires in 2 hours)
+        instance.container_id = container_id
+        instance.port = host_port or 0
+        instance.lab_url = lab_url
+        instance.status = 'running'
+        instance.started_at = datetime.utcnow()
+        instance.last_active_at = instance.started_at
+        instance.expires_at = datetime.utcnow() + timedelta(hours=2)
+        with lab_metrics.span('commit'):
+            db.session.commit()
+        lab_status.instance_changed(instance)
         
         return instance, "Lab started successfully"
-        
+    
     except docker.errors.ImageNotFound:
-        return None, f"Lab image not found: {lab_config['image']}"
+        if host_port is not None:
+            release_port(host_port)
+        return fail(f"Lab image not found: {lab_config['image']}")
     except Exception as e:
-        release_port(host_port)
-        return None, str(e)
+        report_docker_error(e, node.name)
+        if host_port is not None:
+            release_port(host_port)
+        return fail(str(e))
 
 
 def stop_lab_instance(instance_id=None, user_id=None, lab_id=None):
@@ -226,16 +370,14 @@ def stop_lab_instance(instance_id=None, user_id=None, lab_id=None):
     from app.models.lab_instance import LabInstance
     from app import db
     
-    client = get_docker_client()
-    
     # Find instance
     if instance_id:
         instance = LabInstance.query.get(instance_id)
     elif user_id and lab_id:
-        instance = LabInstance.query.filter_by(
-            user_id=user_id,
-            lab_id=lab_id,
-            status='running'
+        instance = LabInstance.query.filter(
+            LabInstance.user_id == user_id,
+            LabInstance.lab_id == lab_id,
+            LabInstance.status.in_(LabInstance.ACTIVE_STATUSES + ('stopping',))
         ).first()
     else:
         return False, "No instance specified"
@@ -243,29 +385,191 @@ def stop_lab_instance(instance_id=None, user_id=None, lab_id=None):
     if not instance:
         return False, "Instance not found"
     
+    client = get_docker_client(instance.node)
     try:
         if client and instance.container_id:
             try:
                 container = client.containers.get(instance.container_id)
+                if container.status == 'paused':
+                    container.unpause()
                 container.stop(timeout=5)
                 container.remove()
             except docker.errors.NotFound:
                 pass
         
         # Release port
-        release_port(instance.port)
+        if instance.port:
+            release_port(instance.port)
         
         # Update database
         instance.status = 'stopped'
         instance.stopped_at = datetime.utcnow()
         db.session.commit()
+        lab_status.instance_changed(instance)
         
         return True, "Lab stopped successfully"
-        
+    
     except Exception as e:
+        report_docker_error(e, instance.node)
         return False, str(e)
 
 
+def _remove_container(client, container_id):
+    """Force-remove a container; True once it is gone"""
+    if not container_id:
+        return True
+    try:
+        client.containers.get(container_id).remove(force=True)
+        return True
+    except docker.errors.NotFound:
+        return True
+    except Exception as e:
+        print(f"Failed to remove lab container {container_id}: {e}")
+        return False
+
+
+def reset_lab_instance(instance_id):
+    """
+    Give a running (or frozen) instance a pristine container without going
+    through stop/start: the instance keeps its record, expiry and queue
+    slot. In Traefik mode the clean container joins the instance's route
+    before the old one is removed, so the URL never changes; with
+    published ports a warm pool container is swapped in when available
+    (new port), otherwise a fresh container is booted on the same port.
+    
+    The instance is 'resetting' while its containers are swapped, so the
+    reconciler does not take the old container's removal for the lab
+    going away.
+    """
+    from app.models.lab_instance import LabInstance
+    from app import db
+    from app.services import warm_pool
+    
+    instance = LabInstance.query.get(instance_id)
+    if not instance or instance.status not in ('running', 'frozen'):
+        return None, "Lab is not running"
+    
+    if instance.tenant:
+        return lab_tenancy.reset_shared_instance(instance)
+    
+    lab_slug = instance.lab.slug
+    if lab_slug not in LAB_IMAGES:
+        return None, f"Unknown lab configuration: {lab_slug}"
+    
+    node = lab_nodes.get_node(instance.node)
+    client = get_docker_client(instance.node)
+    if not node or not client:
+        return None, "Docker is not available"
+    
+    old_container_id = instance.container_id
+    old_status = instance.status
+    old_port = instance.port
+    route = instance.container_name
+    if old_container_id:
+        try:
+            route = client.containers.get(old_container_id).labels.get('webnox.route') or route
+        except docker.errors.NotFound:
+            pass
+    
+    claimed = db.session.execute(
+        db.update(LabInstance)
+        .where(
+            LabInstance.id == instance.id,
+            LabInstance.container_id == old_container_id,
+            LabInstance.status == old_status
+        )
+        .values(status='resetting')
+    ).rowcount
+    if not claimed:
+        db.session.rollback()
+        return None, "Lab is not running"
+    db.session.commit()
+    lab_status.instance_changed(instance)
+    
+    def restore():
+        # The old container is still serving - hand the instance back unchanged
+        db.session.execute(
+            db.update(LabInstance)
+            .where(LabInstance.id == instance.id, LabInstance.status == 'resetting')
+            .values(status=old_status)
+        )
+        db.session.commit()
+        lab_status.instance_changed(instance)
+    
+    container_name = generate_container_name(instance.user_id, lab_slug)
+    port = old_port
+    pooled = None
+    old_removed = False
+    try:
+        if lab_routing.uses_proxy():
+            # New container starts serving the same route before the old one leaves
+            container_id = run_instance_container(client, instance, lab_slug, container_name, None, route=route).id
+            port = 0
+            _remove_container(client, old_container_id)
+        else:
+            if lab_nodes.is_default_node(instance.node):
+                pooled = warm_pool.acquire(lab_slug, container_name)
+            if pooled:
+                container_id, port = pooled['container_id'], pooled['port']
+                _remove_container(client, old_container_id)
+            else:
+                # The published port belongs to the old container until it is removed
+                if not _remove_container(client, old_container_id):
+                    restore()
+                    return None, "Failed to reset lab: could not remove the old container"
+                old_removed = True
+                container_name = instance.container_name
+                container_id = run_instance_container(client, instance, lab_slug, container_name, old_port).id
+    except Exception as e:
+        report_docker_error(e, instance.node)
+        if old_removed:
+            # The old container is gone and no clean one replaced it
+            db.session.execute(
+                db.update(LabInstance)
+                .where(LabInstance.id == instance.id, LabInstance.status == 'resetting')
+                .values(status='error', stopped_at=datetime.utcnow())
+            )
+            if old_port:
+                release_port(old_port)
+            db.session.commit()
+            lab_status.instance_changed(instance)
+        else:
+            restore()
+        return None, f"Failed to reset lab: {e}"
+    
+    # Only swap if nobody stopped or replaced the instance meanwhile
+    now = datetime.utcnow()
+    result = db.session.execute(
+        db.update(LabInstance)
+        .where(
+            LabInstance.id == instance.id,
+            LabInstance.container_id == old_container_id,
+            LabInstance.status == 'resetting'
+        )
+        .values(
+            container_id=container_id,
+            container_name=container_name,
+            port=port,
+            lab_url=lab_routing.build_lab_url(node.host, port or None, route),
+            status='running',
+            last_active_at=now
+        )
+    )
+    if result.rowcount != 1:
+        _remove_container(client, container_id)
+        if port and port != old_port:
+            release_port(port)
+        db.session.commit()
+        return None, "Lab was stopped while resetting"
+    
+    if port != old_port and old_port:
+        release_port(old_port)
+    db.session.commit()
+    db.session.refresh(instance)
+    lab_status.instance_changed(instance, reason='reset')
+    return instance, "Lab reset"
+
+
 def get_user_instances(user_id):
     """Get all lab instances for a user"""
     from app.models.lab_instance import LabInstance
@@ -288,67 +592,50 @@ def get_running_instance(user_id, lab_id):
 
 def cleanup_expired_instances():
     """Stop all expired lab instances"""
-    from app.models.lab_instance import LabInstance
-    
-    expired = LabInstance.query.filter(
-        LabInstance.status == 'running',
-        LabInstance.expires_at < datetime.utcnow()
-    ).all()
-    
-    results = []
-    for instance in expired:
-        success, msg = stop_lab_instance(instance_id=instance.id)
-        results.append({
-            'instance_id': instance.id,
-            'success': success,
-            'message': msg
-        })
+    from app.services.lab_reaper import reap_expired_instances
     
-    return results
+    return reap_expired_instances()
 
 
 def cleanup_user_instances(user_id):
     """Stop all running instances for a user"""
     from app.models.lab_instance import LabInstance
+    from app.services.lab_reaper import claim_instances, teardown_instances
     
-    instances = LabInstance.query.filter_by(
-        user_id=user_id,
-        status='running'
-    ).all()
-    
-    results = []
-    for instance in instances:
-        success, msg = stop_lab_instance(instance_id=instance.id)
-        results.append({
-            'instance_id': instance.id,
-            'success': success,
-            'message': msg
-        })
-    
-    return results
+    rows = claim_instances(LabInstance.query.filter(
+        LabInstance.user_id == user_id,
+        LabInstance.status.in_(('running', 'frozen'))
+    ))
+    return teardown_instances(rows)
 
 
 def get_instance_status(instance_id):
     """Get current status of a lab instance"""
     from app.models.lab_instance import LabInstance
+    from app.services import lab_reconciler
+    from app import db
     
     instance = LabInstance.query.get(instance_id)
     if not instance:
         return None
     
+    # The reconciler keeps the database current from Docker events
+    if lab_reconciler.is_running():
+        return instance
+    
     # Check actual container status if running
     if instance.status == 'running':
-        client = get_docker_client()
+        client = get_docker_client(instance.node)
         if client:
             try:
                 container = client.containers.get(instance.container_id)
                 if container.status != 'running':
                     instance.status = 'stopped'
-                    from app import db
                     db.session.commit()
+                    lab_status.instance_changed(instance)
             except docker.errors.NotFound:
                 instance.status = 'stopped'
-                from app import db
                 db.session.commit()
+                lab_status.instance_changed(instance)
     
     return instance
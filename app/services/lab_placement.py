@@ -0,0 +1,80 @@
+"""
+Lab Placement
+Chooses the Docker node a new lab instance runs on. Strategies:
+
+    spread          - the node with the most free slots (even load)
+    binpack         - the fullest node that still fits (keeps others empty)
+    image-locality  - prefer nodes that already have the lab image, then spread
+
+Selected with LAB_PLACEMENT_STRATEGY; more can be added with register_strategy.
+"""
+import math
+import os
+
+from app.services import lab_nodes
+
+PLACEMENT_STRATEGY = os.environ.get('LAB_PLACEMENT_STRATEGY', 'spread')
+
+
+def _free(capacity):
+    """Free slots with unlimited nodes sorting as the emptiest"""
+    return math.inf if capacity['free_slots'] is None else capacity['free_slots']
+
+
+def spread(candidates, capacities, lab_slug):
+    return max(candidates, key=lambda node: (_free(capacities[node.name]), -capacities[node.name]['running']))
+
+
+def binpack(candidates, capacities, lab_slug):
+    return min(candidates, key=lambda node: (_free(capacities[node.name]), -capacities[node.name]['running']))
+
+
+def image_locality(candidates, capacities, lab_slug):
+    from app.services.image_manager import is_image_ready
+    
+    warm = [node for node in candidates if is_image_ready(lab_slug, node.name)]
+    return spread(warm or candidates, capacities, lab_slug)
+
+
+# name -> func(candidates, capacities, lab_slug) returning one of candidates
+STRATEGIES = {
+    'spread': spread,
+    'binpack': binpack,
+    'image-locality': image_locality
+}
+
+
+def register_strategy(name, func):
+    STRATEGIES[name] = func
+
+
+def choose_node(lab_slug, strategy=None):
+    """
+    Pick a reachable node with free capacity for a new instance.
+    Returns (node, client), or (None, None) if no node can take it.
+    """
+    from app.services.lab_capacity import get_node_capacities
+    
+    strategy = strategy or PLACEMENT_STRATEGY
+    place = STRATEGIES.get(strategy)
+    if place is None:
+        raise ValueError(f"Unknown placement strategy: {strategy}")
+    
+    clients = {}
+    for node in lab_nodes.get_nodes():
+        client = node.get_client()
+        if client:
+            clients[node.name] = client
+    if not clients:
+        return None, None
+    
+    capacities = get_node_capacities()
+    candidates = [
+        node for node in lab_nodes.get_nodes()
+        if node.name in clients and capacities[node.name]['free_slots'] != 0
+    ]
+    if not candidates:
+        return None, None
+    
+    node = place(candidates, capacities, lab_slug)
+    return node, clients[node.name]
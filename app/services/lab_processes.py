@@ -0,0 +1,488 @@
+"""
+Lab Process Runner
+Runs labs as supervised local Python processes instead of Docker
+containers, for hosts without a Docker daemon (CI, development). Each
+lab's app.py is started from a private copy of its build context, bound
+to a loopback port from the port allocator, with rlimit caps on memory,
+CPU time and open files.
+
+ProcessClient implements the lab backend interface (see lab_backends),
+so a process node is an ordinary lab node: instances go through the
+same queued -> starting -> running -> stopped lifecycle, and the reaper,
+idle detector, freezer (SIGSTOP) and reconciler work unchanged.
+
+Processes belong to the web process that started them, so process nodes
+suit single-process deployments. They need LAB_ROUTING_MODE=ports.
+"""
+import atexit
+import os
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import tarfile
+import tempfile
+import threading
+import time
+import uuid
+import queue
+
+import docker
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# Interface lab processes bind to
+BIND_ADDRESS = os.environ.get('LAB_PROCESS_BIND', '127.0.0.1')
+
+# Where extracted lab "images" and per-instance working copies live
+WORK_DIR = os.environ.get('LAB_PROCESS_DIR', os.path.join(tempfile.gettempdir(), 'webnox-labs'))
+
+# Total CPU seconds a lab process may use (rlimits cannot express a CPU share)
+CPU_SECONDS = int(os.environ.get('LAB_PROCESS_CPU_SECONDS', 3600))
+
+# Open file descriptors per lab process
+MAX_OPEN_FILES = 256
+
+# Seconds to wait for a new lab process to accept connections
+READY_TIMEOUT = float(os.environ.get('LAB_PROCESS_READY_TIMEOUT', 5))
+
+# Seconds between checks for lab processes that exited
+SUPERVISE_INTERVAL = 1
+
+# Directory of the labs/ build context shared by every lab (the tenancy
+# runtime), put on lab processes' import path like the Dockerfiles COPY it
+COMMON_DIR = 'common'
+
+_UNITS = {'b': 1, 'k': 1024, 'm': 1024 ** 2, 'g': 1024 ** 3}
+
+# Clock ticks per second of /proc CPU times
+CLOCK_TICKS = os.sysconf('SC_CLK_TCK') if hasattr(os, 'sysconf') else 100
+
+# Every client in this process, so their labs are stopped on exit
+_clients = []
+
+
+class ProcessError(docker.errors.APIError):
+    """A lab process could not be started or managed"""
+
+
+def parse_memory(limit):
+    """Bytes for a docker-style memory limit such as '256m' (None if unset)"""
+    if not limit:
+        return None
+    if isinstance(limit, int):
+        return limit
+    limit = str(limit).strip().lower()
+    if limit[-1] in _UNITS:
+        return int(float(limit[:-1]) * _UNITS[limit[-1]])
+    return int(limit)
+
+
+def _read_proc(pid, name):
+    with open(f'/proc/{pid}/{name}') as f:
+        return f.read()
+
+
+class LabProcess:
+    """A lab process, shaped like a docker Container"""
+    
+    def __init__(self, client, name, image, labels, ports, environment, mem_limit):
+        self.client = client
+        self.id = uuid.uuid4().hex
+        self.name = name
+        self.image = image
+        self.labels = labels
+        self.ports = {
+            container_port: [{'HostIp': BIND_ADDRESS, 'HostPort': str(host_port)}]
+            for container_port, host_port in ports.items()
+        }
+        self.environment = environment
+        self.mem_limit = mem_limit
+        self.workdir = os.path.join(WORK_DIR, 'instances', self.id)
+        self.process = None
+        self.status = 'created'
+    
+    @property
+    def attrs(self):
+        return {
+            'Id': self.id,
+            'Name': self.name,
+            'Config': {'Labels': self.labels},
+            'State': {'Status': self.status, 'Pid': self.process.pid if self.process else 0},
+            'NetworkSettings': {'Ports': self.ports}
+        }
+    
+    @property
+    def host_port(self):
+        for bindings in self.ports.values():
+            return int(bindings[0]['HostPort'])
+        return None
+    
+    def start(self):
+        root = self.client.images.get(self.image).root
+        shutil.copytree(self.client.image_path(self.image), self.workdir)
+        env = {
+            'PATH': os.environ.get('PATH', '/usr/bin:/bin'),
+            'HOME': self.workdir,
+            'LANG': os.environ.get('LANG', 'C.UTF-8'),
+            'PYTHONUNBUFFERED': '1',
+            'PYTHONDONTWRITEBYTECODE': '1',
+            # Keeps glibc from reserving an arena per thread under the memory cap
+            'MALLOC_ARENA_MAX': '2',
+            'LAB_BIND': BIND_ADDRESS,
+            'LAB_PORT': str(self.host_port)
+        }
+        common = os.path.join(self.workdir, COMMON_DIR)
+        if os.path.isdir(common):
+            env['PYTHONPATH'] = common
+        env.update(self.environment)
+        
+        log = open(os.path.join(self.workdir, 'lab.log'), 'wb')
+        try:
+            self.process = subprocess.Popen(
+                [sys.executable, 'app.py'],
+                cwd=os.path.join(self.workdir, root),
+                env=env,
+                stdin=subprocess.DEVNULL,
+                stdout=log,
+                stderr=subprocess.STDOUT,
+                preexec_fn=self._limit,
+                start_new_session=True
+            )
+        finally:
+            log.close()
+        self.status = 'running'
+        self._wait_ready()
+    
+    def _limit(self):
+        """Runs in the child before exec: resource caps and a lower priority"""
+        if resource is None:
+            return
+        memory = parse_memory(self.mem_limit)
+        if memory:
+            resource.setrlimit(resource.RLIMIT_DATA, (memory, memory))
+        resource.setrlimit(resource.RLIMIT_CPU, (CPU_SECONDS, CPU_SECONDS))
+        resource.setrlimit(resource.RLIMIT_NOFILE, (MAX_OPEN_FILES, MAX_OPEN_FILES))
+        os.nice(10)
+    
+    def _wait_ready(self):
+        deadline = time.monotonic() + READY_TIMEOUT
+        while time.monotonic() < deadline:
+            if self.process.poll() is not None:
+                self.status = 'exited'
+                raise ProcessError(f"Lab process {self.name} exited on start: {self.logs()[-500:]}")
+            try:
+                with socket.create_connection((BIND_ADDRESS, self.host_port), timeout=0.5):
+                    return
+            except OSError:
+                time.sleep(0.05)
+        raise ProcessError(f"Lab process {self.name} did not listen on port {self.host_port}")
+    
+    def logs(self, **kwargs):
+        try:
+            with open(os.path.join(self.workdir, 'lab.log'), 'rb') as f:
+                return f.read().decode(errors='replace')
+        except OSError:
+            return ''
+    
+    def reload(self):
+        if self.process and self.status in ('running', 'paused') and self.process.poll() is not None:
+            self.status = 'exited'
+    
+    def rename(self, name):
+        self.client.rename(self, name)
+    
+    def pause(self):
+        os.killpg(self.process.pid, signal.SIGSTOP)
+        self.status = 'paused'
+    
+    def unpause(self):
+        os.killpg(self.process.pid, signal.SIGCONT)
+        self.status = 'running'
+    
+    def stop(self, timeout=10):
+        if self.process and self.process.poll() is None:
+            try:
+                os.killpg(self.process.pid, signal.SIGCONT)
+                os.killpg(self.process.pid, signal.SIGTERM)
+                self.process.wait(timeout=timeout)
+            except subprocess.TimeoutExpired:
+                os.killpg(self.process.pid, signal.SIGKILL)
+                self.process.wait()
+            except ProcessLookupError:
+                pass
+        self.status = 'exited'
+    
+    def kill(self, signal=None):
+        self.stop(timeout=0)
+    
+    def remove(self, force=False, v=False):
+        if self.status in ('running', 'paused'):
+            if not force:
+                raise ProcessError(f"Lab process {self.name} is running, stop it first")
+            self.stop(timeout=2)
+        self.client.forget(self)
+        shutil.rmtree(self.workdir, ignore_errors=True)
+    
+    def stats(self, stream=False, one_shot=True, decode=None):
+        """
+        Memory (RSS), CPU time and threads of the process. Processes share
+        the host's network stack, so there are no per-lab network counters
+        and the idle detector leaves them to their expiry.
+        """
+        self.reload()
+        if self.status not in ('running', 'paused'):
+            raise ProcessError(f"Lab process {self.name} is not running")
+        try:
+            status = _read_proc(self.process.pid, 'status')
+            stat = _read_proc(self.process.pid, 'stat')
+        except OSError as e:
+            raise ProcessError(f"No process statistics for {self.name}: {e}")
+        
+        fields = dict(line.split(':', 1) for line in status.splitlines() if ':' in line)
+        rss = int(fields.get('VmRSS', '0 kB').split()[0]) * 1024
+        # utime and stime, after the parenthesised command name
+        ticks = sum(int(value) for value in stat.rsplit(')', 1)[1].split()[11:13])
+        return {
+            'memory_stats': {'usage': rss, 'limit': parse_memory(self.mem_limit) or 0},
+            'cpu_stats': {'cpu_usage': {'total_usage': ticks * 10 ** 9 // CLOCK_TICKS}},
+            'pids_stats': {'current': int(fields.get('Threads', '1').strip())}
+        }
+
+
+class ProcessImage:
+    def __init__(self, tag, labels, root=''):
+        self.id = tag
+        self.tags = [tag]
+        self.labels = labels
+        # Directory of the context the lab's app.py runs from
+        self.root = root
+
+
+class ProcessImages:
+    """
+    Lab "images" are extracted build contexts. A lab runs from the directory
+    of its Dockerfile, so labs built from labs/ (dockerfile='<lab>/Dockerfile')
+    run from <lab>/ with the rest of the context beside it.
+    """
+    
+    def __init__(self, client):
+        self.client = client
+        self._images = {}
+    
+    def get(self, name):
+        image = self._images.get(name)
+        if image is None or not os.path.isdir(self.client.image_path(name)):
+            raise docker.errors.ImageNotFound(f"No such image: {name}")
+        return image
+    
+    def build(self, fileobj=None, tag=None, labels=None, custom_context=False, path=None, dockerfile=None, **kwargs):
+        root = os.path.dirname(dockerfile or '')
+        target = self.client.image_path(tag)
+        staging = f"{target}.build-{uuid.uuid4().hex[:8]}"
+        if custom_context:
+            with tarfile.open(fileobj=fileobj) as tar:
+                tar.extractall(staging)
+        else:
+            shutil.copytree(path, staging)
+        
+        if not os.path.exists(os.path.join(staging, root, 'app.py')):
+            shutil.rmtree(staging, ignore_errors=True)
+            raise docker.errors.BuildError(f"{tag} has no app.py to run as a process", [])
+        
+        shutil.rmtree(target, ignore_errors=True)
+        os.rename(staging, target)
+        self._images[tag] = ProcessImage(tag, labels or {}, root)
+        return self._images[tag], iter(())
+
+
+class ProcessContainers:
+    def __init__(self, client):
+        self.client = client
+    
+    def run(self, image, name=None, ports=None, environment=None, labels=None, mem_limit=None, **kwargs):
+        """Start a lab process; ports must publish exactly one host port"""
+        if not ports:
+            raise ProcessError("Lab processes need a published port (LAB_ROUTING_MODE=ports)")
+        self.client.images.get(image)
+        
+        process = LabProcess(
+            self.client,
+            name or f"webnox-process-{uuid.uuid4().hex[:8]}",
+            image,
+            dict(labels or {}),
+            ports,
+            {key: str(value) for key, value in (environment or {}).items()},
+            mem_limit
+        )
+        self.client.add(process)
+        try:
+            process.start()
+        except Exception:
+            process.remove(force=True)
+            raise
+        return process
+    
+    def get(self, container_id):
+        process = self.client.find(container_id)
+        if process is None:
+            raise docker.errors.NotFound(f"No such container: {container_id}")
+        process.reload()
+        return process
+    
+    def list(self, all=False, filters=None, **kwargs):
+        wanted = (filters or {}).get('label') or []
+        if isinstance(wanted, str):
+            wanted = [wanted]
+        
+        processes = []
+        for process in self.client.all():
+            process.reload()
+            if not all and process.status not in ('running', 'paused'):
+                continue
+            if _labels_match(process.labels, wanted):
+                processes.append(process)
+        return processes
+
+
+def _labels_match(labels, selectors):
+    """Whether labels satisfy every 'key' / 'key=value' filter"""
+    for selector in selectors:
+        key, _, value = selector.partition('=')
+        if key not in labels or (value and labels[key] != value):
+            return False
+    return True
+
+
+class ProcessClient:
+    """docker.DockerClient look-alike that runs labs as local processes"""
+    
+    def __init__(self, work_dir=WORK_DIR):
+        self.work_dir = work_dir
+        self.containers = ProcessContainers(self)
+        self.images = ProcessImages(self)
+        self._processes = {}
+        self._lock = threading.Lock()
+        self._subscribers = []
+        os.makedirs(os.path.join(work_dir, 'images'), exist_ok=True)
+        os.makedirs(os.path.join(work_dir, 'instances'), exist_ok=True)
+        
+        self._supervisor = threading.Thread(target=self._supervise, name='webnox-lab-processes', daemon=True)
+        self._supervisor.start()
+        _clients.append(self)
+    
+    def image_path(self, tag):
+        return os.path.join(self.work_dir, 'images', tag.replace('/', '_').replace(':', '_'))
+    
+    def add(self, process):
+        with self._lock:
+            if any(other.name == process.name for other in self._processes.values()):
+                raise ProcessError(f"Conflict: the name {process.name} is already in use")
+            self._processes[process.id] = process
+    
+    def forget(self, process):
+        with self._lock:
+            self._processes.pop(process.id, None)
+        self._emit(process, 'destroy')
+    
+    def rename(self, process, name):
+        with self._lock:
+            if any(other.name == name for other in self._processes.values() if other is not process):
+                raise ProcessError(f"Conflict: the name {name} is already in use")
+            process.name = name
+    
+    def find(self, container_id):
+        with self._lock:
+            process = self._processes.get(container_id)
+            if process is None:
+                process = next((p for p in self._processes.values() if p.name == container_id), None)
+            return process
+    
+    def all(self):
+        with self._lock:
+            return list(self._processes.values())
+    
+    def ping(self):
+        return True
+    
+    def info(self):
+        memory = None
+        if hasattr(os, 'sysconf'):
+            try:
+                memory = os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES')
+            except (ValueError, OSError):
+                pass
+        return {'MemTotal': memory, 'NCPU': os.cpu_count(), 'OperatingSystem': 'webnox lab processes'}
+    
+    def events(self, decode=True, filters=None, **kwargs):
+        """Blocking stream of lifecycle events ({'id', 'status', 'Actor'}) like the daemon's"""
+        wanted = set((filters or {}).get('event') or ())
+        events = queue.Queue()
+        with self._lock:
+            self._subscribers.append(events)
+        
+        def stream():
+            try:
+                while True:
+                    event = events.get()
+                    if not wanted or event['status'] in wanted:
+                        yield event
+            finally:
+                with self._lock:
+                    self._subscribers.remove(events)
+        return stream()
+    
+    def _emit(self, process, status):
+        event = {
+            'id': process.id,
+            'status': status,
+            'Type': 'container',
+            'Actor': {'ID': process.id, 'Attributes': dict(process.labels, name=process.name)}
+        }
+        with self._lock:
+            subscribers = list(self._subscribers)
+        for events in subscribers:
+            events.put(event)
+    
+    def _supervise(self):
+        """Notice lab processes that exited (crashed, killed, out of CPU time)"""
+        while True:
+            time.sleep(SUPERVISE_INTERVAL)
+            for process in self.all():
+                if process.status in ('running', 'paused') and process.process.poll() is not None:
+                    process.status = 'exited'
+                    self._emit(process, 'die')
+    
+    def stop_all(self):
+        for process in self.all():
+            try:
+                process.remove(force=True)
+            except Exception as e:
+                print(f"Failed to stop lab process {process.name}: {e}")
+    
+    def close(self):
+        pass
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """The process backend of this web process (process nodes share it)"""
+    global _client
+    
+    with _client_lock:
+        if _client is None:
+            _client = ProcessClient()
+        return _client
+
+
+@atexit.register
+def _stop_all_processes():
+    for client in _clients:
+        client.stop_all()
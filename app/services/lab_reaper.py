@@ -0,0 +1,225 @@
+"""
+Lab Expiry Reaper
+Periodically tears down expired lab instances. Containers are removed
+concurrently through a bounded thread pool and the database is updated
+once per sweep.
+"""
+import docker
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from app.services import lab_metrics, lab_status, scheduler
+from app.services.lab_orchestrator import get_docker_client
+
+# Seconds between sweeps
+REAPER_INTERVAL = int(os.environ.get('LAB_REAPER_INTERVAL', 60))
+
+# Containers torn down in parallel
+REAPER_WORKERS = int(os.environ.get('LAB_REAPER_WORKERS', 16))
+
+# Seconds an instance may stay 'starting', 'resetting' or 'stopping' before it counts as stuck
+# (its job was lost with a restarted process or a crashed worker)
+STUCK_TIMEOUT = int(os.environ.get('LAB_STUCK_TIMEOUT', 900))
+
+_metrics = {
+    'sweeps': 0,
+    'last_duration_seconds': 0.0,
+    'last_backlog': 0,
+    'reaped_total': 0,
+    'failures_total': 0
+}
+_metrics_lock = threading.Lock()
+
+
+def get_reaper_metrics():
+    with _metrics_lock:
+        return dict(_metrics)
+
+
+def teardown_container(container_id, node=None):
+    """Force-remove a lab container on its node; returns (success, message)"""
+    if not container_id:
+        return True, "No container"
+    
+    client = get_docker_client(node)
+    if not client:
+        return False, "Docker is not available"
+    
+    try:
+        client.containers.get(container_id).remove(force=True)
+        return True, "Container removed"
+    except docker.errors.NotFound:
+        return True, "Container already gone"
+    except Exception as e:
+        return False, str(e)
+
+
+def teardown_instances(rows, final_status='stopped', reason=None):
+    """
+    Tear down the containers for rows returned by claim_instances in parallel,
+    then record the outcome with one UPDATE per table and a single commit.
+    Instances whose teardown failed return to their previous status so the
+    next sweep retries them. reason ('expired', 'idle', ...) is passed on
+    to lab event streams.
+    """
+    from app.models.lab_instance import LabInstance
+    from app.models.lab_port import LabPort
+    from app import db
+    
+    if not rows:
+        return []
+    
+    with ThreadPoolExecutor(max_workers=min(REAPER_WORKERS, len(rows))) as pool:
+        outcomes = list(pool.map(
+            teardown_container,
+            [row.container_id for row in rows],
+            [row.node for row in rows]
+        ))
+    
+    done = [row for row, (success, _) in zip(rows, outcomes) if success]
+    failed = [row for row, (success, _) in zip(rows, outcomes) if not success]
+    
+    if done:
+        db.session.execute(
+            db.update(LabInstance)
+            .where(LabInstance.id.in_([row.id for row in done]))
+            .values(status=final_status, stopped_at=datetime.utcnow())
+        )
+        ports = [row.port for row in done if row.port]
+        if ports:
+            db.session.execute(
+                db.update(LabPort)
+                .where(LabPort.port.in_(ports))
+                .values(is_allocated=False, allocated_at=None)
+            )
+    for previous_status in {row.status for row in failed}:
+        db.session.execute(
+            db.update(LabInstance)
+            .where(LabInstance.id.in_([row.id for row in failed if row.status == previous_status]))
+            .values(status=previous_status)
+        )
+    db.session.commit()
+    if done and reason:
+        lab_metrics.inc('webnox_lab_evictions_total', len(done), reason=reason)
+    lab_status.instances_changed([row.id for row in done], reason=reason)
+    lab_status.instances_changed([row.id for row in failed])
+    
+    return [
+        {'instance_id': row.id, 'success': success, 'message': message}
+        for row, (success, message) in zip(rows, outcomes)
+    ]
+
+
+# Statuses whose containers the reaper may tear down
+REAPABLE_STATUSES = ('running', 'frozen')
+
+# Transitional statuses a lost job can leave an instance in
+STUCK_STATUSES = ('starting', 'resetting', 'stopping')
+
+
+def claim_instances(query, statuses=REAPABLE_STATUSES):
+    """
+    Move matching instances in statuses (running/frozen by default) to
+    'stopping' and return the rows this call claimed. Each row is claimed
+    only if its status is still the one read, so rows an overlapping sweep,
+    resume or user stop got to first are left to them.
+    """
+    from app.models.lab_instance import LabInstance
+    from app import db
+    
+    rows = query.with_entities(
+        LabInstance.id,
+        LabInstance.container_id,
+        LabInstance.port,
+        LabInstance.status,
+        LabInstance.node
+    ).all()
+    
+    claimed = []
+    for row in rows:
+        if row.status not in statuses:
+            continue
+        moved = db.session.execute(
+            db.update(LabInstance)
+            .where(LabInstance.id == row.id, LabInstance.status == row.status)
+            .values(status='stopping')
+        ).rowcount
+        if moved:
+            claimed.append(row)
+    
+    if claimed:
+        db.session.commit()
+        lab_status.instances_changed([row.id for row in claimed])
+    else:
+        db.session.rollback()
+    return claimed
+
+
+def reap_expired_instances():
+    """Stop every running or frozen instance past its expires_at"""
+    from app.models.lab_instance import LabInstance
+    
+    started = time.monotonic()
+    rows = claim_instances(LabInstance.query.filter(
+        LabInstance.status.in_(REAPABLE_STATUSES),
+        LabInstance.expires_at < datetime.utcnow()
+    ))
+    results = teardown_instances(rows, reason='expired')
+    
+    failures = sum(1 for result in results if not result['success'])
+    with _metrics_lock:
+        _metrics['sweeps'] += 1
+        _metrics['last_duration_seconds'] = time.monotonic() - started
+        _metrics['last_backlog'] = len(rows)
+        _metrics['reaped_total'] += len(results) - failures
+        _metrics['failures_total'] += failures
+    
+    if rows:
+        print(f"Lab reaper: stopped {len(results) - failures}/{len(rows)} expired instances")
+    return results
+
+
+def recover_stuck_instances():
+    """
+    Finish instances stuck 'starting', 'resetting' or 'stopping' for
+    STUCK_TIMEOUT: their containers are removed and ports released, stuck
+    starts and resets end in 'error' (so the user can start again) and
+    stuck stops in 'stopped'.
+    """
+    from app.models.lab_instance import LabInstance
+    from app import db
+    
+    if STUCK_TIMEOUT <= 0:
+        return []
+    
+    cutoff = datetime.utcnow() - timedelta(seconds=STUCK_TIMEOUT)
+    rows = claim_instances(LabInstance.query.filter(
+        LabInstance.status.in_(STUCK_STATUSES),
+        db.or_(LabInstance.updated_at == None, LabInstance.updated_at < cutoff)
+    ), statuses=STUCK_STATUSES)
+    
+    failed = [row for row in rows if row.status in ('starting', 'resetting')]
+    results = teardown_instances(failed, final_status='error', reason='stuck')
+    results += teardown_instances([row for row in rows if row.status == 'stopping'], reason='stuck')
+    if rows:
+        print(f"Lab reaper: recovered {len(rows)} stuck instances")
+    return results
+
+
+def _recover_on_startup(app):
+    # Jobs queued in this process before a restart are gone - don't wait for the first sweep
+    with app.app_context():
+        try:
+            recover_stuck_instances()
+        except Exception as e:
+            print(f"Lab reaper: stuck instance recovery failed: {e}")
+
+
+def init_app(app):
+    if app.config.get('LAB_BACKGROUND_TASKS'):
+        _recover_on_startup(app)
+    scheduler.add_task('lab-reaper', REAPER_INTERVAL, reap_expired_instances)
+    scheduler.add_task('lab-stuck-recovery', REAPER_INTERVAL, recover_stuck_instances)
@@ -0,0 +1,191 @@
+"""
+Lab State Reconciler
+Follows the Docker events stream of every lab node for webnox.lab containers and applies
+container deaths (crashes, OOM kills, external stops) to LabInstance
+rows and the port pool in batches, so status reads never hit Docker.
+"""
+import docker
+import os
+import queue
+import threading
+import time
+from datetime import datetime
+
+from app.services import lab_nodes, lab_status
+from app.services.lab_orchestrator import get_docker_client
+
+# Container events that mean a lab is no longer serving
+TERMINAL_EVENTS = ('die', 'oom', 'stop', 'kill', 'destroy')
+
+# Flush pending events after this many seconds or this many containers
+FLUSH_INTERVAL = float(os.environ.get('LAB_RECONCILE_FLUSH_INTERVAL', 1.0))
+FLUSH_BATCH_SIZE = 200
+
+# Queued whenever a node's event stream (re)connects - events may have been missed
+RESYNC = 'resync'
+
+# Items are (node name, container id or RESYNC)
+_events = queue.Queue()
+_threads = []
+_running = threading.Event()
+
+
+def is_running():
+    """Whether this process is following the Docker events stream"""
+    return _running.is_set()
+
+
+def mark_containers_gone(container_ids):
+    """
+    Mark running/frozen instances backed by these containers as stopped and free
+    their ports - one UPDATE per table, one commit. Returns the container
+    ids that were still running.
+    """
+    from app.models.lab_instance import LabInstance
+    from app.models.lab_port import LabPort
+    from app import db
+    
+    if not container_ids:
+        return []
+    
+    rows = db.session.query(LabInstance.id, LabInstance.port, LabInstance.container_id).filter(
+        LabInstance.container_id.in_(container_ids),
+        LabInstance.status.in_(('running', 'frozen'))
+    ).all()
+    if not rows:
+        return []
+    
+    instance_ids = [row.id for row in rows]
+    ports = [row.port for row in rows if row.port]
+    
+    db.session.execute(
+        db.update(LabInstance)
+        .where(LabInstance.id.in_(instance_ids), LabInstance.status.in_(('running', 'frozen')))
+        .values(status='stopped', stopped_at=datetime.utcnow())
+    )
+    if ports:
+        db.session.execute(
+            db.update(LabPort)
+            .where(LabPort.port.in_(ports))
+            .values(is_allocated=False, allocated_at=None)
+        )
+    db.session.commit()
+    lab_status.instances_changed(instance_ids, reason='exited')
+    return [row.container_id for row in rows]
+
+
+def resync(client, node=None):
+    """Full comparison of a node's running instances against its daemon (used at startup)"""
+    from app.models.lab_instance import LabInstance
+    from app import db
+    
+    alive = {
+        container.id
+        for container in client.containers.list(filters={'label': 'webnox.lab=true'})
+    }
+    container_ids = [
+        container_id for (container_id,) in db.session.query(LabInstance.container_id).filter(
+            lab_nodes.instance_filter(node),
+            LabInstance.status.in_(('running', 'frozen')),
+            LabInstance.container_id != None
+        )
+        if container_id not in alive
+    ]
+    return mark_containers_gone(container_ids)
+
+
+def _read_events(node):
+    while True:
+        client = get_docker_client(node)
+        if not client:
+            time.sleep(5)
+            continue
+        
+        _events.put((node, RESYNC))
+        try:
+            stream = client.events(
+                decode=True,
+                filters={
+                    'type': 'container',
+                    'label': 'webnox.lab=true',
+                    'event': list(TERMINAL_EVENTS)
+                }
+            )
+            for event in stream:
+                container_id = event.get('id') or event.get('Actor', {}).get('ID')
+                if container_id:
+                    _events.put((node, container_id))
+        except Exception as e:
+            print(f"Docker event stream error on node {node}: {e}")
+        time.sleep(1)
+
+
+def _collect_batch():
+    """Block for the first event, then gather more until the flush window closes"""
+    batch = {_events.get()}
+    deadline = time.monotonic() + FLUSH_INTERVAL
+    while len(batch) < FLUSH_BATCH_SIZE:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            break
+        try:
+            batch.add(_events.get(timeout=remaining))
+        except queue.Empty:
+            break
+    return batch
+
+
+def _apply_events(app):
+    while True:
+        batch = _collect_batch()
+        with app.app_context():
+            try:
+                by_node = {}
+                for node, item in batch:
+                    by_node.setdefault(node, set()).add(item)
+                
+                for node, items in by_node.items():
+                    if RESYNC in items:
+                        items.discard(RESYNC)
+                        client = get_docker_client(node)
+                        if client:
+                            _remove_containers(resync(client, node), node)
+                    _remove_containers(mark_containers_gone(list(items)), node)
+            except Exception as e:
+                print(f"Lab reconcile error: {e}")
+
+
+def _remove_containers(container_ids, node=None):
+    client = get_docker_client(node)
+    if not client:
+        return
+    for container_id in container_ids:
+        try:
+            client.containers.get(container_id).remove(force=True)
+        except docker.errors.NotFound:
+            pass
+        except Exception as e:
+            print(f"Failed to remove dead lab container {container_id}: {e}")
+
+
+def start(app):
+    """Follow each node's Docker events stream in the background (resyncing on every connect)"""
+    if _threads:
+        return _threads
+    
+    readers = [
+        (_read_events, (node.name,), f'webnox-lab-events-{node.name}')
+        for node in lab_nodes.get_nodes()
+    ]
+    for target, args, name in readers + [(_apply_events, (app,), 'webnox-lab-reconciler')]:
+        thread = threading.Thread(target=target, args=args, name=name, daemon=True)
+        thread.start()
+        _threads.append(thread)
+    
+    _running.set()
+    return _threads
+
+
+def init_app(app):
+    if app.config.get('LAB_BACKGROUND_TASKS'):
+        start(app)
@@ -0,0 +1,306 @@
+"""
+Lab Resource Profiles
+Memory, CPU and pids limits per lab. A lab's profile is the container
+defaults overridden by the 'resources' entry of its LAB_IMAGES config.
+
+A collector samples the stats of running lab containers and keeps each
+lab's peak usage (lab_resource_usage). The recommended profile is the
+peaks plus LAB_RESOURCE_HEADROOM, never above the configured profile;
+with LAB_RESOURCE_AUTOSIZE=true it replaces the configured one for new
+containers once a lab has LAB_RESOURCE_MIN_SAMPLES samples. Capacity
+accounting reserves each lab's own profile, so right-sized labs leave
+room for more students on a host.
+"""
+import math
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import click
+
+from app.services import scheduler
+from app.services.lab_orchestrator import (
+    LAB_IMAGES,
+    get_docker_client,
+    CONTAINER_MEM_LIMIT_BYTES,
+    CONTAINER_CPU_SHARE,
+    CONTAINER_PIDS_LIMIT
+)
+from app.services.lab_processes import parse_memory
+
+# Seconds between usage samples (0 disables the collector)
+SAMPLE_INTERVAL = int(os.environ.get('LAB_RESOURCE_SAMPLE_INTERVAL', 300))
+
+# Start new containers with the recommended profile instead of the configured one
+AUTOSIZE = os.environ.get('LAB_RESOURCE_AUTOSIZE', 'false').lower() == 'true'
+
+# Recommended limits are the observed peaks times this factor
+HEADROOM = float(os.environ.get('LAB_RESOURCE_HEADROOM', 1.5))
+
+# Samples a lab needs before its recommendation is applied
+MIN_SAMPLES = int(os.environ.get('LAB_RESOURCE_MIN_SAMPLES', 100))
+
+# Floors and rounding of recommended limits
+MIN_MEMORY = 32 * 1024 * 1024
+MEMORY_STEP = 16 * 1024 * 1024
+MIN_CPU = 0.1
+CPU_STEP = 0.05
+MIN_PIDS = 32
+
+# Seconds the observed usage is cached between database reads
+USAGE_CACHE_TTL = 60
+
+SAMPLE_WORKERS = 16
+
+DEFAULT_PROFILE = {
+    'memory': CONTAINER_MEM_LIMIT_BYTES,
+    'cpu': CONTAINER_CPU_SHARE,
+    'pids': CONTAINER_PIDS_LIMIT
+}
+
+# container id -> (cumulative CPU nanoseconds, monotonic time) at the previous sample
+_last_cpu = {}
+_samples_lock = threading.Lock()
+
+_usage_cache = {'usage': {}, 'fetched_at': 0}
+_usage_lock = threading.Lock()
+
+
+def get_configured_profile(lab_slug):
+    """The defaults overridden by the lab's LAB_IMAGES 'resources' entry"""
+    profile = dict(DEFAULT_PROFILE)
+    profile.update(LAB_IMAGES.get(lab_slug, {}).get('resources', {}))
+    profile['memory'] = parse_memory(profile['memory'])
+    return profile
+
+
+def recommend_profile(usage, configured):
+    """Limits fitting the observed peaks with headroom, capped at the configured profile"""
+    memory = math.ceil(usage['memory_peak'] * HEADROOM / MEMORY_STEP) * MEMORY_STEP
+    cpu = math.ceil(usage['cpu_peak'] * HEADROOM / CPU_STEP) * CPU_STEP
+    pids = math.ceil(usage['pids_peak'] * HEADROOM)
+    return {
+        'memory': min(max(memory, MIN_MEMORY), configured['memory']),
+        'cpu': round(min(max(cpu, MIN_CPU), configured['cpu']), 2),
+        'pids': min(max(pids, MIN_PIDS), configured['pids'])
+    }
+
+
+def get_usage():
+    """lab slug -> observed usage dict, cached for USAGE_CACHE_TTL"""
+    from app.models.lab_resource_usage import LabResourceUsage
+    
+    with _usage_lock:
+        if time.monotonic() - _usage_cache['fetched_at'] < USAGE_CACHE_TTL:
+            return _usage_cache['usage']
+        
+        _usage_cache['usage'] = {row.lab_slug: row.to_dict() for row in LabResourceUsage.query.all()}
+        _usage_cache['fetched_at'] = time.monotonic()
+        return _usage_cache['usage']
+
+
+def get_profile(lab_slug):
+    """Limits a new container of this lab gets: {'memory' bytes, 'cpu' cores, 'pids'}"""
+    configured = get_configured_profile(lab_slug)
+    if not AUTOSIZE:
+        return configured
+    
+    usage = get_usage().get(lab_slug)
+    if not usage or usage['samples'] < MIN_SAMPLES:
+        return configured
+    return recommend_profile(usage, configured)
+
+
+def get_slot_profile():
+    """The largest memory and CPU any lab reserves - what one free capacity slot must fit"""
+    profiles = [get_profile(lab_slug) for lab_slug in LAB_IMAGES] or [DEFAULT_PROFILE]
+    return {
+        'memory': max(profile['memory'] for profile in profiles),
+        'cpu': max(profile['cpu'] for profile in profiles)
+    }
+
+
+def sample_container(container_id, node=None):
+    """(memory bytes, cumulative CPU ns, pids) of a container; None values if unknown"""
+    client = get_docker_client(node)
+    if not client or not container_id:
+        return None
+    
+    try:
+        stats = client.containers.get(container_id).stats(stream=False, one_shot=True)
+    except Exception:
+        return None
+    
+    # Page cache is reclaimable - count it the way `docker stats` does
+    memory_stats = stats.get('memory_stats') or {}
+    memory = memory_stats.get('usage')
+    if memory is not None:
+        breakdown = memory_stats.get('stats') or {}
+        memory -= breakdown.get('inactive_file', breakdown.get('total_inactive_file', 0))
+    
+    cpu = ((stats.get('cpu_stats') or {}).get('cpu_usage') or {}).get('total_usage')
+    pids = (stats.get('pids_stats') or {}).get('current')
+    return memory, cpu, pids
+
+
+def _raised(column, value):
+    """column, raised to value if lower (GREATEST on every database)"""
+    from app import db
+    
+    return db.case((column < value, value), else_=column)
+
+
+def record_peaks(peaks):
+    """Add samples and raise recorded peaks, {lab slug: peaks} from collect_usage"""
+    from sqlalchemy.exc import IntegrityError
+    from app.models.lab_resource_usage import LabResourceUsage
+    from app import db
+    
+    # Create missing rows first; a process creating the same lab's row concurrently costs a retry
+    for attempt in range(3):
+        existing = {
+            lab_slug for (lab_slug,) in db.session.query(LabResourceUsage.lab_slug).filter(
+                LabResourceUsage.lab_slug.in_(list(peaks))
+            )
+        }
+        for lab_slug in peaks:
+            if lab_slug not in existing:
+                db.session.add(LabResourceUsage(lab_slug=lab_slug, samples=0, memory_peak=0, cpu_peak=0.0, pids_peak=0))
+        try:
+            db.session.commit()
+            break
+        except IntegrityError:
+            db.session.rollback()
+            if attempt == 2:
+                raise
+    
+    # Raised in SQL so concurrent collectors never overwrite each other's samples
+    for lab_slug, lab_peaks in peaks.items():
+        db.session.execute(
+            db.update(LabResourceUsage).where(LabResourceUsage.lab_slug == lab_slug).values(
+                samples=LabResourceUsage.samples + lab_peaks['samples'],
+                memory_peak=_raised(LabResourceUsage.memory_peak, lab_peaks['memory_peak']),
+                cpu_peak=_raised(LabResourceUsage.cpu_peak, lab_peaks['cpu_peak']),
+                pids_peak=_raised(LabResourceUsage.pids_peak, lab_peaks['pids_peak']),
+                updated_at=datetime.utcnow()
+            )
+        )
+    db.session.commit()
+
+
+def collect_usage():
+    """Sample every running lab container and raise each lab's recorded peaks"""
+    from app.models.lab import Lab
+    from app.models.lab_instance import LabInstance
+    from app import db
+    
+    # Shared containers run many tenants under their own limit - not a lab's profile
+    rows = db.session.query(LabInstance.container_id, LabInstance.node, Lab.slug).join(
+        Lab, Lab.id == LabInstance.lab_id
+    ).filter(
+        LabInstance.status == 'running',
+        LabInstance.tenant == None,
+        LabInstance.container_id != None
+    ).all()
+    if not rows:
+        return {}
+    
+    with ThreadPoolExecutor(max_workers=min(SAMPLE_WORKERS, len(rows))) as pool:
+        samples = list(pool.map(
+            sample_container,
+            [row.container_id for row in rows],
+            [row.node for row in rows]
+        ))
+    
+    now = time.monotonic()
+    peaks = {}
+    with _samples_lock:
+        for row, sample in zip(rows, samples):
+            if sample is None:
+                continue
+            memory, cpu_total, pids = sample
+            
+            # CPU is the average between two samples of the same container
+            cpu = None
+            previous = _last_cpu.get(row.container_id)
+            if cpu_total is not None:
+                if previous and now > previous[1]:
+                    cpu = max(cpu_total - previous[0], 0) / 1e9 / (now - previous[1])
+                _last_cpu[row.container_id] = (cpu_total, now)
+            
+            lab_peaks = peaks.setdefault(row.slug, {'samples': 0, 'memory_peak': 0, 'cpu_peak': 0.0, 'pids_peak': 0})
+            lab_peaks['samples'] += 1
+            lab_peaks['memory_peak'] = max(lab_peaks['memory_peak'], memory or 0)
+            lab_peaks['cpu_peak'] = max(lab_peaks['cpu_peak'], cpu or 0.0)
+            lab_peaks['pids_peak'] = max(lab_peaks['pids_peak'], pids or 0)
+        
+        # Forget containers that are no longer running
+        running_ids = {row.container_id for row in rows}
+        for container_id in list(_last_cpu):
+            if container_id not in running_ids:
+                del _last_cpu[container_id]
+    
+    record_peaks(peaks)
+    
+    with _usage_lock:
+        _usage_cache['fetched_at'] = 0
+    return peaks
+
+
+def reset_usage(lab_slug=None):
+    """Forget the observed usage of one lab (or all), e.g. after the lab changed"""
+    from app.models.lab_resource_usage import LabResourceUsage
+    from app import db
+    
+    query = LabResourceUsage.query
+    if lab_slug:
+        query = query.filter_by(lab_slug=lab_slug)
+    deleted = query.delete(synchronize_session=False)
+    db.session.commit()
+    with _usage_lock:
+        _usage_cache['fetched_at'] = 0
+    return deleted
+
+
+def get_resource_stats():
+    """Per lab: configured, observed, recommended and applied profiles"""
+    usage = get_usage()
+    stats = {'autosize': AUTOSIZE, 'labs': {}}
+    for lab_slug in LAB_IMAGES:
+        configured = get_configured_profile(lab_slug)
+        observed = usage.get(lab_slug)
+        stats['labs'][lab_slug] = {
+            'configured': configured,
+            'observed': observed,
+            'recommended': recommend_profile(observed, configured) if observed else None,
+            'applied': get_profile(lab_slug)
+        }
+    return stats
+
+
+def init_app(app):
+    """Register the usage collector and the CLI commands"""
+    
+    @app.cli.command('lab-resources')
+    def lab_resources_command():
+        """Show each lab's configured, observed and recommended limits."""
+        for lab_slug, stats in get_resource_stats()['labs'].items():
+            configured = stats['configured']
+            recommended = stats['recommended']
+            samples = stats['observed']['samples'] if stats['observed'] else 0
+            line = f"{lab_slug}: configured {configured['memory'] // 1024 ** 2}m/{configured['cpu']} CPU/{configured['pids']} pids"
+            if recommended:
+                line += (f", recommended {recommended['memory'] // 1024 ** 2}m/{recommended['cpu']} CPU/"
+                         f"{recommended['pids']} pids from {samples} samples")
+            print(line)
+    
+    @app.cli.command('reset-lab-resources')
+    @click.argument('lab_slug', required=False)
+    def reset_lab_resources_command(lab_slug):
+        """Forget observed usage (of one lab, or all) so it is sampled afresh."""
+        print(f"Removed {reset_usage(lab_slug)} usage records")
+    
+    if SAMPLE_INTERVAL > 0:
+        scheduler.add_task('lab-resource-usage', SAMPLE_INTERVAL, collect_usage)
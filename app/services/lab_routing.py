@@ -0,0 +1,72 @@
+"""
+Lab Routing
+How users reach a lab container. In 'ports' mode (the default) every
+container publishes a host port from the port allocator. In 'traefik'
+mode containers publish nothing - they carry Traefik router labels and
+are served through the proxy's labs entrypoint, one route per instance:
+
+    host  http://webnox-lab-7-idor-profile-x1y2z3.LAB_HOST:8889/
+    path  http://LAB_HOST:8889/lab/webnox-lab-7-idor-profile-x1y2z3/
+
+Host routing needs wildcard DNS for LAB_HOST (*.localhost works out of
+the box); path routing only suits labs that use relative links.
+"""
+import os
+
+# 'ports' or 'traefik'
+ROUTING_MODE = os.environ.get('LAB_ROUTING_MODE', 'ports')
+
+# Traefik rule per instance: 'host' (subdomain) or 'path' (/lab/<route>/ prefix)
+TRAEFIK_RULE = os.environ.get('LAB_TRAEFIK_RULE', 'host')
+
+# Traefik entrypoint and Docker network lab routes are served on
+TRAEFIK_ENTRYPOINT = os.environ.get('LAB_TRAEFIK_ENTRYPOINT', 'labs')
+TRAEFIK_NETWORK = os.environ.get('LAB_NETWORK', 'webnox-labs')
+
+# Where users reach the proxy (port is omitted from URLs when empty)
+PROXY_SCHEME = os.environ.get('LAB_PROXY_SCHEME', 'http')
+PROXY_PORT = os.environ.get('LAB_PROXY_PORT', '8889')
+
+PATH_PREFIX = '/lab'
+
+
+def uses_proxy():
+    """Whether lab containers are routed through Traefik instead of published ports"""
+    return ROUTING_MODE == 'traefik'
+
+
+def get_route_labels(route, internal_port):
+    """Traefik labels that route requests for `route` to a container's internal port"""
+    router = f"traefik.http.routers.{route}"
+    labels = {
+        'traefik.enable': 'true',
+        'traefik.docker.network': TRAEFIK_NETWORK,
+        f"{router}.entrypoints": TRAEFIK_ENTRYPOINT,
+        f"{router}.service": route,
+        f"traefik.http.services.{route}.loadbalancer.server.port": str(internal_port),
+        'webnox.route': route
+    }
+    
+    if TRAEFIK_RULE == 'path':
+        prefix = f"{PATH_PREFIX}/{route}"
+        labels[f"{router}.rule"] = f"PathPrefix(`{prefix}`)"
+        labels[f"{router}.middlewares"] = f"{route}-strip"
+        labels[f"traefik.http.middlewares.{route}-strip.stripprefix.prefixes"] = prefix
+    else:
+        # Match the subdomain only, so the labels do not depend on the node's hostname
+        labels[f"{router}.rule"] = f"HostRegexp(`{route}.{{domain:.+}}`)"
+    return labels
+
+
+def build_lab_url(host, port=None, route=None):
+    """URL a user opens for a lab, through the proxy or straight to its published port"""
+    if not uses_proxy():
+        return f"http://{host}:{port}"
+    
+    if TRAEFIK_RULE == 'path':
+        base, path = host, f"{PATH_PREFIX}/{route}/"
+    else:
+        base, path = f"{route}.{host}", '/'
+    if PROXY_PORT:
+        base = f"{base}:{PROXY_PORT}"
+    return f"{PROXY_SCHEME}://{base}{path}"
@@ -0,0 +1,166 @@
+"""
+Lab Status Cache
+In-memory snapshot of each user's lab status, keyed by (user_id, lab_id),
+that the detail page polls. The orchestrator calls instance_changed /
+instances_changed after every lifecycle transition, which also publishes
+the transition to lab event streams; a short TTL covers transitions
+committed by other processes when there is no shared event channel.
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+
+from app.services import lab_events
+
+# Seconds a cached status is served without re-reading the database
+STATUS_CACHE_TTL = float(os.environ.get('LAB_STATUS_CACHE_TTL', 15))
+
+# (user_id, lab_id) -> {'data', 'etag', 'expires'}
+_cache = {}
+# lab slug -> (lab id or None, expires)
+_lab_ids = {}
+_lock = threading.Lock()
+_stats = {'hits': 0, 'misses': 0, 'invalidations': 0}
+# Bumped on every invalidation so a rebuild racing a transition is not cached
+_generation = 0
+
+
+def get_lab_id(slug):
+    """Id of an active lab by slug (None if missing), cached for the TTL"""
+    from app.models.lab import Lab
+    from app import db
+    
+    now = time.monotonic()
+    with _lock:
+        cached = _lab_ids.get(slug)
+        if cached and cached[1] > now:
+            return cached[0]
+    
+    lab_id = db.session.query(Lab.id).filter_by(slug=slug, is_active=True).scalar()
+    with _lock:
+        _lab_ids[slug] = (lab_id, now + STATUS_CACHE_TTL)
+    return lab_id
+
+
+def build_status(user_id, lab_id):
+    """Status payload for the user's latest instance of a lab (database read)"""
+    from app.models.lab_instance import LabInstance
+    
+    # Latest instance tells us where in the lifecycle the user is
+    instance = LabInstance.query.filter_by(
+        user_id=user_id,
+        lab_id=lab_id
+    ).order_by(LabInstance.created_at.desc(), LabInstance.id.desc()).first()
+    
+    if instance and instance.status in LabInstance.ACTIVE_STATUSES + ('stopping',):
+        data = {
+            'running': instance.status == 'running',
+            'status': instance.status,
+            'url': instance.lab_url,
+            'port': instance.port,
+            'expires_at': instance.expires_at.isoformat() if instance.expires_at else None
+        }
+        
+        if instance.status == 'queued':
+            from app.services.lab_capacity import get_queue_position, estimate_wait_seconds
+            
+            position = get_queue_position(instance)
+            data['queue_position'] = position + 1
+            data['estimated_wait_seconds'] = estimate_wait_seconds(position)
+        return data
+    
+    return {
+        'running': False,
+        'status': instance.status if instance else 'stopped'
+    }
+
+
+def compute_etag(data):
+    return hashlib.sha1(json.dumps(data, sort_keys=True).encode()).hexdigest()
+
+
+def get_status(user_id, lab_id):
+    """(status payload, etag) from memory, rebuilt when missing or older than the TTL"""
+    key = (user_id, lab_id)
+    now = time.monotonic()
+    with _lock:
+        entry = _cache.get(key)
+        if entry and entry['expires'] > now:
+            _stats['hits'] += 1
+            return entry['data'], entry['etag']
+        _stats['misses'] += 1
+        generation = _generation
+    
+    data = build_status(user_id, lab_id)
+    etag = compute_etag(data)
+    with _lock:
+        if generation == _generation:
+            _cache[key] = {'data': data, 'etag': etag, 'expires': now + STATUS_CACHE_TTL}
+    return data, etag
+
+
+def invalidate(user_id, lab_id):
+    global _generation
+    
+    with _lock:
+        _generation += 1
+        if _cache.pop((user_id, lab_id), None) is not None:
+            _stats['invalidations'] += 1
+
+
+def invalidate_queued():
+    """Drop queued entries - their queue position moves whenever anyone is admitted"""
+    global _generation
+    
+    with _lock:
+        _generation += 1
+        for key in [key for key, entry in _cache.items() if entry['data']['status'] == 'queued']:
+            del _cache[key]
+            _stats['invalidations'] += 1
+
+
+def instance_changed(instance, reason=None):
+    """Record a lifecycle transition of one instance (call after committing it)"""
+    invalidate(instance.user_id, instance.lab_id)
+    if instance.status != 'queued':
+        invalidate_queued()
+    lab_events.publish([{
+        'user_id': instance.user_id,
+        'lab_id': instance.lab_id,
+        'status': instance.status,
+        'reason': reason
+    }])
+
+
+def instances_changed(instance_ids, reason=None):
+    """Record a batch transition made with a bulk UPDATE (call after committing it)"""
+    from app.models.lab_instance import LabInstance
+    from app import db
+    
+    if not instance_ids:
+        return
+    rows = db.session.query(LabInstance.user_id, LabInstance.lab_id, LabInstance.status).filter(
+        LabInstance.id.in_(list(instance_ids))
+    ).all()
+    for user_id, lab_id, _ in rows:
+        invalidate(user_id, lab_id)
+    invalidate_queued()
+    lab_events.publish([
+        {'user_id': user_id, 'lab_id': lab_id, 'status': status, 'reason': reason}
+        for user_id, lab_id, status in rows
+    ])
+
+
+def clear():
+    with _lock:
+        _cache.clear()
+        _lab_ids.clear()
+
+
+def get_cache_stats():
+    with _lock:
+        stats = dict(_stats)
+        stats['entries'] = len(_cache)
+    return stats
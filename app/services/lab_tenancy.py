@@ -0,0 +1,249 @@
+"""
+Shared Lab Containers
+With LAB_TENANCY_MODE=shared, labs marked multi_tenant in LAB_IMAGES run
+as one long-lived container per lab instead of one per user. Every start
+becomes a tenant of that container: a LabInstance with a tenant key and
+no container of its own, opened through a signed ?tenant= link. The lab
+keeps each tenant's state apart (labs/common/tenancy.py) and shows each
+user a flag derived from their id, so starting, stopping and resetting
+a shared lab never touches Docker and never waits for capacity.
+"""
+import hashlib
+import hmac
+import os
+import secrets
+import threading
+from datetime import datetime, timedelta
+
+import docker
+from flask import current_app
+from itsdangerous import URLSafeSerializer
+
+from app.services import lab_nodes, lab_routing, lab_status
+
+# 'dedicated' (a container per user) or 'shared' (a container per lab for multi_tenant labs)
+TENANCY_MODE = os.environ.get('LAB_TENANCY_MODE', 'dedicated')
+
+# Resource limits of a shared lab container, which serves every tenant
+SHARED_MEM_LIMIT = os.environ.get('LAB_SHARED_MEM_LIMIT', '1g')
+SHARED_CPU_LIMIT = float(os.environ.get('LAB_SHARED_CPU_LIMIT', 1.0))
+SHARED_PIDS_LIMIT = int(os.environ.get('LAB_SHARED_PIDS_LIMIT', 512))
+
+# Seconds a shared lab keeps an idle tenant's state
+TENANT_IDLE_TTL = int(os.environ.get('LAB_TENANT_IDLE_TTL', 7200))
+
+_shared_locks = {}
+_shared_locks_lock = threading.Lock()
+
+
+def is_shared(lab_slug):
+    """Whether starts of this lab join its shared container"""
+    from app.services.lab_orchestrator import LAB_IMAGES
+    
+    return TENANCY_MODE == 'shared' and LAB_IMAGES.get(lab_slug, {}).get('multi_tenant', False)
+
+
+def get_tenant_secret():
+    """Secret shared with lab containers for tenant tokens and flags"""
+    secret = os.environ.get('LAB_TENANT_SECRET')
+    if secret:
+        return secret
+    return hmac.new(current_app.config['SECRET_KEY'].encode(), b'webnox-lab-tenant', hashlib.sha256).hexdigest()
+
+
+def new_tenant_key(user_id):
+    return f"{user_id}.{secrets.token_hex(8)}"
+
+
+def make_token(lab_slug, tenant, user_id):
+    """Signed token a shared lab accepts for a tenant (see labs/common/tenancy.py)"""
+    serializer = URLSafeSerializer(get_tenant_secret(), salt=f'webnox-lab-tenant:{lab_slug}')
+    return serializer.dumps({'t': tenant, 'u': user_id})
+
+
+def tenant_flag(base_flag, lab_slug, user_id):
+    """The flag a shared lab shows this user"""
+    digest = hmac.new(
+        get_tenant_secret().encode(),
+        f'{lab_slug}:{user_id}'.encode(),
+        hashlib.sha256
+    ).hexdigest()[:10]
+    inner = base_flag[5:-1] if base_flag.startswith('FLAG{') and base_flag.endswith('}') else base_flag
+    return f'FLAG{{{inner}_{digest}}}'
+
+
+def shared_container_name(lab_slug):
+    return f"webnox-shared-{lab_slug}"
+
+
+def _shared_lock(lab_slug):
+    with _shared_locks_lock:
+        return _shared_locks.setdefault(lab_slug, threading.Lock())
+
+
+def _get_shared_container(client, lab_slug):
+    containers = client.containers.list(filters={
+        'label': ['webnox.shared=true', f'webnox.lab_slug={lab_slug}']
+    })
+    return containers[0] if containers else None
+
+
+def _container_port(container, internal_port):
+    bindings = (container.attrs.get('NetworkSettings', {}).get('Ports') or {}).get(f"{internal_port}/tcp") or []
+    return int(bindings[0]['HostPort']) if bindings else None
+
+
+def ensure_shared_container(lab_slug):
+    """
+    Find or boot the shared container of a lab on the default node.
+    Returns (base lab URL, message); the URL is None on failure.
+    """
+    from app.services.lab_orchestrator import (
+        LAB_IMAGES, build_lab_image, get_available_port, release_port,
+        get_docker_client, report_docker_error, run_lab_container
+    )
+    
+    lab_config = LAB_IMAGES[lab_slug]
+    node = lab_nodes.get_default_node()
+    client = get_docker_client()
+    if not node or not client:
+        return None, "Docker is not available"
+    
+    name = shared_container_name(lab_slug)
+    with _shared_lock(lab_slug):
+        try:
+            container = _get_shared_container(client, lab_slug)
+            if container:
+                host_port = _container_port(container, lab_config['internal_port'])
+                return lab_routing.build_lab_url(node.host, host_port, name), "Shared lab running"
+            
+            success, message = build_lab_image(lab_slug)
+            if not success and "exists" not in message.lower():
+                return None, f"Failed to build lab image: {message}"
+            
+            # Clear a stopped leftover holding the name
+            try:
+                client.containers.get(name).remove(force=True)
+            except docker.errors.NotFound:
+                pass
+            
+            host_port = None if lab_routing.uses_proxy() else get_available_port()
+            try:
+                run_lab_container(
+                    client,
+                    lab_config,
+                    name,
+                    host_port,
+                    environment={
+                        'LAB_TENANT_SECRET': get_tenant_secret(),
+                        'LAB_SLUG': lab_slug,
+                        'LAB_TENANT_IDLE_TTL': str(TENANT_IDLE_TTL)
+                    },
+                    labels={'webnox.shared': 'true', 'webnox.lab_slug': lab_slug},
+                    resources={'memory': SHARED_MEM_LIMIT, 'cpu': SHARED_CPU_LIMIT, 'pids': SHARED_PIDS_LIMIT}
+                )
+            except Exception:
+                if host_port is not None:
+                    release_port(host_port)
+                raise
+        except Exception as e:
+            report_docker_error(e)
+            return None, str(e)
+    
+    base_url = lab_routing.build_lab_url(node.host, host_port, name)
+    _repoint_tenants(lab_slug, base_url)
+    return base_url, "Shared lab started"
+
+
+def _tenant_url(base_url, lab_slug, tenant, user_id):
+    return f"{base_url}?tenant={make_token(lab_slug, tenant, user_id)}"
+
+
+def _repoint_tenants(lab_slug, base_url):
+    """Running tenants of a recreated shared container get links to its new address"""
+    from app.models.lab import Lab
+    from app.models.lab_instance import LabInstance
+    from app import db
+    
+    rows = db.session.query(LabInstance.id, LabInstance.user_id, LabInstance.tenant).join(
+        Lab, Lab.id == LabInstance.lab_id
+    ).filter(
+        Lab.slug == lab_slug,
+        LabInstance.tenant != None,
+        LabInstance.status == 'running'
+    ).all()
+    if not rows:
+        return
+    db.session.execute(db.update(LabInstance), [
+        {'id': row.id, 'lab_url': _tenant_url(base_url, lab_slug, row.tenant, row.user_id)}
+        for row in rows
+    ])
+    db.session.commit()
+    lab_status.instances_changed([row.id for row in rows])
+
+
+def launch_shared_instance(instance, lab_slug):
+    """Mark a tenant instance running in its lab's shared container"""
+    from app import db
+    
+    base_url, message = ensure_shared_container(lab_slug)
+    if not base_url:
+        instance.status = 'error'
+        instance.stopped_at = datetime.utcnow()
+        db.session.commit()
+        lab_status.instance_changed(instance)
+        return None, message
+    
+    instance.node = lab_nodes.get_default_node().name
+    instance.port = 0
+    instance.lab_url = _tenant_url(base_url, lab_slug, instance.tenant, instance.user_id)
+    instance.status = 'running'
+    instance.started_at = datetime.utcnow()
+    instance.last_active_at = instance.started_at
+    instance.expires_at = datetime.utcnow() + timedelta(hours=2)
+    db.session.commit()
+    lab_status.instance_changed(instance)
+    return instance, "Lab started successfully"
+
+
+def reset_shared_instance(instance):
+    """
+    Give a tenant a clean slate by switching it to a new tenant key; the
+    old key's state is dropped by the lab once it has been idle for
+    TENANT_IDLE_TTL.
+    """
+    from app.models.lab_instance import LabInstance
+    from app import db
+    
+    lab_slug = instance.lab.slug
+    old_tenant = instance.tenant
+    tenant = new_tenant_key(instance.user_id)
+    base_url = instance.lab_url.split('?tenant=')[0]
+    
+    result = db.session.execute(
+        db.update(LabInstance)
+        .where(LabInstance.id == instance.id, LabInstance.tenant == old_tenant, LabInstance.status == 'running')
+        .values(
+            tenant=tenant,
+            lab_url=_tenant_url(base_url, lab_slug, tenant, instance.user_id),
+            last_active_at=datetime.utcnow()
+        )
+    )
+    db.session.commit()
+    if result.rowcount != 1:
+        return None, "Lab was stopped while resetting"
+    
+    db.session.refresh(instance)
+    lab_status.instance_changed(instance, reason='reset')
+    return instance, "Lab reset"
+
+
+def get_shared_stats():
+    from app.models.lab_instance import LabInstance
+    from app import db
+    
+    tenants = db.session.query(db.func.count(LabInstance.id)).filter(
+        LabInstance.tenant != None,
+        LabInstance.status == 'running'
+    ).scalar()
+    return {'mode': TENANCY_MODE, 'running_tenants': tenants}
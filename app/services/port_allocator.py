@@ -0,0 +1,177 @@
+"""
+Port Allocator
+Hands out host ports for lab containers from the lab_ports table, so
+allocations survive restarts and are shared by every app process. The
+range is shared by all lab nodes, so a port is unique across hosts.
+"""
+import os
+import random
+from datetime import datetime, timedelta
+
+# Port range for lab instances (end is exclusive)
+PORT_RANGE_START = int(os.environ.get('LAB_PORT_START', 10000))
+PORT_RANGE_END = int(os.environ.get('LAB_PORT_END', 20000))
+
+# Attempts before giving up when other processes keep winning the same port
+MAX_ALLOCATION_ATTEMPTS = 10
+
+# Allocations younger than this are never reclaimed - the container may still be booting
+RECONCILE_GRACE_PERIOD = timedelta(minutes=5)
+
+
+def allocate_port():
+    """
+    Atomically claim a free port.
+    Starts at a random point in the range so concurrent callers rarely collide,
+    and uses a conditional UPDATE so only one process can win a given port.
+    """
+    from app.models.lab_port import LabPort
+    from app import db
+    
+    for _ in range(MAX_ALLOCATION_ATTEMPTS):
+        pivot = random.randrange(PORT_RANGE_START, PORT_RANGE_END)
+        port = _find_free_port(pivot)
+        if port is None:
+            raise Exception("No available ports")
+        
+        result = db.session.execute(
+            db.update(LabPort)
+            .where(LabPort.port == port, LabPort.is_allocated == False)
+            .values(is_allocated=True, allocated_at=datetime.utcnow())
+        )
+        db.session.commit()
+        
+        if result.rowcount == 1:
+            return port
+    
+    raise Exception("No available ports (allocation contention)")
+
+
+def _find_free_port(pivot):
+    from app.models.lab_port import LabPort
+    from app import db
+    
+    free = db.session.query(LabPort.port).filter(
+        LabPort.is_allocated == False,
+        LabPort.port >= PORT_RANGE_START,
+        LabPort.port < PORT_RANGE_END
+    )
+    
+    port = free.filter(LabPort.port >= pivot).order_by(LabPort.port).limit(1).scalar()
+    if port is None:
+        port = free.filter(LabPort.port < pivot).order_by(LabPort.port).limit(1).scalar()
+    return port
+
+
+def release_port(port):
+    """Return a port to the free pool (committed with the caller's transaction)"""
+    from app.models.lab_port import LabPort
+    from app import db
+    
+    db.session.execute(
+        db.update(LabPort)
+        .where(LabPort.port == port)
+        .values(is_allocated=False, allocated_at=None)
+    )
+
+
+def ensure_port_rows():
+    """Create missing rows for the configured range and drop free rows outside it"""
+    from app.models.lab_port import LabPort
+    from app import db
+    
+    existing = {p for (p,) in db.session.query(LabPort.port).filter(
+        LabPort.port >= PORT_RANGE_START,
+        LabPort.port < PORT_RANGE_END
+    )}
+    missing = [
+        {'port': port, 'is_allocated': False}
+        for port in range(PORT_RANGE_START, PORT_RANGE_END)
+        if port not in existing
+    ]
+    if missing:
+        db.session.execute(db.insert(LabPort), missing)
+    
+    db.session.execute(
+        db.delete(LabPort).where(
+            LabPort.is_allocated == False,
+            db.or_(LabPort.port < PORT_RANGE_START, LabPort.port >= PORT_RANGE_END)
+        )
+    )
+    db.session.commit()
+    return len(missing)
+
+
+def get_container_ports(client):
+    """Host ports published by every webnox lab container on the daemon"""
+    ports = set()
+    for container in client.containers.list(all=True, filters={'label': 'webnox.lab=true'}):
+        for bindings in (container.ports or {}).values():
+            for binding in bindings or []:
+                if binding.get('HostPort'):
+                    ports.add(int(binding['HostPort']))
+    return ports
+
+
+def reconcile_ports(clients):
+    """
+    Bring lab_ports in line with reality after a restart: ports used by
+    webnox.lab containers on any node or by active instances are marked
+    allocated, and stale allocations nobody owns are freed.
+    """
+    from app.models.lab_instance import LabInstance
+    from app.models.lab_port import LabPort
+    from app import db
+    
+    in_use = {p for (p,) in db.session.query(LabInstance.port).filter(
+        LabInstance.status.in_(LabInstance.ACTIVE_STATUSES + ('stopping',)),
+        LabInstance.port > 0
+    )}
+    for client in clients:
+        in_use |= get_container_ports(client)
+    
+    now = datetime.utcnow()
+    if in_use:
+        db.session.execute(
+            db.update(LabPort)
+            .where(LabPort.port.in_(in_use), LabPort.is_allocated == False)
+            .values(is_allocated=True, allocated_at=now)
+        )
+    
+    freed = db.session.execute(
+        db.update(LabPort)
+        .where(
+            LabPort.is_allocated == True,
+            LabPort.port.notin_(in_use),
+            db.or_(LabPort.allocated_at == None, LabPort.allocated_at < now - RECONCILE_GRACE_PERIOD)
+        )
+        .values(is_allocated=False, allocated_at=None)
+    ).rowcount
+    db.session.commit()
+    return freed
+
+
+def get_port_stats():
+    """Allocated/free port counts for the configured range"""
+    from app.models.lab_port import LabPort
+    from app import db
+    
+    allocated = db.session.query(db.func.count(LabPort.port)).filter(
+        LabPort.is_allocated == True,
+        LabPort.port >= PORT_RANGE_START,
+        LabPort.port < PORT_RANGE_END
+    ).scalar()
+    total = PORT_RANGE_END - PORT_RANGE_START
+    return {'allocated': allocated, 'free': total - allocated, 'total': total}
+
+
+def init_app(app):
+    """Seed the port table and reconcile it against running containers"""
+    from app.services.lab_nodes import get_nodes
+    
+    with app.app_context():
+        ensure_port_rows()
+        if app.config.get('LAB_BACKGROUND_TASKS'):
+            clients = [client for client in (node.get_client() for node in get_nodes()) if client]
+            if clients:
+                reconcile_ports(clients)
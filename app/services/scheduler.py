@@ -0,0 +1,85 @@
+"""
+Background Scheduler
+Runs registered periodic tasks inside the app context, one daemon
+thread per task so a slow task never delays the others.
+"""
+import threading
+import time
+
+# name -> task state
+_tasks = {}
+_tasks_lock = threading.Lock()
+_app = None
+
+
+def add_task(name, interval, func):
+    """Register func to run every interval seconds (started with the scheduler)"""
+    with _tasks_lock:
+        if name in _tasks:
+            return _tasks[name]
+        
+        task = {
+            'name': name,
+            'interval': interval,
+            'func': func,
+            'runs': 0,
+            'failures': 0,
+            'last_run': None,
+            'last_duration': None,
+            'thread': None
+        }
+        _tasks[name] = task
+        
+        if _app is not None:
+            _start_task(task)
+        return task
+
+
+def _start_task(task):
+    task['thread'] = threading.Thread(
+        target=_run_task,
+        args=(_app, task),
+        name=f"webnox-task-{task['name']}",
+        daemon=True
+    )
+    task['thread'].start()
+
+
+def _run_task(app, task):
+    while True:
+        time.sleep(task['interval'])
+        started = time.monotonic()
+        with app.app_context():
+            try:
+                task['func']()
+            except Exception as e:
+                task['failures'] += 1
+                print(f"Scheduled task {task['name']} failed: {e}")
+        task['runs'] += 1
+        task['last_run'] = time.time()
+        task['last_duration'] = time.monotonic() - started
+
+
+def get_task_stats():
+    with _tasks_lock:
+        return {
+            name: {key: value for key, value in task.items() if key not in ('func', 'thread')}
+            for name, task in _tasks.items()
+        }
+
+
+def start(app):
+    """Start every registered task"""
+    global _app
+    
+    with _tasks_lock:
+        if _app is not None:
+            return
+        _app = app
+        for task in _tasks.values():
+            _start_task(task)
+
+
+def init_app(app):
+    if app.config.get('LAB_BACKGROUND_TASKS'):
+        start(app)
@@ -0,0 +1,282 @@
+"""
+Schema Migrations
+db.create_all() creates missing tables but never changes existing ones, so
+databases created by older releases lack later columns and indexes.
+Numbered migrations bring them in line with the models: each runs once,
+in order, and is recorded in schema_migrations. create_app applies the
+pending ones after create_all; every migration is idempotent, so a fresh
+database (already complete) simply records them.
+
+`flask db-upgrade` applies pending migrations, `flask db-migrations` lists
+them and `flask check-query-plans` fails when a hot query would scan a
+whole table instead of using an index.
+"""
+import sys
+from datetime import datetime, timedelta
+
+# Tables whose hot lookups must be served by an index
+HOT_TABLES = ('user_progress', 'lab_submissions', 'lab_instances', 'user_scores')
+
+
+def _add_columns(*names):
+    """
+    Migration adding the named 'table.column' model columns with ALTER TABLE
+    ADD COLUMN, skipping tables that don't exist yet (create_all makes them
+    whole) and columns already present.
+    """
+    def add_columns():
+        from app import db
+        
+        connection = db.session.connection()
+        inspector = db.inspect(connection)
+        ddl = connection.dialect.ddl_compiler(connection.dialect, None)
+        existing_tables = set(inspector.get_table_names())
+        
+        added = []
+        for name in names:
+            table_name, column_name = name.split('.')
+            if table_name not in existing_tables:
+                continue
+            if column_name in {column['name'] for column in inspector.get_columns(table_name)}:
+                continue
+            table = db.metadata.tables[table_name]
+            column = table.c[column_name]
+            if not column.nullable and column.server_default is None:
+                raise RuntimeError(f"{name} is NOT NULL without a server default")
+            connection.exec_driver_sql(
+                f"ALTER TABLE {ddl.preparer.format_table(table)} ADD COLUMN {ddl.get_column_specification(column)}"
+            )
+            added.append(name)
+        
+        if 'labs.completions' in added:
+            from app.services.lab_completions import recount_completions
+            
+            recount_completions()
+        return added
+    return add_columns
+
+
+def _delete_duplicates(table, keys, preference, where):
+    """Delete all but the preferred row (then lowest id) of each key, returns the count"""
+    from app import db
+    
+    rank = db.func.row_number().over(
+        partition_by=[table.c[key] for key in keys],
+        order_by=[preference, table.c.id]
+    )
+    ranked = db.select(table.c.id, rank.label('rank')).where(where).subquery()
+    duplicates = db.select(ranked.c.id).where(ranked.c.rank > 1)
+    return db.session.execute(db.delete(table).where(table.c.id.in_(duplicates))).rowcount
+
+
+def _delete_duplicate_rows():
+    """Rows the unique indexes forbid, left by concurrent get-or-create requests"""
+    from app.models.lab import LabSubmission
+    from app.models.progress import UserProgress
+    from app import db
+    
+    submissions = LabSubmission.__table__
+    progress = UserProgress.__table__
+    correct_first = db.case((submissions.c.is_correct == True, 0), else_=1)
+    completed_first = db.case((progress.c.status == 'completed', 0), else_=1)
+    
+    deleted = {
+        'lab_submissions': _delete_duplicates(
+            submissions, ('user_id', 'lab_id'), correct_first, submissions.c.lab_id.isnot(None)
+        ),
+        'user_progress (lesson)': _delete_duplicates(
+            progress, ('user_id', 'lesson_id'), completed_first, progress.c.lesson_id.isnot(None)
+        ),
+        'user_progress (lab)': _delete_duplicates(
+            progress, ('user_id', 'lab_id'), completed_first, progress.c.lab_id.isnot(None)
+        ),
+        'user_progress (course)': _delete_duplicates(
+            progress, ('user_id', 'course_id'), completed_first, progress.c.progress_type == 'course'
+        )
+    }
+    return {rows: count for rows, count in deleted.items() if count}
+
+
+def _create_indexes():
+    """Create the indexes declared on the models that the tables lack"""
+    from app import db
+    
+    connection = db.session.connection()
+    inspector = db.inspect(connection)
+    existing_tables = set(inspector.get_table_names())
+    
+    created = []
+    for table in db.metadata.sorted_tables:
+        if table.name not in existing_tables:
+            continue
+        indexes = {index['name'] for index in inspector.get_indexes(table.name)}
+        for index in sorted(table.indexes, key=lambda index: index.name):
+            if index.name not in indexes:
+                index.create(connection)
+                created.append(index.name)
+    return created
+
+
+# (version, name, func) - append only, never renumber; a new column gets a
+# new migration naming it, so each version is one fixed schema change
+MIGRATIONS = [
+    (1, 'Add lab_instances.last_active_at, node, tenant and labs.completions', _add_columns(
+        'lab_instances.last_active_at',
+        'lab_instances.node',
+        'lab_instances.tenant',
+        'labs.completions'
+    )),
+    (2, 'Delete duplicate progress and submission rows', _delete_duplicate_rows),
+    (3, 'Create the lookup indexes and unique constraints', _create_indexes),
+    (4, 'Add lab_instances.updated_at', _add_columns('lab_instances.updated_at')),
+]
+
+
+def get_applied():
+    """version -> SchemaMigration for the migrations already applied"""
+    from app.models.schema_migration import SchemaMigration
+    
+    return {migration.version: migration for migration in SchemaMigration.query.all()}
+
+
+def upgrade():
+    """Apply pending migrations in order, each in its own transaction; returns their versions"""
+    from sqlalchemy.exc import IntegrityError
+    from app.models.schema_migration import SchemaMigration
+    from app import db
+    
+    applied = get_applied()
+    done = []
+    for version, name, func in MIGRATIONS:
+        if version in applied:
+            continue
+        try:
+            result = func()
+            db.session.add(SchemaMigration(version=version, name=name))
+            db.session.commit()
+        except IntegrityError:
+            # Another process starting at the same time recorded it first
+            db.session.rollback()
+            continue
+        except Exception:
+            db.session.rollback()
+            raise
+        
+        if result:
+            print(f"Schema migration {version} ({name}): {result}")
+        done.append(version)
+    return done
+
+
+def _hot_queries():
+    """(name, statement) for the lookups behind most requests, with sample parameters"""
+    from app.models.lab import LabSubmission
+    from app.models.lab_instance import LabInstance
+    from app.models.progress import UserProgress, UserScore
+    from app import db
+    
+    now = datetime.utcnow()
+    queries = [
+        ('lesson progress', UserProgress.query.filter_by(user_id=1, lesson_id=1, progress_type='lesson')),
+        ('lab progress', UserProgress.query.filter_by(user_id=1, lab_id=1, progress_type='lab')),
+        ('course progress', UserProgress.query.filter_by(user_id=1, course_id=1, progress_type='course')),
+        ('completed lessons', db.session.query(db.func.count(UserProgress.id)).filter_by(
+            user_id=1, course_id=1, progress_type='lesson', status='completed'
+        )),
+        ('recent progress', UserProgress.query.filter_by(user_id=1).order_by(UserProgress.started_at.desc()).limit(5)),
+        ('lab submission', LabSubmission.query.filter_by(user_id=1, lab_id=1)),
+        ('correct submission', LabSubmission.query.filter_by(user_id=1, lab_id=1, is_correct=True)),
+        ('solved labs', db.session.query(LabSubmission.lab_id).filter_by(user_id=1, is_correct=True)),
+        ('lab solvers', db.session.query(db.func.count(db.distinct(LabSubmission.user_id))).filter_by(
+            lab_id=1, is_correct=True
+        )),
+        ('active instance', LabInstance.query.filter(
+            LabInstance.user_id == 1,
+            LabInstance.lab_id == 1,
+            LabInstance.status.in_(LabInstance.ACTIVE_STATUSES)
+        )),
+        ('running instances', LabInstance.query.filter_by(user_id=1, status='running')),
+        ('expired instances', LabInstance.query.filter(
+            LabInstance.status == 'running',
+            LabInstance.expires_at < now
+        )),
+        ('instance by container', LabInstance.query.filter_by(container_id='0' * 64)),
+        ('recent scores', UserScore.query.filter_by(user_id=1).order_by(UserScore.earned_at.desc()).limit(10)),
+        ('scores since', UserScore.query.filter(
+            UserScore.user_id == 1,
+            UserScore.earned_at >= now - timedelta(days=7)
+        )),
+    ]
+    return [(name, getattr(query, 'statement', query)) for name, query in queries]
+
+
+def _explain(connection, statement):
+    """The query plan as lines of text"""
+    compiled = statement.compile(connection, compile_kwargs={'render_postcompile': True})
+    if compiled.positional:
+        params = tuple(compiled.params[name] for name in compiled.positiontup)
+    else:
+        params = compiled.params
+    
+    if connection.dialect.name == 'sqlite':
+        rows = connection.exec_driver_sql(f"EXPLAIN QUERY PLAN {compiled}", params)
+        return [row[-1] for row in rows]
+    
+    # Tables are too small for the planner to prefer an index unless scans are ruled out
+    connection.exec_driver_sql("SET LOCAL enable_seqscan = off")
+    rows = connection.exec_driver_sql(f"EXPLAIN {compiled}", params)
+    return [row[0] for row in rows]
+
+
+def _is_full_scan(line):
+    words = line.replace('Seq Scan on', 'SCAN').split()
+    if len(words) < 2 or words[0] != 'SCAN' or words[1] not in HOT_TABLES:
+        return False
+    return 'USING' not in words  # SQLite walking a whole index reads 'SCAN t USING INDEX ...'
+
+
+def check_query_plans():
+    """(name, plan lines, full scan lines) for each hot query"""
+    from app import db
+    
+    connection = db.session.connection()
+    results = []
+    try:
+        for name, statement in _hot_queries():
+            plan = _explain(connection, statement)
+            results.append((name, plan, [line for line in plan if _is_full_scan(line)]))
+    finally:
+        db.session.rollback()
+    return results
+
+
+def init_app(app):
+    """Register the CLI commands"""
+    
+    @app.cli.command('db-upgrade')
+    def db_upgrade_command():
+        """Apply pending schema migrations."""
+        done = upgrade()
+        print(f"Applied {len(done)} schema migrations" if done else "Schema is up to date")
+    
+    @app.cli.command('db-migrations')
+    def db_migrations_command():
+        """List schema migrations and when they were applied."""
+        applied = get_applied()
+        for version, name, _ in MIGRATIONS:
+            migration = applied.get(version)
+            status = f"applied {migration.applied_at:%Y-%m-%d %H:%M}" if migration else 'pending'
+            print(f"{version:>3} {name}: {status}")
+    
+    @app.cli.command('check-query-plans')
+    def check_query_plans_command():
+        """Fail if a hot query scans a whole table instead of using an index."""
+        results = check_query_plans()
+        for name, plan, scans in results:
+            print(f"{'FULL SCAN' if scans else 'ok':>9}  {name}: {'; '.join(plan)}")
+        
+        failed = [name for name, _, scans in results if scans]
+        if failed:
+            print(f"{len(failed)} of {len(results)} hot queries scan a whole table")
+            sys.exit(1)
+        print(f"All {len(results)} hot queries use an index")
@@ -0,0 +1,103 @@
+"""
+Score Ledger
+user_scores is an append-only ledger of awards and users.total_score its
+running sum. An award inserts its ledger row and adds its points to the
+total in the caller's transaction, so scoring costs the same however many
+awards a user already has and commits with the rest of the request.
+
+A periodic verifier recomputes every total from the ledger in one grouped
+query and rewrites the ones that drifted (e.g. rows edited by hand).
+`flask rebuild-user-scores` runs it on demand.
+"""
+import os
+
+from app.services import scheduler
+
+# Seconds between ledger verifications (0 disables the verifier)
+VERIFY_INTERVAL = int(os.environ.get('SCORE_VERIFY_INTERVAL', 3600))
+
+
+def award(user_id, source_type, source_id, points, description=None):
+    """Append an award and bump the user's total; committed with the caller's transaction"""
+    from app.models.progress import UserScore
+    from app.models.user import User
+    from app import db
+    
+    score = UserScore(
+        user_id=user_id,
+        source_type=source_type,
+        source_id=source_id,
+        points=points,
+        description=description
+    )
+    db.session.add(score)
+    
+    # Added in SQL so concurrent awards never overwrite each other
+    db.session.execute(
+        db.update(User).where(User.id == user_id).values(
+            total_score=db.func.coalesce(User.total_score, 0) + points
+        )
+    )
+    return score
+
+
+def sum_scores():
+    """user id -> sum of the user's ledger rows"""
+    from app.models.progress import UserScore
+    from app import db
+    
+    return dict(
+        db.session.query(UserScore.user_id, db.func.sum(UserScore.points))
+        .group_by(UserScore.user_id)
+    )
+
+
+def rebuild_totals():
+    """
+    Recompute totals from the ledger and rewrite the drifted ones in one UPDATE.
+    Returns {user_id: (stored, actual)} for the users that had drifted.
+    """
+    from app.models.progress import UserScore
+    from app.models.user import User
+    from app import db
+    
+    actual = sum_scores()
+    drifted = {
+        user_id: (total_score, actual.get(user_id, 0))
+        for user_id, total_score in db.session.query(User.id, User.total_score)
+        if total_score != actual.get(user_id, 0)
+    }
+    if not drifted:
+        return drifted
+    
+    # Summed in the UPDATE itself so awards made meanwhile are not lost
+    ledger_sum = db.select(db.func.coalesce(db.func.sum(UserScore.points), 0)).where(
+        UserScore.user_id == User.id
+    ).scalar_subquery()
+    db.session.execute(
+        db.update(User).where(User.id.in_(list(drifted))).values(total_score=ledger_sum)
+    )
+    db.session.commit()
+    return drifted
+
+
+def verify_totals():
+    """Scheduled task: repair and report drifted totals"""
+    drifted = rebuild_totals()
+    if drifted:
+        print(f"Score ledger: rebuilt {len(drifted)} drifted user totals")
+
+
+def init_app(app):
+    """Register the CLI command and the verifier"""
+    
+    @app.cli.command('rebuild-user-scores')
+    def rebuild_user_scores_command():
+        """Recompute users' total scores from the score ledger."""
+        drifted = rebuild_totals()
+        for user_id, (stored, actual) in sorted(drifted.items()):
+            print(f"User {user_id}: {stored} -> {actual}")
+        print(f"Rebuilt user scores ({len(drifted)} users corrected)")
+    
+    if VERIFY_INTERVAL > 0:
+        scheduler.add_task('score-ledger-verify', VERIFY_INTERVAL, verify_totals)
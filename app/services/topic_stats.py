@@ -0,0 +1,41 @@
+"""
+Topic Statistics
+Course, lab and point totals per topic, computed for any number of
+topics with one grouped query over courses and one over labs instead of
+loading every related row per topic.
+"""
+
+
+def empty_stats():
+    return {'total_courses': 0, 'total_labs': 0, 'total_points': 0}
+
+
+def get_topic_stats(topic_ids=None):
+    """topic id -> {'total_courses', 'total_labs', 'total_points'} (published courses, active labs)"""
+    from app.models.course import Course
+    from app.models.lab import Lab
+    from app import db
+    
+    if topic_ids is not None:
+        topic_ids = list(topic_ids)
+        if not topic_ids:
+            return {}
+    
+    stats = {topic_id: empty_stats() for topic_id in topic_ids or ()}
+    for model, visible, key in (
+        (Course, Course.is_published == True, 'total_courses'),
+        (Lab, Lab.is_active == True, 'total_labs')
+    ):
+        query = db.session.query(
+            model.topic_id,
+            db.func.count(model.id),
+            db.func.coalesce(db.func.sum(model.points), 0)
+        ).filter(visible, model.topic_id != None)
+        if topic_ids is not None:
+            query = query.filter(model.topic_id.in_(topic_ids))
+        
+        for topic_id, count, points in query.group_by(model.topic_id):
+            topic_stats = stats.setdefault(topic_id, empty_stats())
+            topic_stats[key] = count
+            topic_stats['total_points'] += points
+    return stats
@@ -0,0 +1,139 @@
+"""
+User Progress
+How far a user is through the catalog, from grouped joins against their
+correct lab submissions and completed courses: per-topic lab progress,
+overall totals and the set of solved labs each take a single query,
+whatever the number of topics and labs.
+"""
+
+
+def percentage(completed, total):
+    return int(completed / total * 100) if total > 0 else 0
+
+
+def get_completed_lab_ids(user_id, lab_ids=None):
+    """Ids of the labs the user has solved (restricted to lab_ids if given)"""
+    from app.models.lab import LabSubmission
+    from app import db
+    
+    query = db.session.query(LabSubmission.lab_id).filter(
+        LabSubmission.user_id == user_id,
+        LabSubmission.is_correct == True
+    )
+    if lab_ids is not None:
+        lab_ids = list(lab_ids)
+        if not lab_ids:
+            return set()
+        query = query.filter(LabSubmission.lab_id.in_(lab_ids))
+    return {lab_id for (lab_id,) in query.distinct()}
+
+
+def _lab_progress_query(user_id):
+    """(topic id, active labs, labs the user solved) rows, grouped by topic"""
+    from app.models.lab import Lab, LabSubmission
+    from app import db
+    
+    solved = db.and_(
+        LabSubmission.lab_id == Lab.id,
+        LabSubmission.user_id == user_id,
+        LabSubmission.is_correct == True
+    )
+    return db.session.query(
+        Lab.topic_id,
+        db.func.count(db.distinct(Lab.id)),
+        db.func.count(db.distinct(LabSubmission.lab_id))
+    ).outerjoin(LabSubmission, solved).filter(Lab.is_active == True).group_by(Lab.topic_id)
+
+
+def get_topic_progress(user_id, topic_ids=None):
+    """topic id -> {'completed', 'total', 'percentage'} of active labs, in one query"""
+    from app.models.lab import Lab
+    
+    query = _lab_progress_query(user_id)
+    if topic_ids is not None:
+        topic_ids = list(topic_ids)
+        if not topic_ids:
+            return {}
+        query = query.filter(Lab.topic_id.in_(topic_ids))
+    
+    progress = {
+        topic_id: {'completed': 0, 'total': 0, 'percentage': 0}
+        for topic_id in topic_ids or ()
+    }
+    for topic_id, total, completed in query:
+        progress[topic_id] = {
+            'completed': completed,
+            'total': total,
+            'percentage': percentage(completed, total)
+        }
+    return progress
+
+
+def get_user_progress(user_id):
+    """Completed and total labs (active) and courses (published), and percentages"""
+    from app.models.course import Course
+    from app.models.progress import UserProgress
+    from app import db
+    
+    topics = _lab_progress_query(user_id).all()
+    total_labs = sum(total for _, total, _ in topics)
+    completed_labs = sum(completed for _, _, completed in topics)
+    
+    finished = db.and_(
+        UserProgress.course_id == Course.id,
+        UserProgress.user_id == user_id,
+        UserProgress.progress_type == 'course',
+        UserProgress.status == 'completed'
+    )
+    total_courses, completed_courses = db.session.query(
+        db.func.count(db.distinct(Course.id)),
+        db.func.count(db.distinct(UserProgress.course_id))
+    ).outerjoin(UserProgress, finished).filter(Course.is_published == True).one()
+    
+    return {
+        'completed_labs': completed_labs,
+        'total_labs': total_labs,
+        'lab_progress': percentage(completed_labs, total_labs),
+        'completed_courses': completed_courses,
+        'total_courses': total_courses,
+        'course_progress': percentage(completed_courses, total_courses)
+    }
+
+
+def start_progress(user_id, progress_type, course_id=None, lesson_id=None, lab_id=None):
+    """
+    The user's progress row for a course, lesson or lab, created in_progress
+    if missing. Returns (progress, created). Rows are unique per user and
+    item, so when a concurrent request creates it first that row is returned.
+    """
+    from sqlalchemy.exc import IntegrityError
+    from app.models.progress import UserProgress
+    from app import db
+    
+    if lesson_id is not None:
+        key = {'lesson_id': lesson_id}
+    elif lab_id is not None:
+        key = {'lab_id': lab_id}
+    else:
+        key = {'course_id': course_id}
+    query = UserProgress.query.filter_by(user_id=user_id, progress_type=progress_type, **key)
+    
+    progress = query.first()
+    if progress:
+        return progress, False
+    
+    progress = UserProgress(
+        user_id=user_id,
+        course_id=course_id,
+        lesson_id=lesson_id,
+        lab_id=lab_id,
+        progress_type=progress_type,
+        status='in_progress'
+    )
+    db.session.add(progress)
+    try:
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        return query.first(), False
+    return progress, True
@@ -0,0 +1,286 @@
+"""
+Warm Container Pool
+Keeps idle, already-booted lab containers ready to be handed out on start.
+
+Each web process owns the pool containers it booted (webnox.pool_owner)
+and only hands out its own. At startup a process removes pool containers
+whose owner is gone - its own previous incarnation or a dead process on
+the same host - and leaves live workers' pools alone.
+"""
+import atexit
+import docker
+import os
+import random
+import socket
+import string
+import threading
+import uuid
+
+from app import db
+from app.services import lab_metrics, lab_routing
+from app.services.lab_orchestrator import (
+    LAB_IMAGES,
+    get_docker_client,
+    build_lab_image,
+    get_available_port,
+    release_port,
+    run_lab_container
+)
+from app.services.lab_resources import get_profile
+
+# Idle containers kept per lab (a LAB_IMAGES entry may override with 'warm_pool_size')
+DEFAULT_POOL_SIZE = int(os.environ.get('LAB_WARM_POOL_SIZE', 0))
+
+# Seconds between refill passes when nobody claims a container
+REFILL_INTERVAL = int(os.environ.get('LAB_WARM_POOL_REFILL_INTERVAL', 15))
+
+POOL_NAME_PREFIX = 'webnox-pool-'
+
+# Identifies this web process on its pool containers: host:pid:boot token
+POOL_OWNER = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+OWNER_LABEL = 'webnox.pool_owner'
+
+# lab_slug -> list of {'container_id', 'container_name', 'port', 'route'}
+# (route is the name the container was booted with - its Traefik route)
+_pool = {}
+_pool_lock = threading.Lock()
+_refill_event = threading.Event()
+_refiller = None
+
+
+def get_pool_size(lab_slug):
+    """Number of idle containers to keep for a lab"""
+    lab_config = LAB_IMAGES.get(lab_slug, {})
+    return lab_config.get('warm_pool_size', DEFAULT_POOL_SIZE)
+
+
+def generate_pool_container_name(lab_slug):
+    """Generate a unique name for an unclaimed pool container"""
+    random_suffix = ''.join(random.choices(string.ascii_lowercase + string.digits, k=6))
+    return f"{POOL_NAME_PREFIX}{lab_slug[:20]}-{random_suffix}"
+
+
+def acquire(lab_slug, container_name):
+    """
+    Claim an idle container for a lab and rename it for its new owner.
+    Returns the pool entry, or None when the pool is empty.
+    """
+    if get_pool_size(lab_slug) <= 0:
+        return None
+    
+    client = get_docker_client()
+    if not client:
+        return None
+    
+    while True:
+        with _pool_lock:
+            entries = _pool.get(lab_slug)
+            entry = entries.pop(0) if entries else None
+        
+        if not entry:
+            lab_metrics.inc('webnox_lab_warm_pool_misses_total')
+            _refill_event.set()
+            return None
+        
+        try:
+            container = client.containers.get(entry['container_id'])
+            if container.status != 'running':
+                raise docker.errors.NotFound('Pool container is not running')
+            container.rename(container_name)
+        except docker.errors.NotFound:
+            # Pool member died while idle - discard it and try the next one
+            if entry['port']:
+                release_port(entry['port'])
+                db.session.commit()
+            _remove_container(client, entry['container_id'])
+            continue
+        
+        entry['container_name'] = container_name
+        lab_metrics.inc('webnox_lab_warm_pool_hits_total')
+        _refill_event.set()
+        return entry
+
+
+def fill_pool(lab_slug):
+    """Boot containers until the pool for a lab reaches its target size"""
+    target = get_pool_size(lab_slug)
+    lab_config = LAB_IMAGES.get(lab_slug)
+    if target <= 0 or not lab_config:
+        return 0
+    
+    with _pool_lock:
+        missing = target - len(_pool.setdefault(lab_slug, []))
+    if missing <= 0:
+        return 0
+    
+    client = get_docker_client()
+    if not client:
+        return 0
+    
+    success, msg = build_lab_image(lab_slug)
+    if not success:
+        print(f"Warm pool: cannot build image for {lab_slug}: {msg}")
+        return 0
+    
+    added = 0
+    for _ in range(missing):
+        host_port = None if lab_routing.uses_proxy() else get_available_port()
+        container_name = generate_pool_container_name(lab_slug)
+        try:
+            container = run_lab_container(
+                client,
+                lab_config,
+                container_name,
+                host_port,
+                labels={
+                    'webnox.pool': 'true',
+                    'webnox.lab_slug': lab_slug,
+                    OWNER_LABEL: POOL_OWNER
+                },
+                resources=get_profile(lab_slug)
+            )
+        except Exception as e:
+            if host_port is not None:
+                release_port(host_port)
+                db.session.commit()
+            print(f"Warm pool: failed to boot {lab_slug} container: {e}")
+            break
+        
+        with _pool_lock:
+            _pool[lab_slug].append({
+                'container_id': container.id,
+                'container_name': container_name,
+                'port': host_port or 0,
+                'route': container_name
+            })
+        added += 1
+    
+    return added
+
+
+def fill_all_pools():
+    """Top up the pool of every configured lab"""
+    return {slug: fill_pool(slug) for slug in LAB_IMAGES}
+
+
+def get_pool_stats():
+    """Idle container count per lab"""
+    with _pool_lock:
+        return {slug: len(_pool.get(slug, [])) for slug in LAB_IMAGES}
+
+
+def drain_pool():
+    """Remove every idle pool container (used on shutdown)"""
+    with _pool_lock:
+        entries = [entry for entries in _pool.values() for entry in entries]
+        _pool.clear()
+    
+    client = get_docker_client()
+    for entry in entries:
+        if entry['port']:
+            release_port(entry['port'])
+        if client:
+            _remove_container(client, entry['container_id'])
+    db.session.commit()
+
+
+def is_stale_owner(owner):
+    """
+    Whether the process that booted a pool container is gone. Owners on
+    other hosts cannot be checked and count as alive; containers from
+    releases without owner labels count as stale.
+    """
+    if not owner:
+        return True
+    if owner == POOL_OWNER:
+        return False
+    
+    host, _, rest = owner.partition(':')
+    pid, _, _ = rest.partition(':')
+    if host != socket.gethostname():
+        return False
+    if not pid.isdigit() or int(pid) == os.getpid():
+        # Our pid with another boot token is an earlier run of this process
+        return True
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return True
+    except PermissionError:
+        pass
+    return False
+
+
+def remove_stale_pool_containers():
+    """Remove unclaimed pool containers whose owning process is gone"""
+    client = get_docker_client()
+    if not client:
+        return 0
+    
+    removed = 0
+    containers = client.containers.list(all=True, filters={'label': 'webnox.pool=true'})
+    for container in containers:
+        if container.name.startswith(POOL_NAME_PREFIX) and is_stale_owner(container.labels.get(OWNER_LABEL)):
+            for bindings in (container.ports or {}).values():
+                for binding in bindings or []:
+                    if binding.get('HostPort'):
+                        release_port(int(binding['HostPort']))
+            _remove_container(client, container.id)
+            removed += 1
+    db.session.commit()
+    return removed
+
+
+def _remove_container(client, container_id):
+    try:
+        container = client.containers.get(container_id)
+        container.remove(force=True)
+    except docker.errors.NotFound:
+        pass
+    except Exception as e:
+        print(f"Warm pool: failed to remove container {container_id}: {e}")
+
+
+def _refill_loop(app):
+    while True:
+        _refill_event.wait(REFILL_INTERVAL)
+        _refill_event.clear()
+        with app.app_context():
+            try:
+                fill_all_pools()
+            except Exception as e:
+                print(f"Warm pool refill error: {e}")
+
+
+def _drain_on_exit(app):
+    with app.app_context():
+        drain_pool()
+
+
+def start_refiller(app):
+    """Start the background thread that keeps the pools topped up"""
+    global _refiller
+    
+    if _refiller and _refiller.is_alive():
+        return _refiller
+    
+    try:
+        with app.app_context():
+            remove_stale_pool_containers()
+    except Exception as e:
+        print(f"Warm pool: stale container cleanup failed: {e}")
+    
+    _refiller = threading.Thread(target=_refill_loop, args=(app,), name='webnox-warm-pool', daemon=True)
+    _refiller.start()
+    _refill_event.set()
+    atexit.register(_drain_on_exit, app)
+    return _refiller
+
+
+def init_app(app):
+    """Start the warm pool refiller if any lab has a pool configured"""
+    if not app.config.get('LAB_BACKGROUND_TASKS'):
+        return
+    
+    if any(get_pool_size(slug) > 0 for slug in LAB_IMAGES):
+        start_refiller(app)
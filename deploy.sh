@@ -197,7 +197,8 @@ build_lab_images() {
             if [ -f "${lab_dir}Dockerfile" ]; then
                 lab_name=$(basename "$lab_dir")
                 log "Building lab image: webnox-${lab_name}"
-                docker build -t "webnox-${lab_name}" "$lab_dir"
+                # labs/ is the context so every lab can COPY the shared labs/common/
+                docker build -t "webnox-${lab_name}" -f "${lab_dir}Dockerfile" "$LABS_DIR"
             fi
         done
         log "All lab images built successfully"
@@ -0,0 +1,159 @@
+"""
+Lab Tenancy Runtime
+Lets one lab container serve many WebNox users with isolated state.
+
+WebNox opens a shared lab with ?tenant=<signed token>. The token is
+checked against LAB_TENANT_SECRET, stored in a cookie and the tenant is
+available as g.tenant for the rest of the visit. Labs keep their mutable
+state in a TenantState so every tenant gets its own copy, and show
+tenant_flag() so every user gets a flag of their own.
+
+Without LAB_TENANT_SECRET the lab runs single-tenant as before: every
+request belongs to the 'default' tenant and the flag is LAB_FLAG.
+
+Every lab image COPYs this file from labs/common/ (see the lab Dockerfiles).
+"""
+import hashlib
+import hmac
+import os
+import threading
+import time
+from urllib.parse import urlencode
+
+from flask import g, has_request_context, request, redirect, abort
+from itsdangerous import URLSafeSerializer, BadSignature
+
+TENANT_SECRET = os.environ.get('LAB_TENANT_SECRET')
+MULTI_TENANT = bool(TENANT_SECRET)
+
+LAB_SLUG = os.environ.get('LAB_SLUG', 'lab')
+
+DEFAULT_TENANT = 'default'
+
+# Tenants idle for this many seconds lose their state
+TENANT_IDLE_TTL = int(os.environ.get('LAB_TENANT_IDLE_TTL', 7200))
+
+COOKIE_NAME = 'webnox_tenant_' + ''.join(c if c.isalnum() else '_' for c in LAB_SLUG)
+TOKEN_PARAM = 'tenant'
+
+# Requests a lab makes to itself (e.g. an admin bot) send this header so they
+# don't count as tenant activity and never keep an abandoned tenant alive
+PASSIVE_HEADER = 'X-WebNox-Lab-Bot'
+
+_serializer = URLSafeSerializer(TENANT_SECRET or 'single-tenant', salt=f'webnox-lab-tenant:{LAB_SLUG}')
+
+# Every TenantState, so expired tenants are dropped from all of them
+_states = []
+
+
+def make_token(tenant, subject):
+    """Signed token for a tenant (subject is the WebNox user the flag belongs to)"""
+    return _serializer.dumps({'t': tenant, 'u': subject})
+
+
+def read_token(token):
+    """(tenant, subject) from a token, or None if it is forged or malformed"""
+    try:
+        data = _serializer.loads(token)
+        return data['t'], data['u']
+    except (BadSignature, KeyError, TypeError):
+        return None
+
+
+def tenant_flag(base_flag, subject=None):
+    """
+    The flag as seen by one user: FLAG{inner_<hmac>} in multi-tenant mode,
+    so flags cannot be shared between users. WebNox derives the same value
+    when checking submissions.
+    """
+    if not MULTI_TENANT:
+        return base_flag
+    subject = subject if subject is not None else g.tenant_subject
+    digest = hmac.new(TENANT_SECRET.encode(), f'{LAB_SLUG}:{subject}'.encode(), hashlib.sha256).hexdigest()[:10]
+    inner = base_flag[5:-1] if base_flag.startswith('FLAG{') and base_flag.endswith('}') else base_flag
+    return f'FLAG{{{inner}_{digest}}}'
+
+
+class TenantState:
+    """Per-tenant copy of a lab's mutable state, built by factory() on first use"""
+
+    def __init__(self, factory):
+        self._factory = factory
+        self._states = {}
+        self._lock = threading.Lock()
+        _states.append(self)
+
+    def get(self, tenant=None):
+        """The tenant's state (the request's by default), marking the tenant active"""
+        tenant = tenant or g.tenant
+        active = not (has_request_context() and g.get('tenant_passive'))
+        with self._lock:
+            entry = self._states.get(tenant)
+            if entry is None:
+                entry = self._states[tenant] = {'state': self._factory(), 'seen': time.monotonic()}
+            elif active:
+                entry['seen'] = time.monotonic()
+            return entry['state']
+
+    def peek(self, tenant):
+        """A tenant's state without marking it active (None if it has none)"""
+        with self._lock:
+            entry = self._states.get(tenant)
+            return entry['state'] if entry else None
+
+    def items(self):
+        """(tenant, state) of every tenant, without marking any active"""
+        with self._lock:
+            return [(tenant, entry['state']) for tenant, entry in self._states.items()]
+
+    def reset(self, tenant=None):
+        with self._lock:
+            self._states.pop(tenant or g.tenant, None)
+
+    def tenants(self):
+        with self._lock:
+            return list(self._states)
+
+    def expire(self, now):
+        with self._lock:
+            for tenant in [t for t, entry in self._states.items() if now - entry['seen'] > TENANT_IDLE_TTL]:
+                del self._states[tenant]
+
+
+def _expire_loop():
+    while True:
+        time.sleep(60)
+        now = time.monotonic()
+        for state in _states:
+            state.expire(now)
+
+
+def init_app(app):
+    """Resolve the tenant of every request (and start dropping idle tenants)"""
+
+    @app.before_request
+    def resolve_tenant():
+        g.tenant_passive = request.headers.get(PASSIVE_HEADER) == '1'
+        if not MULTI_TENANT:
+            g.tenant, g.tenant_subject = DEFAULT_TENANT, None
+            return None
+
+        token = request.args.get(TOKEN_PARAM)
+        if token:
+            if read_token(token) is None:
+                abort(403)
+            # Move the token into a cookie and drop it from the URL
+            args = [(key, value) for key, value in request.args.items(multi=True) if key != TOKEN_PARAM]
+            query = urlencode(args)
+            response = redirect(request.path + (f'?{query}' if query else ''))
+            response.set_cookie(COOKIE_NAME, token, httponly=True, samesite='Lax')
+            return response
+
+        tenant = read_token(request.cookies.get(COOKIE_NAME, ''))
+        if tenant is None:
+            return 'Open this lab from your WebNox dashboard.', 403
+        g.tenant, g.tenant_subject = tenant
+        return None
+
+    if MULTI_TENANT:
+        threading.Thread(target=_expire_loop, name='tenant-expiry', daemon=True).start()
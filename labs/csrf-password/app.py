@@ -5,20 +5,37 @@ Flag: FLAG{csrf_p4ssw0rd_ch4ng3}
 from flask import Flask, request, render_template_string, redirect, session, url_for
 import os
 
+import tenancy
+from tenancy import TenantState, tenant_flag
+
 app = Flask(__name__)
 app.secret_key = os.urandom(24)
+tenancy.init_app(app)
 
 FLAG = os.environ.get('LAB_FLAG', 'FLAG{csrf_p4ssw0rd_ch4ng3}')
 
-# Simulated users database
-users = {
-    'admin': {'password': 'admin123', 'email': 'admin@bank.com'},
-    'victim': {'password': 'victim123', 'email': 'victim@bank.com'},
-    'attacker': {'password': 'attacker123', 'email': 'attacker@evil.com'}
-}
+# Port the lab listens on (80 in its container, a loopback port when run as a process)
+LAB_PORT = int(os.environ.get('LAB_PORT', 80))
+
+
+def new_bank():
+    """Fresh users, log and attack state for one tenant"""
+    return {
+        # Simulated users database
+        'users': {
+            'admin': {'password': 'admin123', 'email': 'admin@bank.com'},
+            'victim': {'password': 'victim123', 'email': 'victim@bank.com'},
+            'attacker': {'password': 'attacker123', 'email': 'attacker@evil.com'}
+        },
+        # Track password changes for the challenge
+        'password_change_log': [],
+        # Store for evil page content
+        'evil_page_content': None,
+        'csrf_attack_success': False
+    }
 
-# Track password changes for the challenge
-password_change_log = []
+
+banks = TenantState(new_bank)
 
 HTML_LOGIN = '''
 <!DOCTYPE html>
@@ -522,10 +539,6 @@ HTML_LOGS = '''
 </html>
 '''
 
-# Store for evil page content
-evil_page_content = None
-csrf_attack_success = False
-
 @app.route('/')
 def index():
     if 'username' in session:
@@ -536,6 +549,7 @@ def index():
 def login():
     username = request.form.get('username')
     password = request.form.get('password')
+    users = banks.get()['users']
     
     if username in users and users[username]['password'] == password:
         session['username'] = username
@@ -553,7 +567,8 @@ def dashboard():
 
 @app.route('/change-password', methods=['POST'])
 def change_password():
-    global csrf_attack_success
+    bank = banks.get()
+    users = bank['users']
     
     # Get username from session or referer-based detection
     username = session.get('username')
@@ -577,14 +592,14 @@ def change_password():
         users[username]['password'] = new_password
         
         import datetime
-        password_change_log.append({
+        bank['password_change_log'].append({
             'user': username,
             'time': datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
             'csrf': is_csrf
         })
         
         if is_csrf and username == 'victim':
-            csrf_attack_success = True
+            bank['csrf_attack_success'] = True
     
     if 'username' in session:
         return redirect('/dashboard?success=Password changed successfully!')
@@ -596,22 +611,23 @@ def attacker_page():
     if 'username' not in session:
         return redirect('/')
     
+    bank = banks.get()
     return render_template_string(
         HTML_ATTACKER, 
-        evil_page_url='/evil-page' if evil_page_content else None,
-        evil_html=evil_page_content,
-        csrf_success=csrf_attack_success,
-        flag=FLAG
+        evil_page_url='/evil-page' if bank['evil_page_content'] else None,
+        evil_html=bank['evil_page_content'],
+        csrf_success=bank['csrf_attack_success'],
+        flag=tenant_flag(FLAG)
     )
 
 @app.route('/create-evil-page', methods=['POST'])
 def create_evil_page():
-    global evil_page_content
-    evil_page_content = request.form.get('html_content', '')
+    banks.get()['evil_page_content'] = request.form.get('html_content', '')
     return redirect('/attacker-page')
 
 @app.route('/evil-page')
 def evil_page():
+    evil_page_content = banks.get()['evil_page_content']
     if evil_page_content:
         return evil_page_content
     return "No evil page created yet", 404
@@ -619,7 +635,8 @@ def evil_page():
 @app.route('/simulate-victim')
 def simulate_victim():
     """Simulate victim visiting the evil page"""
-    global csrf_attack_success
+    bank = banks.get()
+    evil_page_content = bank['evil_page_content']
     
     if evil_page_content and 'change-password' in evil_page_content:
         # Simulate the CSRF attack
@@ -628,11 +645,11 @@ def simulate_victim():
         match = re.search(r'name=["\']new_password["\'].*?value=["\']([^"\']+)["\']', evil_page_content)
         if match:
             new_password = match.group(1)
-            users['victim']['password'] = new_password
-            csrf_attack_success = True
+            bank['users']['victim']['password'] = new_password
+            bank['csrf_attack_success'] = True
             
             import datetime
-            password_change_log.append({
+            bank['password_change_log'].append({
                 'user': 'victim',
                 'time': datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
                 'csrf': True
@@ -646,7 +663,7 @@ def simulate_victim():
 def logs():
     if 'username' not in session:
         return redirect('/')
-    return render_template_string(HTML_LOGS, logs=password_change_log)
+    return render_template_string(HTML_LOGS, logs=banks.get()['password_change_log'])
 
 @app.route('/logout')
 def logout():
@@ -655,20 +672,12 @@ def logout():
 
 @app.route('/flag')
 def get_flag():
-    return {'flag': FLAG}
+    return {'flag': tenant_flag(FLAG)}
 
 @app.route('/reset')
 def reset():
-    global csrf_attack_success, evil_page_content, password_change_log, users
-    csrf_attack_success = False
-    evil_page_content = None
-    password_change_log = []
-    users = {
-        'admin': {'password': 'admin123', 'email': 'admin@bank.com'},
-        'victim': {'password': 'victim123', 'email': 'victim@bank.com'},
-        'attacker': {'password': 'attacker123', 'email': 'attacker@evil.com'}
-    }
+    banks.reset()
     return redirect('/')
 
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=80, debug=False)
+    app.run(host=os.environ.get('LAB_BIND', '0.0.0.0'), port=LAB_PORT, debug=False)
@@ -5,11 +5,18 @@ Flag: FLAG{1d0r_pr0f1l3_4cc3ss}
 from flask import Flask, request, render_template_string, redirect, session, url_for
 import os
 
+import tenancy
+from tenancy import tenant_flag
+
 app = Flask(__name__)
 app.secret_key = os.urandom(24)
+tenancy.init_app(app)
 
 FLAG = os.environ.get('LAB_FLAG', 'FLAG{1d0r_pr0f1l3_4cc3ss}')
 
+# Port the lab listens on (80 in its container, a loopback port when run as a process)
+LAB_PORT = int(os.environ.get('LAB_PORT', 80))
+
 # Simulated user database
 USERS = {
     1: {
@@ -293,6 +300,9 @@ def profile():
     if not user:
         return "User not found", 404
     
+    # Every tenant sees its own flag in the admin's notes
+    user = dict(user, private_notes=user['private_notes'].replace(FLAG, tenant_flag(FLAG)))
+    
     return render_template_string(
         HTML_PROFILE, 
         user=user, 
@@ -306,7 +316,7 @@ def logout():
 
 @app.route('/flag')
 def get_flag():
-    return {'flag': FLAG}
+    return {'flag': tenant_flag(FLAG)}
 
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=80, debug=False)
+    app.run(host=os.environ.get('LAB_BIND', '0.0.0.0'), port=LAB_PORT, debug=False)
@@ -5,14 +5,37 @@ Flag: FLAG{sql1_l0g1n_byp4ss}
 from flask import Flask, request, render_template_string, redirect, session
 import sqlite3
 import os
+import uuid
+
+import tenancy
+from tenancy import TenantState, tenant_flag
+from init_db import init_db
 
 app = Flask(__name__)
 app.secret_key = os.urandom(24)
+tenancy.init_app(app)
 
 FLAG = os.environ.get('LAB_FLAG', 'FLAG{sql1_l0g1n_byp4ss}')
 
+# Port the lab listens on (80 in its container, a loopback port when run as a process)
+LAB_PORT = int(os.environ.get('LAB_PORT', 80))
+
+def new_tenant_db():
+    """In-memory copy of the users table whose admin note is the tenant's own flag"""
+    uri = f'file:users-{uuid.uuid4().hex}?mode=memory&cache=shared'
+    # The database lives as long as one connection to it - this one, dropped when the tenant expires
+    keeper = sqlite3.connect(uri, uri=True, check_same_thread=False)
+    init_db(keeper, tenant_flag(FLAG))
+    return {'uri': uri, 'keeper': keeper}
+
+tenant_dbs = TenantState(new_tenant_db)
+
 def get_db():
-    conn = sqlite3.connect('users.db')
+    if tenancy.MULTI_TENANT:
+        # Injected queries can read the whole table, so tenants never share it
+        conn = sqlite3.connect(tenant_dbs.get()['uri'], uri=True)
+    else:
+        conn = sqlite3.connect('users.db')
     conn.row_factory = sqlite3.Row
     return conn
 
@@ -314,11 +337,10 @@ def logout():
 
 @app.route('/flag')
 def get_flag():
-    return {'flag': FLAG}
+    return {'flag': tenant_flag(FLAG)}
 
 if __name__ == '__main__':
     # Ensure database exists
     if not os.path.exists('users.db'):
-        from init_db import init_db
         init_db()
-    app.run(host='0.0.0.0', port=80, debug=False)
+    app.run(host=os.environ.get('LAB_BIND', '0.0.0.0'), port=LAB_PORT, debug=False)
@@ -3,8 +3,13 @@ Initialize the SQLite database for SQL Injection lab
 """
 import sqlite3
 
-def init_db():
-    conn = sqlite3.connect('users.db')
+DEFAULT_FLAG = 'FLAG{sql1_l0g1n_byp4ss}'
+
+def init_db(conn=None, flag=DEFAULT_FLAG):
+    """Create the users table (in users.db unless given a connection) with flag as the admin's note"""
+    own_conn = conn is None
+    if own_conn:
+        conn = sqlite3.connect('users.db')
     cursor = conn.cursor()
     
     # Create users table
@@ -20,7 +25,7 @@ def init_db():
     
     # Insert sample users
     users = [
-        ('admin', 'super_secret_admin_password_2024!', 'admin', 'FLAG{sql1_l0g1n_byp4ss}'),
+        ('admin', 'super_secret_admin_password_2024!', 'admin', flag),
         ('john', 'john123', 'user', 'Nothing special here'),
         ('alice', 'alice456', 'user', 'Just a regular user'),
         ('bob', 'bob789', 'user', 'No secrets to see'),
@@ -36,8 +41,9 @@ def init_db():
             pass
     
     conn.commit()
-    conn.close()
-    print("Database initialized successfully!")
+    if own_conn:
+        conn.close()
+        print("Database initialized successfully!")
 
 if __name__ == '__main__':
     init_db()
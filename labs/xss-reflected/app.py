@@ -8,11 +8,18 @@ The search query is reflected without sanitization.
 from flask import Flask, request, render_template_string, jsonify
 import os
 
+import tenancy
+from tenancy import tenant_flag
+
 app = Flask(__name__)
+tenancy.init_app(app)
 
 # The secret flag
 FLAG = os.environ.get('LAB_FLAG', 'FLAG{xss_r3fl3ct3d_b4s1c}')
 
+# Port the lab listens on (80 in its container, a loopback port when run as a process)
+LAB_PORT = int(os.environ.get('LAB_PORT', 80))
+
 HTML_TEMPLATE = '''
 <!DOCTYPE html>
 <html>
@@ -181,7 +188,7 @@ PRODUCTS = [
 
 @app.route('/')
 def index():
-    return render_template_string(HTML_TEMPLATE, query='', products=None, flag=FLAG)
+    return render_template_string(HTML_TEMPLATE, query='', products=None, flag=tenant_flag(FLAG))
 
 
 @app.route('/search')
@@ -197,14 +204,14 @@ def search():
     else:
         results = []
     
-    return render_template_string(HTML_TEMPLATE, query=query, products=results, flag=FLAG)
+    return render_template_string(HTML_TEMPLATE, query=query, products=results, flag=tenant_flag(FLAG))
 
 
 @app.route('/flag')
 def get_flag():
     """API endpoint to verify flag capture"""
-    return jsonify({'flag': FLAG})
+    return jsonify({'flag': tenant_flag(FLAG)})
 
 
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=80, debug=False)
+    app.run(host=os.environ.get('LAB_BIND', '0.0.0.0'), port=LAB_PORT, debug=False)
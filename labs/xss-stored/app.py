@@ -5,32 +5,47 @@ Flag: FLAG{st0r3d_xss_p3rs1st3nt}
 This lab includes a real admin bot that visits the page periodically,
 making it a realistic XSS scenario where you can steal the admin's cookies.
 """
-from flask import Flask, request, render_template_string, redirect, url_for, jsonify
+from flask import Flask, request, render_template_string, redirect, url_for, jsonify, g
 import os
 import threading
 import time
 import requests
 from datetime import datetime
 
+import tenancy
+from tenancy import TenantState, tenant_flag
+
 app = Flask(__name__)
+tenancy.init_app(app)
 
 # The secret flag (stored in admin's cookie)
 FLAG = os.environ.get('LAB_FLAG', 'FLAG{st0r3d_xss_p3rs1st3nt}')
 
-# In-memory storage for comments
-comments = [
-    {'author': 'Admin', 'content': 'Welcome to our blog! Feel free to leave comments.', 'timestamp': '2 hours ago'},
-    {'author': 'User123', 'content': 'Great article, thanks for sharing!', 'timestamp': '1 hour ago'},
-]
+# Port the lab listens on (80 in its container, a loopback port when run as a process)
+LAB_PORT = int(os.environ.get('LAB_PORT', 80))
+
+
+def new_blog():
+    """Fresh comments, captures and bot stats for one tenant"""
+    return {
+        # In-memory storage for comments
+        'comments': [
+            {'author': 'Admin', 'content': 'Welcome to our blog! Feel free to leave comments.', 'timestamp': '2 hours ago'},
+            {'author': 'User123', 'content': 'Great article, thanks for sharing!', 'timestamp': '1 hour ago'},
+        ],
+        # Storage for captured data (to verify XSS success)
+        'captured_data': [],
+        'bot_visit_count': 0,
+        'last_bot_visit': None,
+        'subject': None
+    }
 
-# Storage for captured data (to verify XSS success)
-captured_data = []
+
+blogs = TenantState(new_blog)
 
 # Bot configuration
 BOT_INTERVAL = int(os.environ.get('BOT_INTERVAL', 30))  # Visit every 30 seconds
 bot_running = False
-bot_visit_count = 0
-last_bot_visit = None
 
 HTML_TEMPLATE = '''
 <!DOCTYPE html>
@@ -312,24 +327,25 @@ HTML_TEMPLATE = '''
 '''
 
 
-def admin_bot_visit():
-    """Simulate admin bot visiting the page with cookies containing the flag"""
-    global bot_visit_count, last_bot_visit
-    
+def admin_bot_visit(tenant, subject, blog):
+    """Simulate admin bot visiting a tenant's page (blog is its state) with cookies containing the flag"""
     try:
-        # Create session with admin cookies
+        # Create session with admin cookies (the visit doesn't keep the tenant alive)
         session = requests.Session()
-        session.cookies.set('admin_session', FLAG)
+        session.headers[tenancy.PASSIVE_HEADER] = '1'
+        session.cookies.set('admin_session', tenant_flag(FLAG, subject))
         session.cookies.set('user_role', 'admin')
         session.cookies.set('user_id', '1')
+        if tenancy.MULTI_TENANT:
+            session.cookies.set(tenancy.COOKIE_NAME, tenancy.make_token(tenant, subject))
         
         # Visit the main page (this will execute any stored XSS)
-        response = session.get('http://127.0.0.1:80/', timeout=10)
+        response = session.get(f'http://127.0.0.1:{LAB_PORT}/', timeout=10)
         
-        bot_visit_count += 1
-        last_bot_visit = datetime.now().strftime('%H:%M:%S')
+        blog['bot_visit_count'] += 1
+        blog['last_bot_visit'] = datetime.now().strftime('%H:%M:%S')
         
-        print(f"[Bot] Admin visited page (visit #{bot_visit_count})")
+        print(f"[Bot] Admin visited page (visit #{blog['bot_visit_count']})")
         
     except Exception as e:
         print(f"[Bot] Error during visit: {e}")
@@ -343,7 +359,9 @@ def bot_loop():
     time.sleep(5)  # Initial delay to let server start
     
     while bot_running:
-        admin_bot_visit()
+        # Visit every tenant that has used the lab (and not yet expired)
+        for tenant, blog in blogs.items():
+            admin_bot_visit(tenant, blog['subject'], blog)
         time.sleep(BOT_INTERVAL)
 
 
@@ -360,12 +378,14 @@ def start_bot():
 
 @app.route('/')
 def index():
+    blog = blogs.get()
+    blog['subject'] = g.tenant_subject
     return render_template_string(
         HTML_TEMPLATE, 
-        comments=comments, 
-        captures=captured_data[-5:],  # Show last 5 captures
-        bot_visits=bot_visit_count,
-        last_visit=last_bot_visit or 'Waiting...',
+        comments=blog['comments'], 
+        captures=blog['captured_data'][-5:],  # Show last 5 captures
+        bot_visits=blog['bot_visit_count'],
+        last_visit=blog['last_bot_visit'] or 'Waiting...',
         bot_interval=BOT_INTERVAL
     )
 
@@ -378,7 +398,7 @@ def add_comment():
     # VULNERABLE: No sanitization of comment content
     # XSS payload will be stored and executed for all visitors including the bot
     if author and content:
-        comments.append({
+        blogs.get()['comments'].append({
             'author': author, 
             'content': content,
             'timestamp': datetime.now().strftime('%H:%M')
@@ -399,11 +419,11 @@ def capture():
             'timestamp': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
             'ip': request.remote_addr
         }
-        captured_data.append(capture_entry)
+        blogs.get()['captured_data'].append(capture_entry)
         print(f"[CAPTURE] Data received: {data[:100]}...")
         
         # Check if flag was captured
-        if FLAG in data:
+        if tenant_flag(FLAG) in data:
             print(f"[SUCCESS] 🎉 Flag captured!")
     
     # Return empty response (for image-based exfiltration)
@@ -413,29 +433,24 @@ def capture():
 @app.route('/trigger-bot', methods=['POST'])
 def trigger_bot():
     """Manually trigger a bot visit"""
-    admin_bot_visit()
+    admin_bot_visit(g.tenant, g.tenant_subject, blogs.get())
     return jsonify({
         'success': True,
-        'message': f'🤖 Admin bot visited! (Visit #{bot_visit_count})'
+        'message': f'🤖 Admin bot visited! (Visit #{blogs.get()["bot_visit_count"]})'
     })
 
 
 @app.route('/reset')
 def reset():
     """Reset comments and captures to default"""
-    global comments, captured_data
-    comments = [
-        {'author': 'Admin', 'content': 'Welcome to our blog! Feel free to leave comments.', 'timestamp': '2 hours ago'},
-        {'author': 'User123', 'content': 'Great article, thanks for sharing!', 'timestamp': '1 hour ago'},
-    ]
-    captured_data = []
+    blogs.reset()
     return redirect(url_for('index'))
 
 
 @app.route('/flag')
 def get_flag():
     """API endpoint for verification"""
-    return jsonify({'flag': FLAG})
+    return jsonify({'flag': tenant_flag(FLAG)})
 
 
 @app.route('/bot-status')
@@ -443,8 +458,8 @@ def bot_status():
     """Get bot status"""
     return jsonify({
         'running': bot_running,
-        'visits': bot_visit_count,
-        'last_visit': last_bot_visit,
+        'visits': blogs.get()['bot_visit_count'],
+        'last_visit': blogs.get()['last_bot_visit'],
         'interval': BOT_INTERVAL
     })
 
@@ -454,4 +469,4 @@ if __name__ == '__main__':
     start_bot()
     
     # Run the Flask app
-    app.run(host='0.0.0.0', port=80, debug=False, threaded=True)
+    app.run(host=os.environ.get('LAB_BIND', '0.0.0.0'), port=LAB_PORT, debug=False, threaded=True)
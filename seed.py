@@ -5,6 +5,7 @@ Seeds the database with topics, courses, lessons, and labs
 import sys
 import os
 sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+os.environ.setdefault('LAB_BACKGROUND_TASKS', 'false')
 
 from app import create_app, db
 from app.models.user import User
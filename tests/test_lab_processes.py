@@ -0,0 +1,45 @@
+"""
+Every lab must build and start on the process backend from the same
+labs/ build context the Docker images use.
+"""
+import socket
+import urllib.request
+
+import pytest
+
+from app.services import image_manager
+from app.services.lab_orchestrator import LAB_IMAGES
+from app.services.lab_processes import ProcessClient
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture
+def client(tmp_path):
+    client = ProcessClient(work_dir=str(tmp_path))
+    yield client
+    client.stop_all()
+
+
+@pytest.mark.parametrize('lab_slug', sorted(LAB_IMAGES))
+def test_lab_starts_as_process(client, lab_slug):
+    build_path = image_manager.get_build_path(lab_slug)
+    image = LAB_IMAGES[lab_slug]['image']
+    client.images.build(
+        fileobj=image_manager.build_context(build_path),
+        custom_context=True,
+        dockerfile=image_manager.get_dockerfile(build_path),
+        tag=image
+    )
+    
+    port = free_port()
+    process = client.containers.run(image, ports={'80/tcp': port}, environment={})
+    with urllib.request.urlopen(f'http://127.0.0.1:{port}/', timeout=5) as response:
+        assert response.status == 200
+    
+    process.remove(force=True)
+    assert client.all() == []